@@ -0,0 +1,585 @@
+"""Module for asyncio versions of the highlevel Cozify Hub operations.
+
+Functions mirror their counterparts in cozify.hub and cozify.hub_api and share the same config state and kwargs handling,
+but perform their HTTP calls natively on the running event loop. Calls use a small keep-alive connection pool per hub,
+so hundreds of concurrent calls can be in flight without a thread per call.
+
+Example::
+
+    import asyncio
+    from cozify import aio, hub
+
+    async def main():
+        devs = await aio.devices(capabilities=hub.capability.BRIGHTNESS)
+        await asyncio.gather(*[aio.light_brightness(i, 0.5) for i in devs])
+
+    asyncio.run(main())
+
+Attributes:
+    timeout(float): Timeout in seconds for a single HTTP call. Defaults to 5 like the synchronous API.
+    pool_maxsize(int): Maximum number of concurrent connections per base address, further calls queue on the event loop. Defaults to 10.
+"""
+
+import asyncio
+import functools
+import ssl
+import time
+import weakref
+from urllib.parse import urlsplit
+
+from absl import logging
+
+from . import cache, cloud_api, feed, hub, hub_api, index, metrics
+from . import model as models
+from . import tracing, waiter
+from .Error import APIError, ConnectionError
+
+timeout = 5.0
+pool_maxsize = 10
+
+_pools = (
+    weakref.WeakKeyDictionary()
+)  # event loop -> {(scheme, netloc): (asyncio.Semaphore, list of idle (reader, writer))}
+_idempotent = ("GET", "HEAD", "OPTIONS")
+_ssl_context = None
+
+### Device data ###
+
+
+async def devices(
+    *, capabilities=None, and_filter=False, max_age=None, model=False, **kwargs
+):
+    """Get up to date full devices data set as a dict. For arguments see cozify.hub.devices()
+
+    Returns:
+        dict: full live device state as returned by the API
+    """
+    hub._fill_kwargs(kwargs)
+    idx = None
+    if "mock_devices" in kwargs:
+        devs = kwargs["mock_devices"]
+    else:
+        devs = cache.get(kwargs["hub_id"], max_age)
+        if devs is None:
+            devs = await get("/devices", **kwargs)
+            if cache.active(max_age):
+                cache.put(kwargs["hub_id"], devs)
+        if capabilities:
+            idx = cache.capability_index(kwargs["hub_id"], devs)
+    devs = hub._filter_devices(devs, capabilities, and_filter, idx)
+    if model:
+        return models.Devices(devs)
+    return devs
+
+
+async def device(device_id, **kwargs):
+    """Get up to date device data set as a dict. For arguments see cozify.hub.device()
+
+    Returns:
+        dict: full live device data as returned by the API
+    """
+    devs = await devices(**kwargs)
+    return devs[device_id]
+
+
+async def has_state(device_id, state, **kwargs):
+    """Check if device state matches the provided state keys. For arguments see cozify.hub.has_state()
+
+    Returns:
+        bool: If given state values match.
+    """
+    dev = await device(device_id, **kwargs)
+    current_state = dev["state"]
+    for key, value in state.items():
+        if current_state[key] != value:
+            logging.debug(f"has_state failed on key {key}:{value}")
+            return False
+    return True
+
+
+async def await_state(device_id, state, timeout=10, **kwargs):
+    """Wait for a device to reach a desired state. For arguments see cozify.hub.await_state()
+
+    Returns:
+        bool: True when state matches or False on timeout.
+    """
+    outcomes = await await_states({device_id: state}, timeout=timeout, **kwargs)
+    return outcomes[device_id]
+
+
+async def await_states(expected, timeout=10, **kwargs):
+    """Wait for many devices to reach their desired states, polling all of them together. For arguments see cozify.hub.await_states()
+
+    Returns:
+        dict: device_id -> True if the device reached its state or False on timeout.
+    """
+    hub._fill_kwargs(kwargs)
+    kwargs.setdefault("max_age", 0)  # never trust cached or written-through state here
+
+    w = waiter.Waiter(expected, timeout)
+    while not w.check(await devices(**kwargs)):
+        interval = w.next_interval()
+        if interval is None:
+            break
+        await asyncio.sleep(interval)
+    return w.outcomes()
+
+
+async def watch(interval=1.0, *, capabilities=None, and_filter=False, **kwargs):
+    """Generate state change events of devices, polling forever. For arguments see cozify.hub.watch()
+
+    Yields:
+        cozify.feed.Change: One event per changed, added or removed device.
+    """
+    hub._fill_kwargs(kwargs)
+    # Watchers on the same tick share a fetch, but a snapshot from the previous tick must never be reused
+    kwargs.setdefault("max_age", interval / 2)
+
+    previous = await devices(capabilities=capabilities, and_filter=and_filter, **kwargs)
+    while True:
+        await asyncio.sleep(feed.next_tick(interval))
+        current = await devices(
+            capabilities=capabilities, and_filter=and_filter, **kwargs
+        )
+        events, previous = feed.changes(previous, current)
+        for event in events:
+            yield event
+
+
+### Device control ###
+
+
+async def device_toggle(device_id, **kwargs):
+    """Toggle power state of any device capable of it. For arguments see cozify.hub.device_toggle()"""
+    hub._fill_kwargs(kwargs)
+    devs = await devices(capabilities=hub.capability.ON_OFF, **kwargs)
+    dev_state = devs[device_id]["state"]
+    new_state = hub._clean_state(dev_state)
+    new_state["isOn"] = not dev_state["isOn"]
+    await devices_command_state(device_id=device_id, state=new_state, **kwargs)
+
+
+async def device_state_replace(device_id, state, **kwargs):
+    """Replace the entire state of a device with the provided state. For arguments see cozify.hub.device_state_replace()"""
+    hub._fill_kwargs(kwargs)
+    try:
+        await _eligible(device_id, **kwargs)
+    except ValueError:
+        raise AttributeError("device {0} does not exist.".format(device_id)) from None
+    state = dict(state)
+    for key in ["lastSeen", "reachable", "maxTemperature", "minTemperature"]:
+        state.pop(key, None)
+    await devices_command_state(device_id=device_id, state=state, **kwargs)
+
+
+async def device_on(device_id, **kwargs):
+    """Turn on a device that is capable of turning on. Eligibility is determined by the capability ON_OFF."""
+    hub._fill_kwargs(kwargs)
+    await _eligible(device_id, hub.capability.ON_OFF, **kwargs)
+    await devices_command_on(device_id, **kwargs)
+
+
+async def device_off(device_id, **kwargs):
+    """Turn off a device that is capable of turning off. Eligibility is determined by the capability ON_OFF."""
+    hub._fill_kwargs(kwargs)
+    await _eligible(device_id, hub.capability.ON_OFF, **kwargs)
+    await devices_command_off(device_id, **kwargs)
+
+
+async def light_temperature(device_id, temperature=2700, transition=0, **kwargs):
+    """Set temperature of a light. For arguments see cozify.hub.light_temperature()"""
+    hub._fill_kwargs(kwargs)
+    state = await _eligible(device_id, hub.capability.COLOR_TEMP, **kwargs)
+    state = hub._temperature_state(state, temperature, transition)
+    await devices_command_state(device_id=device_id, state=state, **kwargs)
+
+
+async def light_color(device_id, hue, saturation=1.0, transition=0, **kwargs):
+    """Set color (hue & saturation) of a light. For arguments see cozify.hub.light_color()"""
+    hub._fill_kwargs(kwargs)
+    state = await _eligible(device_id, hub.capability.COLOR_HS, **kwargs)
+    state = hub._color_state(state, hue, saturation)
+    await devices_command_state(device_id=device_id, state=state, **kwargs)
+
+
+async def light_brightness(device_id, brightness, transition=0, **kwargs):
+    """Set brightness of a light. For arguments see cozify.hub.light_brightness()"""
+    hub._fill_kwargs(kwargs)
+    state = await _eligible(device_id, hub.capability.BRIGHTNESS, **kwargs)
+    state = hub._brightness_state(state, brightness)
+    await devices_command_state(device_id=device_id, state=state, **kwargs)
+
+
+### Scenes ###
+
+
+async def scenes(*, filters=None, **kwargs):
+    """Get full scene data set as a dict. For arguments see cozify.hub.scenes()
+
+    Returns:
+        dict: scene data as returned by the API
+    """
+    hub._fill_kwargs(kwargs)
+    scns = await get("/scenes", **kwargs)
+    if filters is not None:
+        for key, val in filters.items():
+            scns = dict(filter(lambda e: e[1][key] == val, scns.items()))
+    return scns
+
+
+async def scene(scene_id, **kwargs):
+    """Get scene data set as a dict.
+
+    Returns:
+        dict: scene data as returned by the API
+    """
+    return (await scenes(**kwargs))[scene_id]
+
+
+async def scene_toggle(scene_id, **kwargs):
+    """Toggle on/off state of given scene."""
+    hub._fill_kwargs(kwargs)
+    if (await scene(scene_id, **kwargs))["isOn"]:
+        await scene_off(scene_id, **kwargs)
+    else:
+        await scene_on(scene_id, **kwargs)
+
+
+async def scene_on(scene_id, **kwargs):
+    """Turn on a scene."""
+    hub._fill_kwargs(kwargs)
+    await scenes_command_state(scene_id=scene_id, request_type="CMD_SCENE_ON", **kwargs)
+
+
+async def scene_off(scene_id, **kwargs):
+    """Turn off a scene."""
+    hub._fill_kwargs(kwargs)
+    await scenes_command_state(
+        scene_id=scene_id, request_type="CMD_SCENE_OFF", **kwargs
+    )
+
+
+### Hub info ###
+
+
+async def tz(**kwargs):
+    """Get timezone of given hub or default hub if no id is specified.
+
+    Returns:
+        str: Timezone of the hub, for example: 'Europe/Helsinki'
+    """
+    hub._fill_kwargs(kwargs)
+    return await get("/hub/tz", **kwargs)
+
+
+async def ping(autorefresh=True, **kwargs):
+    """Perform a cheap API call to verify the hub connection. For arguments see cozify.hub.ping()
+
+    Only the happy path is native, any failure is handed over to cozify.hub.ping() in an executor thread
+    since rescuing a connection involves interactive authentication and state writes.
+
+    Returns:
+        bool: True for a valid and working hub authentication state.
+    """
+    try:
+        hub._fill_kwargs(kwargs)
+        if kwargs["remote"] or kwargs["host"]:  # no remote-ness to autodetect
+            await tz(**kwargs)
+            return True
+    except (APIError, ConnectionError) as e:
+        logging.debug("Async ping failed, falling back to hub.ping(): {0}".format(e))
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        None, functools.partial(hub.ping, autorefresh=autorefresh, **kwargs)
+    )
+
+
+### 1:1 API calls, see cozify.hub_api ###
+
+
+async def get(call, hub_token_header=True, base=hub_api.apiPath, **kwargs):
+    """GET method for calling hub API. For arguments see cozify.hub_api.get()"""
+    return await _call(
+        method="GET",
+        call="{0}{1}".format(base, call),
+        hub_token_header=hub_token_header,
+        **kwargs,
+    )
+
+
+async def put(call, data, hub_token_header=True, base=hub_api.apiPath, **kwargs):
+    """PUT method for calling hub API. For arguments see cozify.hub_api.put()"""
+    return await _call(
+        method="PUT",
+        call="{0}{1}".format(base, call),
+        hub_token_header=hub_token_header,
+        data=data,
+        **kwargs,
+    )
+
+
+async def devices_command(command, **kwargs):
+    """1:1 implementation of /devices/command. For arguments see cozify.hub_api.devices_command()"""
+    logging.debug("command json to send: {0}".format(command))
+    reply = await put("/devices/command", command, **kwargs)
+    if "hub_id" in kwargs:
+        cache.apply(kwargs["hub_id"], command)
+    return reply
+
+
+async def devices_command_state(*, device_id, state, **kwargs):
+    """Command helper for CMD_DEVICE. For arguments see cozify.hub_api.devices_command_state()"""
+    command = [{"id": device_id, "type": "CMD_DEVICE", "state": state}]
+    return await devices_command(command, **kwargs)
+
+
+async def devices_command_on(device_id, **kwargs):
+    """Command helper for CMD_DEVICE_ON."""
+    return await devices_command([{"id": device_id, "type": "CMD_DEVICE_ON"}], **kwargs)
+
+
+async def devices_command_off(device_id, **kwargs):
+    """Command helper for CMD_DEVICE_OFF."""
+    return await devices_command(
+        [{"id": device_id, "type": "CMD_DEVICE_OFF"}], **kwargs
+    )
+
+
+async def scenes_command_state(*, scene_id, request_type, **kwargs):
+    """Commands changing a scene's state. For arguments see cozify.hub_api.scenes_command_state()"""
+    command = [{"id": scene_id, "type": request_type}]
+    logging.debug("command json to send: {0}".format(command))
+    return await put("/scenes/command", command, **kwargs)
+
+
+async def close():
+    """Close all idle keep-alive connections owned by the running event loop."""
+    for _, idle in _pools.pop(asyncio.get_running_loop(), {}).values():
+        for reader, writer in idle:
+            writer.close()
+
+
+### Internals ###
+
+
+async def _eligible(device_id, capability_filter=None, **kwargs):
+    """Async counterpart of cozify.index.eligible(), raises a ValueError if not eligible.
+
+    Returns:
+        dict: Copy of the device state as a command template.
+    """
+    idx = index.lookup(kwargs["hub_id"])
+    state = idx.eligible(device_id, capability_filter) if idx else None
+    if state is None and index.needs_refresh(idx):
+        idx = index.store(kwargs["hub_id"], await devices(**kwargs))
+        state = idx.eligible(device_id, capability_filter)
+    if state is None:
+        raise ValueError("Device not found or not eligible for action.")
+    return state
+
+
+async def _call(*, call, method, hub_token_header, data=None, **kwargs):
+    """Backend for get & put, async counterpart of cozify.hub_api._call()
+
+    Args:
+        call(str): Full API path to call.
+        method(str): HTTP method to use for call, GET|PUT.
+    """
+    headers = {}
+    if hub_token_header:
+        if "hub_token" not in kwargs:
+            raise AttributeError(
+                "Asked to do a call to the hub but no hub_token provided."
+            )
+        headers["Authorization"] = kwargs["hub_token"]
+    if data is not None:
+        with tracing.span("json encode", "json"):
+            data = metrics.json_dumps(data, "hub", call)
+        headers["content-type"] = "application/json"
+
+    if "remote" in kwargs and kwargs["remote"]:  # remote call
+        if "cloud_token" not in kwargs:
+            raise AttributeError("Asked to do remote call but no cloud_token provided.")
+        headers["Authorization"] = kwargs["cloud_token"]
+        headers["X-Hub-Key"] = kwargs["hub_token"]
+        url = cloud_api.cloudBase + "/hub/remote" + call
+        method = "PUT" if data else "GET"
+    else:  # local call
+        if "host" not in kwargs or not kwargs["host"]:
+            raise AttributeError(
+                "Local call but no hostname was provided. Either set keyword remote or host."
+            )
+        url = hub_api._getBase(**kwargs) + call
+
+    if not metrics.enabled and not tracing.active():
+        status, reason, body = await _request(method, url, headers=headers, data=data)
+    else:
+        labels = {
+            "hub_id": kwargs.get("hub_id"),
+            "path": "remote" if kwargs.get("remote") else "local",
+        }
+        name = "{0} {1}".format(method, metrics.endpoint(call))
+        start = time.perf_counter()
+        try:
+            status, reason, body = await _request(
+                method, url, headers=headers, data=data
+            )
+        except ConnectionError:
+            tracing.record(name, "http", start, error="ConnectionError", **labels)
+            if metrics.enabled:
+                metrics.call(
+                    "hub", method, call, "error", time.perf_counter() - start, **labels
+                )
+            raise
+        sizes = {"sent": metrics.size(data), "received": len(body)}
+        tracing.record(name, "http", start, status=status, **sizes, **labels)
+        if metrics.enabled:
+            metrics.call(
+                "hub",
+                method,
+                call,
+                status,
+                time.perf_counter() - start,
+                **sizes,
+                **labels,
+            )
+
+    if status == 200:
+        with tracing.span("json decode", "json", bytes=len(body)):
+            return metrics.json_loads(body, "hub", call)
+    elif status == 410:  # pragma: no cover
+        raise APIError(
+            status,
+            "API version outdated. Update python-cozify. %s - %s - %s"
+            % (reason, url, body.decode("utf8", "replace")),
+        )
+    else:
+        raise APIError(
+            status, "%s - %s - %s" % (reason, url, body.decode("utf8", "replace"))
+        )
+
+
+async def _request(method, url, headers, data=None):
+    """Perform a single HTTP/1.1 request, reusing an idle keep-alive connection if one is available.
+
+    Returns:
+        tuple: (status code, reason, body bytes)
+    """
+    parts = urlsplit(url)
+    path = parts.path + ("?" + parts.query if parts.query else "")
+    payload = data.encode("utf8") if data is not None else b""
+
+    lines = ["{0} {1} HTTP/1.1".format(method, path), "Host: " + parts.netloc]
+    lines += ["{0}: {1}".format(k, v) for k, v in headers.items()]
+    if data is not None or method in ("PUT", "POST"):
+        lines.append("Content-Length: {0}".format(len(payload)))
+    request = ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + payload
+
+    limit, idle = _pool(parts.scheme, parts.netloc)
+    async with limit:
+        while idle:
+            # reused connections may have been closed by the other end meanwhile
+            reader, writer = idle.pop()
+            if reader.at_eof() or writer.is_closing():
+                writer.close()
+                continue
+            try:
+                return await asyncio.wait_for(
+                    _exchange(idle, reader, writer, request, method), timeout
+                )
+            except (OSError, asyncio.IncompleteReadError) as e:
+                writer.close()
+                if method not in _idempotent:
+                    # the command may have reached the hub, sending it again could apply it twice
+                    raise ConnectionError("{0}: {1}".format(url, e)) from None
+            except asyncio.TimeoutError:
+                writer.close()
+                raise ConnectionError("Timed out after {0}s: {1}".format(timeout, url))
+
+        writer = None
+        try:
+            reader, writer = await asyncio.wait_for(_connect(parts), timeout)
+            return await asyncio.wait_for(
+                _exchange(idle, reader, writer, request, method), timeout
+            )
+        except asyncio.TimeoutError:
+            if writer is not None:
+                writer.close()
+            raise ConnectionError("Timed out after {0}s: {1}".format(timeout, url))
+        except (OSError, asyncio.IncompleteReadError, ValueError) as e:
+            if writer is not None:
+                writer.close()
+            raise ConnectionError("{0}: {1}".format(url, e)) from None
+
+
+def _pool(scheme, netloc):
+    """Get the connection limit and idle connections of a base address on the running event loop.
+
+    Returns:
+        tuple: (asyncio.Semaphore, list of idle (reader, writer))
+    """
+    loop = asyncio.get_running_loop()
+    pools = _pools.get(loop)
+    if pools is None:
+        # idle connections keep their loop alive, so forget loops that were closed without calling close()
+        for closed in [other for other in _pools if other.is_closed()]:
+            del _pools[closed]
+        pools = _pools[loop] = {}
+    pool = pools.get((scheme, netloc))
+    if pool is None:
+        pool = pools[(scheme, netloc)] = (asyncio.Semaphore(pool_maxsize), [])
+    return pool
+
+
+async def _connect(parts):
+    global _ssl_context
+    secure = parts.scheme == "https"
+    port = parts.port or (443 if secure else 80)
+    if secure and _ssl_context is None:
+        _ssl_context = ssl.create_default_context()
+    return await asyncio.open_connection(
+        parts.hostname, port, ssl=_ssl_context if secure else None
+    )
+
+
+async def _exchange(idle, reader, writer, request, method):
+    writer.write(request)
+    await writer.drain()
+
+    status_line = await reader.readline()
+    if not status_line:
+        raise asyncio.IncompleteReadError(b"", None)
+    version, status, reason = (status_line.decode("latin-1").split(" ", 2) + [""])[:3]
+    response_headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        response_headers[name.strip().lower()] = value.strip()
+
+    keep_alive = (
+        version == "HTTP/1.1"
+        and response_headers.get("connection", "").lower() != "close"
+    )
+    if method == "HEAD":
+        body = b""
+    elif response_headers.get("transfer-encoding", "").lower() == "chunked":
+        body = b""
+        while True:
+            size = int((await reader.readline()).split(b";")[0], 16)
+            chunk = await reader.readexactly(size + 2)
+            if size == 0:
+                break
+            body += chunk[:-2]
+    elif "content-length" in response_headers:
+        body = await reader.readexactly(int(response_headers["content-length"]))
+    else:
+        body = await reader.read()
+        keep_alive = False
+
+    if keep_alive:
+        idle.append((reader, writer))
+    else:
+        writer.close()
+    return int(status), reason.strip(), body
@@ -0,0 +1,149 @@
+"""Module for batching multiple device commands into as few API calls as possible.
+
+Commands are validated against the device index (see cozify.index), so at most one devices snapshot is fetched,
+and they are sent out in one /devices/command call per batch.
+
+Example::
+
+    from cozify import hub
+
+    with hub.batch() as b:
+        for device_id in hub.devices(capabilities=hub.capability.BRIGHTNESS):
+            b.light_brightness(device_id, 0.5)
+    # all commands are sent when the with block exits
+
+Attributes:
+    max_batch_size(int): Default maximum number of commands sent in a single call. Larger batches are split. Defaults to 50.
+    max_batch_bytes(int): Default maximum size in bytes of the JSON body of a single call. Larger batches are split. Defaults to 64 KiB.
+"""
+
+import json
+
+from absl import logging
+
+from . import hub, hub_api, index
+
+max_batch_size = 50
+max_batch_bytes = 64 * 1024
+
+
+class Batch:
+    """Builder collecting device commands for a single hub.
+
+    Args:
+        max_size(int): Maximum number of commands per API call. Defaults to max_batch_size.
+        max_bytes(int): Maximum size in bytes of the JSON body of an API call. A single command larger than this is sent on its own. Defaults to max_batch_bytes.
+        **kwargs: Hub selection kwargs as accepted by all cozify.hub functions, e.g. hub_id or remote.
+
+    Attributes:
+        commands(list): Commands collected so far and not yet flushed.
+    """
+
+    def __init__(self, max_size=None, max_bytes=None, **kwargs):
+        hub._fill_kwargs(kwargs)
+        self.kwargs = kwargs
+        self.max_size = max_batch_size if max_size is None else max_size
+        self.max_bytes = max_batch_bytes if max_bytes is None else max_bytes
+        if self.max_size < 1:
+            raise ValueError("Batch size must be at least 1, got: {0}".format(max_size))
+        self.commands = []
+        self._devs = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.flush()
+        elif self.commands:
+            logging.warning(
+                "Batch aborted by an exception, discarding {0} commands.".format(
+                    len(self.commands)
+                )
+            )
+
+    def __len__(self):
+        return len(self.commands)
+
+    def devices(self):
+        """Devices snapshot of the hub. Fetched once on first use.
+        Commands are validated against the device index instead, see cozify.index.
+
+        Returns:
+            dict: Devices dict as returned by cozify.hub.devices()
+        """
+        if self._devs is None:
+            self._devs = hub.devices(**self.kwargs)
+        return self._devs
+
+    def on(self, device_id):
+        """Queue turning on a device. Eligibility is determined by the capability ON_OFF."""
+        self._eligible(device_id, hub.capability.ON_OFF)
+        self.commands.append({"id": device_id, "type": "CMD_DEVICE_ON"})
+        return self
+
+    def off(self, device_id):
+        """Queue turning off a device. Eligibility is determined by the capability ON_OFF."""
+        self._eligible(device_id, hub.capability.ON_OFF)
+        self.commands.append({"id": device_id, "type": "CMD_DEVICE_OFF"})
+        return self
+
+    def state(self, device_id, state):
+        """Queue replacing the state of a device. For details see cozify.hub.device_state_replace()"""
+        try:
+            self._eligible(device_id)
+        except ValueError:
+            raise AttributeError(
+                "device {0} does not exist.".format(device_id)
+            ) from None
+        state = dict(state)
+        for key in ["lastSeen", "reachable", "maxTemperature", "minTemperature"]:
+            state.pop(key, None)
+        return self._state(device_id, state)
+
+    def light_temperature(self, device_id, temperature=2700, transition=0):
+        """Queue setting temperature of a light. For arguments see cozify.hub.light_temperature()"""
+        state = self._eligible(device_id, hub.capability.COLOR_TEMP)
+        return self._state(
+            device_id, hub._temperature_state(state, temperature, transition)
+        )
+
+    def light_color(self, device_id, hue, saturation=1.0, transition=0):
+        """Queue setting color of a light. For arguments see cozify.hub.light_color()"""
+        state = self._eligible(device_id, hub.capability.COLOR_HS)
+        return self._state(device_id, hub._color_state(state, hue, saturation))
+
+    def light_brightness(self, device_id, brightness, transition=0):
+        """Queue setting brightness of a light. For arguments see cozify.hub.light_brightness()"""
+        state = self._eligible(device_id, hub.capability.BRIGHTNESS)
+        return self._state(device_id, hub._brightness_state(state, brightness))
+
+    def flush(self):
+        """Send all queued commands, split into calls of at most max_size commands and max_bytes of JSON.
+
+        Returns:
+            list: API replies, one per call made.
+        """
+        replies = []
+        while self.commands:  # failed chunks are left queued
+            chunk = self.commands[: self._fitting()]
+            replies.append(hub_api.devices_command(chunk, **self.kwargs))
+            del self.commands[: len(chunk)]
+        return replies
+
+    def _fitting(self):
+        """Number of queued commands that fit into the next call, at least one."""
+        size = 2  # [] around the list
+        for count, command in enumerate(self.commands[: self.max_size]):
+            # json.dumps() escapes all non-ascii, so characters are bytes. Commands are separated by ', '
+            size += len(json.dumps(command)) + (2 if count else 0)
+            if size > self.max_bytes and count:
+                return count
+        return self.max_size
+
+    def _state(self, device_id, state):
+        self.commands.append({"id": device_id, "type": "CMD_DEVICE", "state": state})
+        return self
+
+    def _eligible(self, device_id, capability=None):
+        return index.eligible(device_id, capability, **self.kwargs)
@@ -0,0 +1,200 @@
+"""Package for benchmarking the library offline against a local stand-in hub.
+
+Every case runs against cozify.benchmark.mock_hub.MockHub with a configurable number of synthetic devices and artificial latency,
+using a temporary state file so the real configuration is neither used nor touched.
+Results are plain dicts that serialize to JSON, so runs can be stored and compared for regressions::
+
+    python3 -m cozify.benchmark --devices 200 --latency 0.002 --output new.json --compare old.json
+
+Attributes:
+    cases(dict): Case name -> function that sets up the case. See cozify.benchmark.cases.
+"""
+
+import collections
+import concurrent.futures
+import datetime
+import math
+import os
+import platform
+import tempfile
+import time
+
+from .. import __version__, cache, config, index
+from .mock_hub import MockHub
+from . import cases as _cases
+
+cases = {
+    "devices": _cases.devices,
+    "devices_filtered": _cases.devices_filtered,
+    "devices_cached": _cases.devices_cached,
+    "command": _cases.command,
+    "batch": _cases.batch,
+    "await_state": _cases.await_state,
+    "ping": _cases.ping,
+    "hub_info": _cases.hub_info,
+}
+
+Environment = collections.namedtuple("Environment", ["mock", "kwargs"])
+Environment.__doc__ = """What a case runs against: the stand-in hub and kwargs directing cozify.hub calls at it by way of the state."""
+
+
+def run(names=None, devices=50, latency=0.0, iterations=100, warmup=5, concurrency=1):
+    """Run benchmark cases against a fresh stand-in hub.
+
+    Args:
+        names(list): Cases to run. Defaults to None which runs all cases.
+        devices(int): Number of synthetic devices on the hub. Defaults to 50.
+        latency(float): Seconds the hub waits before answering each call. Defaults to 0.
+        iterations(int): Timed calls per case. Defaults to 100.
+        warmup(int): Untimed calls per case before timing. Defaults to 5.
+        concurrency(int): Calls kept in flight at once. Defaults to 1.
+
+    Returns:
+        dict: 'meta' -> run parameters and environment, 'results' -> case name -> measurement as returned by measure().
+    """
+    if names is None:
+        names = list(cases)
+    unknown = set(names) - set(cases)
+    if unknown:
+        raise ValueError("Unknown benchmark cases: {0}".format(", ".join(unknown)))
+
+    results = {}
+    with _isolated_state() as hub_section, MockHub(
+        device_count=devices, latency=latency
+    ) as mock:
+        config.state[hub_section]["host"] = mock.host
+        env = Environment(mock=mock, kwargs={"hub_id": mock.hub_id, "port": mock.port})
+        for name in names:
+            cache.invalidate()
+            index.invalidate()
+            results[name] = measure(cases[name](env), iterations, warmup, concurrency)
+
+    return {
+        "meta": {
+            "version": __version__,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "time": datetime.datetime.now().isoformat(timespec="seconds"),
+            "devices": devices,
+            "latency": latency,
+            "iterations": iterations,
+            "warmup": warmup,
+            "concurrency": concurrency,
+        },
+        "results": results,
+    }
+
+
+def measure(func, iterations=100, warmup=5, concurrency=1):
+    """Time repeated calls of a function.
+
+    Args:
+        func(callable): Called without arguments for every iteration.
+        iterations(int): Timed calls. Defaults to 100.
+        warmup(int): Untimed calls before timing. Defaults to 5.
+        concurrency(int): Calls kept in flight at once from a thread pool. Defaults to 1.
+
+    Returns:
+        dict: iterations, errors, throughput (successful calls per second of wall time) and p50, p99, mean, min and max latency in milliseconds.
+    """
+    for _ in range(warmup):
+        func()
+
+    def timed(_):
+        start = time.perf_counter()
+        try:
+            func()
+        except Exception:
+            return None
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    if concurrency > 1:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=concurrency) as pool:
+            samples = list(pool.map(timed, range(iterations)))
+    else:
+        samples = [timed(i) for i in range(iterations)]
+    wall = time.perf_counter() - start
+
+    ok = sorted(s for s in samples if s is not None)
+    result = {
+        "iterations": iterations,
+        "errors": len(samples) - len(ok),
+        "throughput": len(ok) / wall if wall else 0.0,
+    }
+    for key, value in (
+        ("p50_ms", percentile(ok, 0.50)),
+        ("p99_ms", percentile(ok, 0.99)),
+        ("mean_ms", sum(ok) / len(ok) if ok else None),
+        ("min_ms", ok[0] if ok else None),
+        ("max_ms", ok[-1] if ok else None),
+    ):
+        result[key] = None if value is None else value * 1000
+    return result
+
+
+def percentile(ordered, q):
+    """Nearest-rank percentile of sorted samples.
+
+    Args:
+        ordered(list): Samples in ascending order.
+        q(float): Percentile between 0 and 1.
+
+    Returns:
+        float: The sample at the percentile or None if there are no samples.
+    """
+    if not ordered:
+        return None
+    return ordered[max(math.ceil(q * len(ordered)) - 1, 0)]
+
+
+def compare(old, new, threshold=0.1):
+    """Compare two runs for regressions of p50 and p99 latency and throughput.
+
+    Args:
+        old(dict): Baseline run as returned by run().
+        new(dict): Run to check.
+        threshold(float): Relative change that counts as a regression. Defaults to 0.1, i.e. 10%.
+
+    Returns:
+        list: (case, metric, old value, new value) for every regression, empty if there are none. Cases missing from either run are skipped.
+    """
+    regressions = []
+    for name, after in new["results"].items():
+        before = old["results"].get(name)
+        if before is None:
+            continue
+        for metric in ("p50_ms", "p99_ms"):
+            if before[metric] and after[metric] is not None:
+                if after[metric] > before[metric] * (1 + threshold):
+                    regressions.append((name, metric, before[metric], after[metric]))
+        if before["throughput"] and after["throughput"] < before["throughput"] * (
+            1 - threshold
+        ):
+            regressions.append(
+                (name, "throughput", before["throughput"], after["throughput"])
+            )
+    return regressions
+
+
+class _isolated_state:
+    """Point state to a temporary file holding only the stand-in hub, restoring the previous state file afterwards."""
+
+    def __enter__(self):
+        self.previous = config.state_file
+        fd, self.path = tempfile.mkstemp(suffix="cozify-benchmark")
+        os.close(fd)
+        config.setStatePath(self.path)
+        section = "Hubs." + MockHub.hub_id
+        config.state.add_section(section)
+        config.state[section]["hubname"] = MockHub.name
+        config.state[section]["hubtoken"] = "mock-token"
+        config.state["Hubs"]["default"] = MockHub.hub_id
+        config.state["Cloud"]["remotetoken"] = "mock-cloud-token"
+        return section
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        cache.invalidate()
+        index.invalidate()
+        config.setStatePath(self.previous)
+        os.remove(self.path)
@@ -0,0 +1,94 @@
+"""Command line entry point of the benchmark, see cozify.benchmark."""
+
+import argparse
+import json
+import sys
+
+from . import cases, compare, run
+
+
+def main(argv=None):
+    """Run the benchmark, print a summary and optionally store and compare the results.
+
+    Args:
+        argv(list): Command line arguments without the program name. Defaults to None which uses sys.argv.
+
+    Returns:
+        int: Exit status, 1 if regressions were found against a baseline.
+    """
+    parser = argparse.ArgumentParser(
+        prog="python3 -m cozify.benchmark",
+        description="Benchmark python-cozify against a local stand-in hub.",
+    )
+    parser.add_argument(
+        "--cases",
+        default=",".join(cases),
+        help="comma separated cases to run, default: all of %(default)s",
+    )
+    parser.add_argument("--devices", type=int, default=50, help="devices on the hub")
+    parser.add_argument(
+        "--latency", type=float, default=0.0, help="seconds of hub latency per call"
+    )
+    parser.add_argument("--iterations", type=int, default=100)
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--output", help="file to write the results to as JSON")
+    parser.add_argument(
+        "--compare", help="results JSON of a previous run to compare to"
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.1,
+        help="relative change counted as a regression, default: %(default)s",
+    )
+    args = parser.parse_args(argv)
+
+    results = run(
+        names=args.cases.split(","),
+        devices=args.devices,
+        latency=args.latency,
+        iterations=args.iterations,
+        warmup=args.warmup,
+        concurrency=args.concurrency,
+    )
+    print(
+        "{0:<18} {1:>10} {2:>9} {3:>9} {4:>7}".format(
+            "case", "calls/s", "p50 ms", "p99 ms", "errors"
+        )
+    )
+    for name, r in results["results"].items():
+        print(
+            "{0:<18} {1:>10.1f} {2:>9.3f} {3:>9.3f} {4:>7}".format(
+                name, r["throughput"], r["p50_ms"] or 0, r["p99_ms"] or 0, r["errors"]
+            )
+        )
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        for key in ("devices", "latency", "concurrency"):
+            if baseline["meta"].get(key) != results["meta"][key]:
+                print(
+                    "Warning: {0} differs from the baseline ({1} vs {2}), results may not be comparable.".format(
+                        key, baseline["meta"].get(key), results["meta"][key]
+                    )
+                )
+        regressions = compare(baseline, results, args.threshold)
+        for name, metric, before, after in regressions:
+            print(
+                "REGRESSION {0} {1}: {2:.3f} -> {3:.3f}".format(
+                    name, metric, before, after
+                )
+            )
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,75 @@
+"""Benchmark cases. Each takes a cozify.benchmark.Environment, does any setup needed and returns the function to time."""
+
+from .. import hub, hub_api
+
+
+def devices(env):
+    """Full device read."""
+    return lambda: hub.devices(**env.kwargs)
+
+
+def devices_filtered(env):
+    """Device read filtered to devices with every capability of a multisensor."""
+    capabilities = [hub.capability.TEMPERATURE, hub.capability.HUMIDITY]
+    return lambda: hub.devices(capabilities=capabilities, and_filter=True, **env.kwargs)
+
+
+def devices_cached(env):
+    """Filtered device read served from the snapshot cache after the first call."""
+    return lambda: hub.devices(
+        capabilities=hub.capability.BRIGHTNESS, max_age=3600, **env.kwargs
+    )
+
+
+def command(env):
+    """Single device command, validated against the cached cozify.index after the first call."""
+    lamp = _lamps(env)[0]
+    return lambda: hub.device_on(lamp, **env.kwargs)
+
+
+def batch(env):
+    """Brightness of up to 10 lights set in a single batch."""
+    lamps = _lamps(env)[:10]
+
+    def run():
+        with hub.batch(**env.kwargs) as b:
+            for lamp in lamps:
+                b.light_brightness(lamp, 0.5)
+
+    return run
+
+
+def await_state(env):
+    """Waiting for a state change the hub reports right away."""
+    lamp = _lamps(env)[0]
+
+    def run():
+        wanted = not env.mock.devices[lamp]["state"]["isOn"]
+        env.mock.report(lamp, isOn=wanted)
+        if not hub.await_state(lamp, {"isOn": wanted}, timeout=5, **env.kwargs):
+            raise TimeoutError("State of {0} never matched".format(lamp))
+
+    return run
+
+
+def ping(env):
+    """Hub ping, resolving hub, tokens and host from state like any high-level call."""
+
+    def run():
+        if not hub.ping(autorefresh=False, **env.kwargs):
+            raise ConnectionError("Ping failed")
+
+    return run
+
+
+def hub_info(env):
+    """Unauthenticated /hub identification call, as made for every candidate hub during authentication."""
+    return lambda: hub_api.hub(host=env.mock.host, port=env.mock.port, remote=False)
+
+
+def _lamps(env):
+    return [
+        device_id
+        for device_id, dev in env.mock.devices.items()
+        if "BRIGHTNESS" in dev["capabilities"]["values"]
+    ]
@@ -0,0 +1,482 @@
+"""Local stand-in hub for tests and benchmarks that need a real HTTP round trip without hardware.
+
+Serves the subset of the hub API the library uses: /hub, /hub/tz, /devices, /devices/command, /scenes and /scenes/command.
+"""
+
+import collections
+import copy
+import json
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from .. import hub_api
+
+lamp_ikea = {
+    "capabilities": {
+        "type": "SET",
+        "values": [
+            "IDENTIFY",
+            "ALERT",
+            "ON_OFF",
+            "CONTROL_LIGHT",
+            "COLOR_TEMP",
+            "BRIGHTNESS",
+            "DEVICE",
+        ],
+    },
+    "groups": ["86397059-1341-4398-8274-3dcef21d0d54"],
+    "id": "d0bd9e1e-9857-4f57-ad53-bc9cbe667c35",
+    "manufacturer": "IKEA of Sweden",
+    "model": None,
+    "name": "Table hanger 3",
+    "room": ["87658ab7-bc4f-4d03-85a2-eb32ee1d4539"],
+    "rwx": 509,
+    "state": {
+        "brightness": 0.1529,
+        "colorMode": "ct",
+        "hue": -1,
+        "isOn": True,
+        "lastSeen": 1515949335273,
+        "maxTemperature": 4000.0,
+        "minTemperature": 2202.643171806167,
+        "reachable": True,
+        "saturation": -1,
+        "temperature": 2202.643171806167,
+        "transitionMsec": None,
+        "type": "STATE_LIGHT",
+    },
+    "timestamp": 1515949335281,
+    "type": "LIGHT",
+    "zones": [],
+}
+
+lamp_osram = {
+    "capabilities": {
+        "type": "SET",
+        "values": [
+            "IDENTIFY",
+            "ALERT",
+            "ON_OFF",
+            "CONTROL_LIGHT",
+            "TRANSITION",
+            "COLOR_TEMP",
+            "BRIGHTNESS",
+            "DEVICE",
+            "COLOR_LOOP",
+            "COLOR_HS",
+        ],
+    },
+    "description": None,
+    "deviceType": None,
+    "groups": [],
+    "id": "a371469c-ae3e-11e5-ab7a-68c90bba878f",
+    "manufacturer": "OSRAM",
+    "model": "Classic A60 RGBW",
+    "name": "Dining Täble",
+    "room": ["87658ab7-bc4f-4d03-85a2-eb32ee1d4539"],
+    "rwx": 509,
+    "state": {
+        "brightness": 0.4667,
+        "colorMode": "hs",
+        "hue": 0.5061454830783556,
+        "isOn": False,
+        "lastSeen": 1508181980242,
+        "maxTemperature": 6622.516556291391,
+        "minTemperature": 2000.0,
+        "reachable": False,
+        "saturation": 1,
+        "temperature": -1,
+        "transitionMsec": None,
+        "type": "STATE_LIGHT",
+    },
+    "timestamp": 1515949468373,
+    "type": "LIGHT",
+    "zones": [],
+}
+
+strip_osram = {
+    "capabilities": {
+        "type": "SET",
+        "values": [
+            "IDENTIFY",
+            "ALERT",
+            "ON_OFF",
+            "CONTROL_LIGHT",
+            "TRANSITION",
+            "COLOR_TEMP",
+            "BRIGHTNESS",
+            "DEVICE",
+            "COLOR_LOOP",
+            "COLOR_HS",
+        ],
+    },
+    "groups": ["bc5eb203-1b98-491b-9184-6a855b344a32"],
+    "id": "4bec213d-8319-4d02-ac2d-6cf34d80ae73",
+    "manufacturer": "OSRAM",
+    "model": "Flex RGBW",
+    "name": "JP Bookshelf",
+    "room": ["be69e1df-b552-42cb-b9fb-eecf8c7087c7"],
+    "rwx": 509,
+    "state": {
+        "brightness": 0.5297,
+        "colorMode": "hs",
+        "hue": 0.2617993877991494,
+        "isOn": True,
+        "lastSeen": 1515949638592,
+        "maxTemperature": 6622.516556291391,
+        "minTemperature": 1501.5015015015015,
+        "reachable": True,
+        "saturation": 1,
+        "temperature": -1,
+        "transitionMsec": None,
+        "type": "STATE_LIGHT",
+    },
+    "timestamp": 1515949638596,
+    "type": "LIGHT",
+    "zones": [],
+}
+
+twilight_nexa = {
+    "capabilities": {"type": "SET", "values": ["DEVICE", "TWILIGHT"]},
+    "description": None,
+    "deviceType": None,
+    "groups": [],
+    "id": "cd9bd0da-f1d5-11e5-8834-68c90bba878f",
+    "manufacturer": "Nexa",
+    "model": "Twilight Sensor",
+    "name": "Nexa Twilight 1",
+    "room": [],
+    "rwx": 509,
+    "state": {
+        "lastSeen": 1515845023652,
+        "reachable": True,
+        "twilight": True,
+        "twilightStart": 1515845022577,
+        "twilightStop": 1515832900640,
+        "type": "STATE_TWILIGHT",
+    },
+    "timestamp": 1515845023656,
+    "type": "TWILIGHT",
+    "zones": [],
+}
+
+plafond_osram = {
+    "capabilities": {
+        "type": "SET",
+        "values": [
+            "IDENTIFY",
+            "ALERT",
+            "ON_OFF",
+            "CONTROL_LIGHT",
+            "TRANSITION",
+            "COLOR_TEMP",
+            "BRIGHTNESS",
+            "DEVICE",
+        ],
+    },
+    "groups": [],
+    "id": "720b5285-06a3-4069-81e1-519d5b45048d",
+    "manufacturer": "OSRAM",
+    "model": "Surface Light TW",
+    "name": "Lower Stairway",
+    "room": ["87658ab7-bc4f-4d03-85a2-eb32ee1d4539"],
+    "rwx": 509,
+    "state": {
+        "brightness": 0,
+        "colorMode": "ct",
+        "hue": -1,
+        "isOn": False,
+        "lastSeen": 1515951870541,
+        "maxTemperature": 6535.9477124183,
+        "minTemperature": 2702.7027027027025,
+        "reachable": True,
+        "saturation": -1,
+        "temperature": 2702.7027027027025,
+        "transitionMsec": None,
+        "type": "STATE_LIGHT",
+    },
+    "timestamp": 1515951870545,
+    "type": "LIGHT",
+    "zones": [],
+}
+
+multisensor = {
+    "capabilities": {
+        "type": "SET",
+        "values": ["TEMPERATURE", "HUMIDITY", "BATTERY_U", "DEVICE"],
+    },
+    "groups": [],
+    "id": "b7b2d8e4-5c4f-4a51-9bb2-2c1d0e4b7a10",
+    "manufacturer": "Aqara",
+    "model": "Temperature and humidity sensor",
+    "name": "Living room sensor",
+    "room": ["87658ab7-bc4f-4d03-85a2-eb32ee1d4539"],
+    "rwx": 509,
+    "state": {
+        "batteryV": 3.0,
+        "humidity": 38.0,
+        "lastSeen": 1515951870541,
+        "reachable": True,
+        "temperature": 21.5,
+        "type": "STATE_MULTI_SENSOR",
+    },
+    "timestamp": 1515951870545,
+    "type": "MULTI_SENSOR",
+    "zones": [],
+}
+
+power_plug = {
+    "capabilities": {
+        "type": "SET",
+        "values": [
+            "ON_OFF",
+            "CONTROL_POWER",
+            "MEASURE_POWER",
+            "ACTIVE_POWER",
+            "DEVICE",
+        ],
+    },
+    "groups": [],
+    "id": "2b8cf0a4-6f0e-4d7a-8c3b-8f8f1b7e9d21",
+    "manufacturer": "Nexa",
+    "model": "Plug",
+    "name": "Coffee maker",
+    "room": ["87658ab7-bc4f-4d03-85a2-eb32ee1d4539"],
+    "rwx": 509,
+    "state": {
+        "activePower": 2.5,
+        "isOn": True,
+        "lastSeen": 1515951870541,
+        "reachable": True,
+        "totalPower": 1337.0,
+        "type": "STATE_POWER_SOCKET",
+    },
+    "timestamp": 1515951870545,
+    "type": "POWER_SOCKET",
+    "zones": [],
+}
+
+templates = [
+    lamp_ikea,
+    lamp_osram,
+    strip_osram,
+    plafond_osram,
+    twilight_nexa,
+    multisensor,
+    power_plug,
+]
+
+
+def synthetic_devices(count):
+    """Generate a devices dict of the given size by cycling through known device templates.
+
+    Args:
+        count(int): Number of devices to generate.
+
+    Returns:
+        dict: Devices dict in the same shape as returned by the /devices API call.
+    """
+    out = {}
+    for i in range(count):
+        d = copy.deepcopy(templates[i % len(templates)])
+        d["id"] = str(uuid.UUID(int=i))
+        d["name"] = "{0} {1}".format(d["name"], i)
+        out[d["id"]] = d
+    return out
+
+
+def synthetic_scenes(count):
+    """Generate a scenes dict of the given size.
+
+    Args:
+        count(int): Number of scenes to generate.
+
+    Returns:
+        dict: Scenes dict in the same shape as returned by the /scenes API call.
+    """
+    out = {}
+    for i in range(count):
+        scene_id = str(uuid.UUID(int=i + 1000000))
+        out[scene_id] = {
+            "category": "USER",
+            "id": scene_id,
+            "isOn": False,
+            "name": "Scene {0}".format(i),
+        }
+    return out
+
+
+class MockHub:
+    """Threaded HTTP server pretending to be a hub.
+
+    Args:
+        devices(dict): Devices to serve. Defaults to None which generates device_count synthetic devices.
+        device_count(int): Number of synthetic devices to generate if devices is not given. Defaults to 5.
+        scene_count(int): Number of synthetic scenes to serve. Defaults to 2.
+        latency(float): Artificial delay in seconds added to every response. Defaults to 0.
+        hub_token(str): If set, calls without a matching Authorization header are refused with a 401.
+
+    Attributes:
+        host(str): Address the server listens on.
+        port(int): Port the server listens on, allocated at random.
+        devices(dict): Live device state, modified by commands.
+        scenes(dict): Live scene state, modified by commands.
+        calls(collections.Counter): Count of calls served, keyed by (method, path).
+    """
+
+    hub_id = "deadbeef-aaaa-bbbb-cccc-mockhubddddd"
+    name = "MockyMcHubFace"
+
+    def __init__(
+        self,
+        devices=None,
+        device_count=5,
+        scene_count=2,
+        latency=0.0,
+        hub_token=None,
+    ):
+        if devices is None:
+            devices = synthetic_devices(device_count)
+        self.devices = copy.deepcopy(devices)
+        self.scenes = synthetic_scenes(scene_count)
+        self.latency = latency
+        self.hub_token = hub_token
+        self.calls = collections.Counter()
+        self.lock = threading.Lock()
+        self._server = _Server(("127.0.0.1", 0), _handler(self))
+        self._server.daemon_threads = True
+        self.host, self.port = self._server.server_address
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def count(self, method, path):
+        """Number of calls served for a method and path, path given without the API version prefix."""
+        return self.calls[(method, path)]
+
+    def reset(self):
+        """Forget served call counts."""
+        self.calls.clear()
+
+    def report(self, device_id, **state):
+        """Update device state as if the device itself reported it, e.g. a sensor reading."""
+        with self.lock:
+            device = self.devices[device_id]
+            device["state"].update(state)
+            self._touch(device)
+
+    def kwargs(self):
+        """kwargs to pass to cozify functions to direct calls at this hub."""
+        return {
+            "hub_id": self.hub_id,
+            "host": self.host,
+            "port": self.port,
+            "remote": False,
+            "hub_token": self.hub_token or "mock-token",
+            "cloud_token": "mock-cloud-token",
+        }
+
+    def _route(self, method, path, body):
+        if path == "/hub":
+            return {"hubId": self.hub_id, "name": self.name, "version": "1.14"}
+        if not path.startswith(hub_api.apiPath):
+            return None
+        path = path[len(hub_api.apiPath) :]
+        self.calls[(method, path)] += 1
+        with self.lock:
+            if method == "GET" and path == "/hub/tz":
+                return "Europe/Helsinki"
+            if method == "GET" and path == "/devices":
+                return self.devices
+            if method == "GET" and path == "/scenes":
+                return self.scenes
+            if method == "PUT" and path == "/devices/command":
+                for command in json.loads(body):
+                    self._device_command(command)
+                return []
+            if method == "PUT" and path == "/scenes/command":
+                for command in json.loads(body):
+                    self.scenes[command["id"]]["isOn"] = (
+                        command["type"] == "CMD_SCENE_ON"
+                    )
+                return []
+        return None
+
+    def _device_command(self, command):
+        device = self.devices[command["id"]]
+        state = device["state"]
+        if command["type"] == "CMD_DEVICE_ON":
+            state["isOn"] = True
+        elif command["type"] == "CMD_DEVICE_OFF":
+            state["isOn"] = False
+        else:
+            for key, value in command.get("state", {}).items():
+                if value is not None:
+                    state[key] = value
+        self._touch(device)
+
+    def _touch(self, device):
+        now = int(time.time() * 1000)
+        device["state"]["lastSeen"] = now
+        device["timestamp"] = now
+
+
+class _Server(ThreadingHTTPServer):
+    request_queue_size = 128
+
+
+def _handler(mock):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = (
+            True  # headers and body go out separately, don't stall on delayed ACKs
+        )
+
+        def do_GET(self):
+            self._respond("GET")
+
+        def do_PUT(self):
+            self._respond("PUT")
+
+        def _respond(self, method):
+            length = int(self.headers.get("Content-Length", 0))
+            body = self.rfile.read(length) if length else None
+            if mock.latency:
+                time.sleep(mock.latency)
+            if (
+                mock.hub_token
+                and self.path != "/hub"
+                and self.headers.get("Authorization") != mock.hub_token
+            ):
+                return self._send(401, b"Unauthorized")
+            payload = mock._route(method, self.path, body)
+            if payload is None:
+                return self._send(404, b"Not found")
+            self._send(200, json.dumps(payload).encode("utf8"))
+
+        def _send(self, code, data):
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
@@ -0,0 +1,238 @@
+"""Module for caching device snapshots so that bursts of reads can share a single fetch.
+
+Caching is opt-in. Enable it for all calls with cache.enable() or per call by passing max_age to hub.devices() or any function
+that reads devices through it, such as hub.device(), hub.has_state(), hub.device_exists() or hub.device_toggle().
+Cached snapshots are shared between callers and must be treated as read-only.
+
+Commands sent successfully through cozify.hub_api are written through to the cached snapshot of their hub, so reading right
+after a command returns the commanded state without a new fetch. Such devices are pending confirmation until the next real
+fetch replaces the snapshot, at which point the outcome is reconciled and logged.
+
+Attributes:
+    default_max_age(float): Default maximum age in seconds of a cached snapshot. None means caching is disabled unless requested per call. Defaults to None.
+"""
+
+import threading
+import time
+
+from absl import logging
+
+from . import index, tracing
+
+default_max_age = None
+
+_snapshots = {}  # hub_id -> (time.monotonic() of fetch, devices dict)
+_pending = {}  # hub_id -> {device_id: state changes not yet confirmed by a fetch}
+_fetch_locks = {}  # hub_id -> threading.Lock, held while fetching
+_capability_indexes = {}  # hub_id -> (devices dict, index.CapabilityIndex)
+_lock = threading.Lock()
+
+
+def enable(max_age=1.0):
+    """Enable caching for all device reads.
+
+    Args:
+        max_age(float): Maximum age in seconds of a snapshot to still be used. Defaults to 1.
+    """
+    global default_max_age
+    default_max_age = max_age
+
+
+def disable():
+    """Disable default caching and drop all cached snapshots."""
+    global default_max_age
+    default_max_age = None
+    invalidate()
+
+
+def invalidate(hub_id=None):
+    """Drop cached snapshots so the next read fetches fresh data.
+
+    Args:
+        hub_id(str): Hub to invalidate. Defaults to None which invalidates all hubs.
+    """
+    with _lock:
+        if hub_id is None:
+            _snapshots.clear()
+            _pending.clear()
+            _capability_indexes.clear()
+        else:
+            _snapshots.pop(hub_id, None)
+            _pending.pop(hub_id, None)
+            _capability_indexes.pop(hub_id, None)
+
+
+def get(hub_id, max_age=None):
+    """Get a cached snapshot if it's fresh enough.
+
+    Args:
+        hub_id(str): Hub to look up.
+        max_age(float): Maximum acceptable age in seconds. Defaults to None which uses the module default.
+
+    Returns:
+        dict: Cached devices dict or None if not cached or too old.
+    """
+    if max_age is None:
+        max_age = default_max_age
+    if max_age is None:
+        return None
+    entry = _snapshots.get(hub_id)
+    if entry is not None and time.monotonic() - entry[0] <= max_age:
+        return entry[1]
+    return None
+
+
+def put(hub_id, devs):
+    """Store a freshly fetched snapshot.
+
+    Args:
+        hub_id(str): Hub the snapshot is from.
+        devs(dict): Unfiltered devices dict as returned by the API.
+    """
+    with _lock:
+        _snapshots[hub_id] = (time.monotonic(), devs)
+        pending = _pending.pop(hub_id, {})
+    for device_id, changes in pending.items():
+        state = devs.get(device_id, {}).get("state", {})
+        mismatch = {k: v for k, v in changes.items() if state.get(k) != v}
+        if mismatch:
+            logging.debug(
+                "Write-through for device {0} not confirmed, hub reports otherwise for: {1}".format(
+                    device_id, mismatch
+                )
+            )
+        else:
+            logging.debug("Write-through for device {0} confirmed.".format(device_id))
+
+
+def apply(hub_id, commands):
+    """Write successfully sent device commands through to the cached snapshot of a hub.
+
+    The snapshot is copied on write, so snapshots already handed out are left untouched.
+    Affected devices are marked pending confirmation until the next real fetch.
+
+    Args:
+        hub_id(str): Hub the commands were sent to.
+        commands(list): Commands as sent to /devices/command.
+    """
+    with _lock:
+        entry = _snapshots.get(hub_id)
+        if entry is None:
+            return
+        fetched, devs = entry
+        devs = dict(devs)
+        for command in commands:
+            device_id = command.get("id")
+            changes = _command_changes(command)
+            if device_id not in devs or not changes:
+                continue
+            dev = dict(devs[device_id])
+            dev["state"] = dict(dev["state"], **changes)
+            devs[device_id] = dev
+            _pending.setdefault(hub_id, {}).setdefault(device_id, {}).update(changes)
+        _snapshots[hub_id] = (fetched, devs)
+        memo = _capability_indexes.get(hub_id)
+        if (
+            memo is not None and memo[0] is entry[1]
+        ):  # commands don't change capabilities
+            _capability_indexes[hub_id] = (devs, memo[1])
+
+
+def capability_index(hub_id, devs):
+    """Get the capability index of the cached snapshot of a hub, built on first use. See cozify.index.CapabilityIndex.
+
+    Args:
+        hub_id(str): Hub the snapshot is from.
+        devs(dict): Devices dict as returned by get() or fetch().
+
+    Returns:
+        index.CapabilityIndex: Index of devs or None if devs is not the cached snapshot, making an index not worth building.
+    """
+    entry = _snapshots.get(hub_id)
+    if entry is None or entry[1] is not devs:
+        return None
+    memo = _capability_indexes.get(hub_id)
+    if memo is not None and memo[0] is devs:
+        return memo[1]
+    idx = index.CapabilityIndex(devs)
+    with _lock:
+        _capability_indexes[hub_id] = (devs, idx)
+    return idx
+
+
+def pending(hub_id):
+    """Get devices with written-through state that hasn't been confirmed by a fetch yet.
+
+    Returns:
+        dict: device_id -> dict of state changes pending confirmation.
+    """
+    with _lock:
+        return {k: dict(v) for k, v in _pending.get(hub_id, {}).items()}
+
+
+def age(hub_id):
+    """Age in seconds of the cached snapshot of a hub, or None if there is none."""
+    entry = _snapshots.get(hub_id)
+    if entry is None:
+        return None
+    return time.monotonic() - entry[0]
+
+
+def active(max_age=None):
+    """Check if caching is in use for a call with the given max_age.
+
+    Returns:
+        bool: True if snapshots should be looked up and stored.
+    """
+    return default_max_age is not None or bool(max_age)
+
+
+def fetch(hub_id, fetcher, max_age=None):
+    """Return a cached snapshot or fetch and cache a new one. Concurrent callers missing the cache share a single fetch.
+
+    Args:
+        hub_id(str): Hub to get the snapshot for.
+        fetcher(function): Called without arguments to fetch a fresh devices dict.
+        max_age(float): Maximum acceptable age in seconds. 0 forces a fetch. Defaults to None which uses the module default. If caching is not enabled by default and max_age is not positive the cache is bypassed entirely.
+
+    Returns:
+        dict: Devices dict.
+    """
+    if not active(max_age):
+        return fetcher()
+    devs = get(hub_id, max_age)
+    if devs is not None:
+        logging.debug("Device snapshot cache hit for hub {0}".format(hub_id))
+        tracing.event("cache hit", "cache", hub_id=hub_id)
+        return devs
+    started = time.monotonic()
+    with _lock:
+        fetch_lock = _fetch_locks.setdefault(hub_id, threading.Lock())
+    with fetch_lock:
+        entry = _snapshots.get(hub_id)
+        if entry is not None and entry[0] >= started:  # fetched while we waited
+            tracing.event("cache shared fetch", "cache", hub_id=hub_id)
+            return entry[1]
+        tracing.event("cache miss", "cache", hub_id=hub_id)
+        devs = fetcher()
+        put(hub_id, devs)
+    return devs
+
+
+def _command_changes(command):
+    """State changes a device command is expected to cause.
+
+    Returns:
+        dict: Changed state keys and their new values.
+    """
+    if command.get("type") == "CMD_DEVICE_ON":
+        return {"isOn": True}
+    if command.get("type") == "CMD_DEVICE_OFF":
+        return {"isOn": False}
+    if command.get("type") == "CMD_DEVICE":
+        return {
+            k: v
+            for k, v in command.get("state", {}).items()
+            if v is not None and k != "type" and not isinstance(v, dict)
+        }
+    return {}
@@ -1,13 +1,19 @@
 """Module for handling Cozify Cloud highlevel operations.
+
+Attributes:
+    probe_timeout(float): Seconds to wait for each candidate hub to answer when looking for hubs. Defaults to 2.
 """
 
+import concurrent.futures
 import datetime
 
 from absl import logging
 
-from . import cloud_api, config, hub_api
+from . import cloud_api, config, hub_api, tracing
 from .Error import APIError, AuthenticationError, ConnectionError
 
+probe_timeout = 2.0
+
 
 def authenticate(trustCloud=True, trustHub=True, remote=False, autoremote=True):
     """Authenticate with the Cozify Cloud and Hub.
@@ -67,10 +73,8 @@ def authenticate(trustCloud=True, trustHub=True, remote=False, autoremote=True):
         cloud_token = _getAttr("remoteToken")
 
     if _need_hub_token(trustHub):
-        localHubs = (
-            cloud_api.lan_ip()
-        )  # will only work if we're local to the Hub, otherwise None
-        # TODO(artanicus): unknown what will happen if there is a local hub but another one remote. Needs testing by someone with multiple hubs. Issue #7
+        # will only find hubs if we're local to them. Probed concurrently and matched to hub_ids by their replies
+        localHubs = _probe_lan(cloud_api.lan_ip())
         hubkeys = cloud_api.hubkeys(
             cloud_token
         )  # get all registered hubs and their keys from the cloud.
@@ -78,57 +82,44 @@ def authenticate(trustCloud=True, trustHub=True, remote=False, autoremote=True):
             logging.fatal(
                 "You have not registered any hubs to the Cozify Cloud, hence a hub cannot be used yet."
             )
+        remoteHubs = _probe_remote(
+            {k: v for k, v in hubkeys.items() if k not in localHubs}, cloud_token
+        )
 
         # evaluate all returned Hubs and store them
         for hub_id, hub_token in hubkeys.items():
             logging.debug("hub: {0} token: {1}".format(hub_id, hub_token))
-            hub_info = None
             hub_ip = None
+            hub_remote = remote
 
-            if not hub.exists(hub_id):
-                autoremote = True
-            else:
-                autoremote = hub.autoremote(hub_id=hub_id)
-            # if we're remote, we didn't get a valid ip
-            if not localHubs:
-                logging.info("No local Hubs detected, changing to remote mode.")
-                hub_info = hub_api.hub(
-                    remote=True, cloud_token=cloud_token, hub_token=hub_token
-                )
+            if hub_id in localHubs:
+                hub_ip, hub_info = localHubs[hub_id]
                 # if the hub wants autoremote we flip the state. If this is the first time the hub is seen, act as if autoremote=True, remote=False
                 if not hub.exists(hub_id) or (
-                    hub.autoremote(hub_id) and not hub.remote(hub_id)
+                    hub.autoremote(hub_id) and hub.remote(hub_id)
                 ):
                     logging.info(
-                        "[autoremote] Flipping hub remote status from local to remote."
+                        "[autoremote] Flipping hub remote status from remote to local."
                     )
-                    remote = True
+                    hub_remote = False
             else:
-                # localHubs is valid so a hub is in the lan. A mixed environment cannot yet be detected.
-                # cloud_api.lan_ip cannot provide a map as to which ip is which hub. Thus we actually need to determine the right one.
-                # TODO(artanicus): Need to truly test how multihub works before implementing ip to hub resolution. See issue #7
-                hub_ip = localHubs[0]
-                hub_info = hub_api.hub(host=hub_ip, remote=False)
+                # if we're remote, we didn't get a valid ip
+                logging.info(
+                    "Hub {0} not detected locally, changing to remote mode.".format(
+                        hub_id
+                    )
+                )
+                hub_info = remoteHubs[hub_id]
                 # if the hub wants autoremote we flip the state. If this is the first time the hub is seen, act as if autoremote=True, remote=False
                 if not hub.exists(hub_id) or (
-                    hub.autoremote(hub_id) and hub.remote(hub_id)
+                    hub.autoremote(hub_id) and not hub.remote(hub_id)
                 ):
                     logging.info(
-                        "[autoremote] Flipping hub remote status from remote to local."
+                        "[autoremote] Flipping hub remote status from local to remote."
                     )
-                    remote = False
+                    hub_remote = True
 
             hub_name = hub_info["name"]
-            if hub_id in hubkeys:
-                hub_token = hubkeys[hub_id]
-            else:  # pragma: no cover
-                logging.error(
-                    'The hub "{0}" is not linked to the given account: "{1}"'.format(
-                        hub_name, _getAttr("email")
-                    )
-                )
-                resetState()
-                return False
 
             # if hub name not already known, create named section
             hubSection = "Hubs." + hub_id
@@ -141,8 +132,9 @@ def authenticate(trustCloud=True, trustHub=True, remote=False, autoremote=True):
             # store Hub data under it's named section
             hub._setAttr(hub_id, "host", hub_ip, commit=False)
             hub._setAttr(hub_id, "hubName", hub_name, commit=False)
-            hub.token(hub_id, hub_token)
-            hub.remote(hub_id, remote)
+            hub._setAttr(hub_id, "hubtoken", hub_token, commit=False)
+            hub._setAttr(hub_id, "remote", hub_remote, commit=False)
+        config.stateWrite()  # all hubs in one write
     return True
 
 
@@ -162,13 +154,71 @@ def update_hubs():
 
     from . import hub
 
-    hubs = cloud_api.lan_ip()
-    for hub_ip in hubs:
-        info = hub_api.hub(host=hub_ip)
-        hub_id = info["hubId"]
-        hub_name = info["name"]
+    found = {
+        hub_id: answer
+        for hub_id, answer in _probe_lan(cloud_api.lan_ip()).items()
+        if hub.exists(hub_id)  # hubs we hold no token for are left to authenticate()
+    }
+    for hub_id, (hub_ip, info) in found.items():
         hub._setAttr(hub_id, "host", hub_ip, commit=False)
-        hub._setAttr(hub_id, "hubName", hub_name)
+        hub._setAttr(hub_id, "hubName", info["name"], commit=False)
+    if found:
+        config.stateWrite()  # all hubs in one write
+
+
+def _probe_lan(hub_ips):
+    """Query /hub of every candidate ip address concurrently. Addresses that don't answer in probe_timeout are skipped.
+
+    Args:
+        hub_ips(list): ip addresses that may be hubs, e.g. as returned by cloud_api.lan_ip(). None is treated as empty.
+
+    Returns:
+        dict: hub_id -> (ip address, hub info dict) for every address that answered.
+    """
+    found = {}
+    if not hub_ips:
+        return found
+    with concurrent.futures.ThreadPoolExecutor(max_workers=len(hub_ips)) as executor:
+        futures = {
+            executor.submit(
+                hub_api.hub, host=hub_ip, remote=False, request_timeout=probe_timeout
+            ): hub_ip
+            for hub_ip in hub_ips
+        }
+        for future in concurrent.futures.as_completed(futures):
+            hub_ip = futures[future]
+            try:
+                info = future.result()
+            except (APIError, ConnectionError) as e:
+                logging.warning("No hub answered at {0}: {1}".format(hub_ip, e))
+                continue
+            found[info["hubId"]] = (hub_ip, info)
+    return found
+
+
+def _probe_remote(hubkeys, cloud_token):
+    """Query /hub of hubs remotely via the cloud, concurrently.
+
+    Args:
+        hubkeys(dict): hub_id -> hub_token of hubs to query.
+        cloud_token(str): Cloud authentication token.
+
+    Returns:
+        dict: hub_id -> hub info dict. Raises the first failure, if any.
+    """
+    if not hubkeys:
+        return {}
+    with concurrent.futures.ThreadPoolExecutor(max_workers=len(hubkeys)) as executor:
+        infos = executor.map(
+            lambda hub_token: hub_api.hub(
+                remote=True,
+                cloud_token=cloud_token,
+                hub_token=hub_token,
+                request_timeout=probe_timeout,
+            ),
+            hubkeys.values(),
+        )
+        return dict(zip(hubkeys, infos))
 
 
 def ping(autorefresh=True, expiry=None):
@@ -341,6 +391,7 @@ def _getAttr(attr):
     Returns:
         str: Value of attribute or exception on failure
     """
+    tracing.event("state " + attr, "config")
     section = "Cloud"
     if section in config.state and attr in config.state[section]:
         return config.state[section][attr]
@@ -5,10 +5,11 @@ Attributes:
 
 """
 
-import json
+import time
 
 import requests
 
+from . import metrics, session, tracing
 from .Error import APIError, AuthenticationError, ConnectionError
 
 cloudBase = "https://cloud2.cozify.fi/ui/0.2"
@@ -33,7 +34,7 @@ def get(
         json_output(bool): Assume API will return json and decode it.
     """
     return _call(
-        method=requests.get,
+        method="GET",
         call="{0}{1}".format(base, call),
         headers=headers,
         no_headers=no_headers,
@@ -64,7 +65,7 @@ def post(
         no_headers(bool): Allow calling without headers or data.
     """
     return _call(
-        method=requests.post,
+        method="POST",
         call="{0}{1}".format(base, call),
         headers=headers,
         data=data,
@@ -89,7 +90,7 @@ def put(
         no_headers(bool): Allow calling without headers or data.
     """
     return _call(
-        method=requests.put,
+        method="PUT",
         call="{0}{1}".format(base, call),
         headers=headers,
         no_headers=no_headers,
@@ -164,22 +165,39 @@ def refreshsession(cloud_token, **kwargs):  # pragma: no cover
     return get("/user/refreshsession", headers=headers, json_output=False, **kwargs)
 
 
-def remote(apicall, headers, data=None):
+def remote(apicall, headers, data=None, timeout=5):
     """1:1 implementation of 'hub/remote'
 
     Args:
         apicall(str): Full API call that would normally go directly to hub, e.g. '/cc/1.6/hub/colors'
         headers(dict): Headers to send with request. Must contain Authorization & X-Hub-Key data.
         data(str): json string to use as payload, changes method to PUT.
+        timeout(float): Seconds to wait for a response. Defaults to 5.
 
     Returns:
         requests.response: Requests response object.
     """
 
+    # already recorded as a hub call by cozify.hub_api, one round trip is counted once
     if data:
-        return put("/hub/remote" + apicall, headers=headers, data=data, raw=True)
+        return put(
+            "/hub/remote" + apicall,
+            headers=headers,
+            data=data,
+            base=cloudBase,
+            raw=True,
+            request_timeout=timeout,
+            record=False,
+        )
     else:
-        return get("/hub/remote" + apicall, headers=headers, raw=True)
+        return get(
+            "/hub/remote" + apicall,
+            headers=headers,
+            base=cloudBase,
+            raw=True,
+            request_timeout=timeout,
+            record=False,
+        )
 
 
 def _call(
@@ -192,58 +210,121 @@ def _call(
     no_headers=False,
     json_output=True,
     raw=False,
+    request_timeout=5,
+    record=True,
     **kwargs
 ):
     """Backend for get & post
 
     Args:
         call(str): Full API path to call.
-        method(function): requests.get|put function to use for call.
+        method(str): HTTP method to use for call, GET|POST|PUT.
         headers(dict): Header dictionary to pass along to the request.
         params(dict): Params dictionary to POST.
         data(dict): Payload dictionary to PUT.
         no_headers(bool): Allow calling without headers, data or args.
         json_output(bool): Assume API will return json and decode it.
         raw(bool): Do no decoding, return requests.response object.
+        request_timeout(float): Seconds to wait for a response. Defaults to 5.
+        record(bool): Record the call to cozify.metrics and cozify.tracing. Defaults to True.
     """
     if not headers and not data and not params and not no_headers:
         raise AttributeError(
             "Asked to do a call to the cloud without valid headers, data or params. This would never work."
         )
 
+    http = session.get(call)
+    start = time.perf_counter()
     try:
-        if method is requests.put:
+        if method == "PUT":
             if data:
-                response = method(call, headers=headers, data=data, timeout=5)
+                response = http.request(
+                    method, call, headers=headers, data=data, timeout=request_timeout
+                )
             else:
                 raise AttributeError("PUT call with no data, this would fail!")
-        elif method is requests.post:
+        elif method == "POST":
             if data and params:
-                response = method(
-                    call, headers=headers, data=data, params=params, timeout=5
+                response = http.request(
+                    method,
+                    call,
+                    headers=headers,
+                    data=data,
+                    params=params,
+                    timeout=request_timeout,
                 )
             elif data:
-                response = method(call, headers=headers, data=data, timeout=5)
+                response = http.request(
+                    method, call, headers=headers, data=data, timeout=request_timeout
+                )
             elif params:
-                response = method(call, headers=headers, params=params, timeout=5)
+                response = http.request(
+                    method,
+                    call,
+                    headers=headers,
+                    params=params,
+                    timeout=request_timeout,
+                )
             else:
                 raise AttributeError(
                     "POST call with no data or params, this probably makes no sense!"
                 )
 
         elif params:
-            response = method(call, headers=headers, params=params, timeout=5)
+            response = http.request(
+                method, call, headers=headers, params=params, timeout=request_timeout
+            )
         else:
-            response = method(call, headers=headers, timeout=5)
+            response = http.request(
+                method, call, headers=headers, timeout=request_timeout
+            )
 
     except requests.exceptions.RequestException as e:  # pragma: no cover
+        if record:
+            if metrics.enabled:
+                metrics.call(
+                    "cloud",
+                    method,
+                    call,
+                    "error",
+                    time.perf_counter() - start,
+                    path="cloud",
+                )
+            tracing.record(
+                "{0} {1}".format(method, metrics.endpoint(call)),
+                "http",
+                start,
+                path="cloud",
+                error="ConnectionError",
+            )
         raise ConnectionError(str(e)) from None
+    if record:
+        tracing.record(
+            "{0} {1}".format(method, metrics.endpoint(call)),
+            "http",
+            start,
+            path="cloud",
+            status=response.status_code,
+            received=len(response.content),
+        )
+        if metrics.enabled:
+            metrics.call(
+                "cloud",
+                method,
+                call,
+                response.status_code,
+                time.perf_counter() - start,
+                sent=metrics.size(response.request.body),
+                received=len(response.content),
+                path="cloud",
+            )
 
     if response.status_code == 200:
         if raw:
             return response
         if json_output:
-            return response.json()
+            with tracing.span("json decode", "json", bytes=len(response.content)):
+                return metrics.json_loads(response.content, "cloud", call)
         else:
             return response.text
 
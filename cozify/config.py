@@ -1,24 +1,73 @@
 """Module for handling consistent state storage.
 
+Nothing is read or written at import time. The state file path is resolved and the state loaded on first access
+of state_file or state, and the state file and its directories are only created when state is written.
+
 Attributes:
     state_file(str): file path where state storage is kept. By default XDG conventions are used. (Most likely ~/.config/python-cozify/python-cozify.cfg)
-    state(configparser.ConfigParser): State object used for in-memory state. By default initialized with _initState.
+    state(configparser.ConfigParser): State object used for in-memory state. By default initialized with _initState on first access.
+    write_delay(float): Seconds within which further state writes are coalesced into a single deferred write. Defaults to 1.
 """
 
+import atexit
 import configparser
 import datetime
+import io
 import os
+import tempfile
+import threading
+import time
 
 from absl import logging
 
+write_delay = 1.0
+
+_lock = threading.RLock()
+# serializes disk writes, never taken while holding _lock so callers don't wait for the disk
+_io_lock = threading.Lock()
+_version = 0  # number of the latest state snapshot taken
+_pending = None  # (version, path, content) of a deferred write
+_timer = None  # threading.Timer of a deferred write
+_last_write = 0.0  # time.monotonic() of last write to disk
+_written = (0, None, None)  # (version, path, content) known to be on disk
+
+
+def __getattr__(name):
+    """Resolve state_file and load state on first access."""
+    if name == "state_file":
+        return _statePath()
+    if name == "state":
+        return _loadState()
+    raise AttributeError("module {0!r} has no attribute {1!r}".format(__name__, name))
 
-def _initXDG():
-    """Initialize config path per XDG basedir-spec and resolve the final location of state file storage.
+
+def _statePath():
+    """Get state_file, resolving it to the XDG default if it hasn't been set."""
+    global state_file
+    try:
+        return state_file
+    except NameError:
+        state_file = _xdgPath()
+        return state_file
+
+
+def _loadState():
+    """Get state, loading it from state_file if it hasn't been loaded yet."""
+    global state
+    with _lock:
+        try:
+            return state
+        except NameError:
+            state = _initState(_statePath())
+            return state
+
+
+def _xdgPath():
+    """Resolve the location of state file storage per XDG basedir-spec without touching the filesystem.
 
     Returns:
         str: file path to state file as per XDG spec and current env.
     """
-
     # per the XDG basedir-spec we adhere to $XDG_CONFIG_HOME if it's set, otherwise assume $HOME/.config
     xdg_config_home = ""
     if "XDG_CONFIG_HOME" in os.environ:
@@ -26,6 +75,18 @@ def _initXDG():
         logging.debug("XDG basedir overriden: {0}".format(xdg_config_home))
     else:
         xdg_config_home = "%s/.config" % os.path.expanduser("~")
+    return "%s/%s/python-cozify.cfg" % (xdg_config_home, "python-cozify")
+
+
+def _initXDG():
+    """Initialize config path per XDG basedir-spec and resolve the final location of state file storage.
+
+    Returns:
+        str: file path to state file as per XDG spec and current env.
+    """
+    state_file = _xdgPath()
+    config_dir = os.path.dirname(state_file)
+    xdg_config_home = os.path.dirname(config_dir)
 
     # XDG base-dir: "If, when attempting to write a file, the destination directory is non-existant an attempt should be made to create it with permission 0700. If the destination directory exists already the permissions should not be changed."
     if not os.path.isdir(xdg_config_home):
@@ -35,12 +96,10 @@ def _initXDG():
         os.mkdir(xdg_config_home, 0o0700)
 
     # finally create our own config dir
-    config_dir = "%s/%s" % (xdg_config_home, "python-cozify")
     if not os.path.isdir(config_dir):
         logging.debug("XDG local dir does not exist, creating: {0}".format(config_dir))
         os.mkdir(config_dir, 0o0700)
 
-    state_file = "%s/python-cozify.cfg" % config_dir
     logging.debug("state_file determined to be: {0}".format(state_file))
     return state_file
 
@@ -48,35 +107,128 @@ def _initXDG():
 def stateWrite(tmpstate=None):
     """Write current state to file storage.
 
+    The state is serialized on the calling thread, the write itself is always done by a background timer so callers never wait for the disk.
+    Writes are coalesced: the timer fires write_delay seconds after the previous write at the earliest,
+    and stores the latest snapshot taken until then. Use flush() to write out immediately, it is called automatically at exit.
+    Unchanged state is never rewritten.
+
     Args:
-        tmpstate(configparser.ConfigParser): State object to store instead of default state.
+        tmpstate(configparser.ConfigParser): State object to store instead of default state. Written immediately, replacing any deferred write.
     """
-    global state_file
-    if tmpstate is None:
-        global state
-        tmpstate = state
-    with open(state_file, "w") as cf:
-        tmpstate.write(cf)
+    global _pending, _timer
+    if tmpstate is not None:
+        with _lock:
+            _pending = None  # would overwrite tmpstate with an older snapshot
+        _write(tmpstate, _statePath())
+        return
+    with _lock:
+        # the state may be modified by other threads while the write is deferred, so the timer only gets a copy
+        _pending = _snapshot(_loadState(), _statePath())
+        if _timer is None:
+            wait = max(0.0, _last_write + write_delay - time.monotonic())
+            _timer = threading.Timer(wait, flush)
+            _timer.daemon = True
+            _timer.start()
+
+
+def flush():
+    """Write out any deferred state changes immediately. Called automatically at exit."""
+    global _pending, _timer
+    with _lock:
+        if _timer is not None:
+            _timer.cancel()
+            _timer = None
+        pending, _pending = _pending, None
+    if pending is not None:
+        _store(*pending)
+
+
+def _write(tmpstate, path):
+    """Atomically replace the file at path with tmpstate, unless it's already stored there.
+
+    The state is written to a temporary file in the same directory, synced to disk and renamed over the target,
+    so a crash never leaves a partially written state file behind. Missing directories are created as user accessible only.
+
+    Args:
+        tmpstate(configparser.ConfigParser): State object to store.
+        path(str): State storage filepath.
+    """
+    with _lock:
+        snapshot = _snapshot(tmpstate, path)
+    _store(*snapshot)
+
+
+def _snapshot(tmpstate, path):
+    """Serialize state for writing it later. Called with _lock held.
+
+    Returns:
+        tuple: (version, path, content) to pass to _store()
+    """
+    global _version
+    _version += 1
+    buf = io.StringIO()
+    tmpstate.write(buf)
+    return _version, path, buf.getvalue()
+
 
+def _store(version, path, content):
+    """Atomically replace the file at path with a snapshot from _snapshot(), see _write(). Snapshots older than the one on disk are dropped."""
+    global _last_write, _written
+    with _io_lock:
+        if version < _written[0]:
+            logging.debug(
+                "Newer state already written, skipping write to: {0}".format(path)
+            )
+            return
+        if _written[1:] == (path, content):
+            logging.debug("State unchanged, skipping write to: {0}".format(path))
+            _written = (version, path, content)
+            return
+        target = os.path.realpath(path)
+        if not os.path.isdir(os.path.dirname(target)):
+            logging.debug(
+                "State directory does not exist, creating: {0}".format(
+                    os.path.dirname(target)
+                )
+            )
+            os.makedirs(os.path.dirname(target), 0o0700)
+        fd, tmp = tempfile.mkstemp(
+            dir=os.path.dirname(target), prefix=".python-cozify-", suffix=".tmp"
+        )  # created user readwrite only to protect tokens
+        try:
+            with os.fdopen(fd, "w") as cf:
+                cf.write(content)
+                cf.flush()
+                os.fsync(cf.fileno())
+            os.replace(tmp, target)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+        _written = (version, path, content)
+        _last_write = time.monotonic()
 
-def setStatePath(filepath=_initXDG(), copy_current=False):
+
+def setStatePath(filepath=None, copy_current=False):
     """Set state storage path. Useful for example for testing without affecting your normal state. Call with no arguments to reset back to autoconfigured location.
 
     Args:
-        filepath(str): file path to use as new storage location. Defaults to XDG defined path.
-        copy_current(bool): Instead of initializing target file, dump previous state into it.
+        filepath(str): file path to use as new storage location. Defaults to None which uses the XDG defined path.
+        copy_current(bool): Instead of loading state from the target file, dump previous state into it.
     """
     global state_file
-    global state
-    state_file = filepath
+    flush()  # deferred writes belong to the previous path
+    current = _loadState() if copy_current else None
+    state_file = _xdgPath() if filepath is None else filepath
     if copy_current:
-        stateWrite()
+        _write(current, state_file)
     else:
-        state = _initState(state_file)
+        globals().pop("state", None)  # loaded from the new path on next access
 
 
 def dump_state():
     """Print out current state file to stdout. Long values are truncated since this is only for visualization."""
+    state = _loadState()
     for section in state.sections():
         print("[{!s:.10}]".format(section))
         for option in state.options(section):
@@ -84,30 +236,31 @@ def dump_state():
 
 
 def _initState(state_file):
-    """Initialize state on cold start. Any stored state is read in or a new basic state is initialized.
+    """Initialize state on cold start. Any stored state is read in or a new basic state is initialized. Nothing is written.
 
     Args:
         state_file(str): State storage filepath to attempt to read from.
     Returns:
         configparser.ConfigParser: State object.
     """
-    # if we can read it, read it in, otherwise create empty file
+    global _written
+    # if we can read it, read it in, otherwise start empty. The file is created on first write.
     state = configparser.ConfigParser(allow_no_value=True)
     try:
         cf = open(state_file, "r")
     except IOError:
-        cf = open(state_file, "w+")
-        os.chmod(state_file, 0o600)  # set to user readwrite only to protect tokens
+        logging.debug("No state stored yet in: {0}".format(state_file))
     else:
-        state.read_file(cf)
+        with cf:
+            content = cf.read()
+        state.read_string(content, source=state_file)
+        _written = (_written[0], state_file, content)
 
     # make sure config is in roughly a valid state
     for key in ["Cloud", "Hubs"]:
         if key not in state:
             state[key] = {}
-    stateWrite(state)
     return state
 
 
-state_file = _initXDG()
-state = _initState(state_file)
+atexit.register(flush)
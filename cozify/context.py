@@ -0,0 +1,118 @@
+"""Module for resolved hub contexts that take state lookups off the hot path of hub calls.
+
+Every hub function normally resolves its hub id, tokens, host and remote-ness from the state on each call.
+A HubContext does that once and can then be passed to any hub function, or used to call them directly.
+
+Example::
+
+    from cozify import hub
+
+    ctx = hub.context(hub_name="Home")
+    ctx.devices()  # same as hub.devices(context=ctx)
+    hub.device_on(device_id, context=ctx)
+    ctx.refresh()  # re-resolve after the state has changed, e.g. remote-ness was flipped by hub.ping()
+"""
+
+import functools
+
+from . import hub_api, session
+
+# hub functions that can be called through a context
+bound_functions = (
+    "devices",
+    "device",
+    "await_state",
+    "await_states",
+    "watch",
+    "has_state",
+    "device_reachable",
+    "device_exists",
+    "device_eligible",
+    "device_toggle",
+    "device_state_replace",
+    "device_on",
+    "device_off",
+    "light_temperature",
+    "light_color",
+    "light_brightness",
+    "batch",
+    "scenes",
+    "scene",
+    "scene_toggle",
+    "scene_on",
+    "scene_off",
+    "tz",
+    "ping",
+)
+
+
+class HubContext:
+    """Everything needed to call a hub, resolved once from state.
+
+    Args:
+        **kwargs: Hub selection and override kwargs as accepted by all hub functions, e.g. hub_id, hub_name or remote. Anything not given is resolved from state.
+
+    Attributes:
+        hub_id(str): Id of the hub.
+        host(str): ip address or hostname of the hub, may be None for remote hubs.
+        hub_token(str): Hub authentication token.
+        cloud_token(str): Cloud authentication token.
+        remote(bool): True if calls are routed via the cloud.
+        autoremote(bool): True if remote-ness may be flipped automatically.
+        base(str): Base address of local calls to the hub. None for remote hubs.
+        kwargs(dict): All resolved values as kwargs for hub functions.
+    """
+
+    def __init__(self, **kwargs):
+        self._overrides = kwargs
+        self.refresh()
+
+    def refresh(self):
+        """Resolve all values again from state, keeping any overrides given at creation."""
+        from . import hub
+
+        kwargs = dict(self._overrides)
+        hub._resolve_kwargs(kwargs)
+        self.hub_id = kwargs["hub_id"]
+        self.host = kwargs["host"]
+        self.hub_token = kwargs["hub_token"]
+        self.cloud_token = kwargs["cloud_token"]
+        self.remote = kwargs["remote"]
+        self.autoremote = kwargs["autoremote"]
+        self.base = None
+        if not self.remote and self.host:
+            self.base = hub_api._getBase(**kwargs)
+        self.kwargs = kwargs
+
+    @property
+    def transport(self):
+        """requests.Session: Pooled session currently used for local calls to the hub, see cozify.session. None for remote hubs.
+        Looked up on every access and not kept by the context, so an idle session evicted meanwhile is transparently reopened.
+        """
+        if self.base is None:
+            return None
+        return session.get(self.base)
+
+    def fill(self, kwargs):
+        """Fill kwargs with the resolved values. Values already in kwargs take precedence.
+
+        Args:
+            kwargs(dict): kwargs dictionary to fill. Operated on directly.
+        """
+        for key, value in self.kwargs.items():
+            if key not in kwargs:
+                kwargs[key] = value
+
+    def __getattr__(self, name):
+        if name not in bound_functions:
+            raise AttributeError(
+                "'{0}' is not a hub function callable through a context".format(name)
+            )
+        from . import hub
+
+        return functools.partial(getattr(hub, name), context=self)
+
+    def __repr__(self):
+        return "HubContext(hub_id={0!r}, host={1!r}, remote={2!r})".format(
+            self.hub_id, self.host, self.remote
+        )
@@ -0,0 +1,196 @@
+"""Module for structural diffs of device and scene dicts as returned by the API.
+
+Every item gets a fingerprint of its timestamp and a hash of its state (of the whole item for scenes, which have no state).
+Items with differing fingerprints are compared key by key right away. Equal fingerprints don't prove equal data, a rename leaves
+the state alone and hashes collide (hash(-1) == hash(-2)), so those items are confirmed with a plain == which runs in C.
+Keeping the fingerprints of the previous snapshot around, as Tracker does, means each snapshot is hashed only once.
+
+Example::
+
+    from cozify import diff, hub
+
+    tracker = diff.Tracker(hub.devices())
+    for patch in tracker.update(hub.devices(max_age=0)):
+        print(patch.id, patch.op, patch.changes, patch.removed)
+"""
+
+import collections
+import copy
+
+Patch = collections.namedtuple("Patch", ["id", "op", "changes", "removed"])
+Patch.__doc__ = """Minimal change of a single item between two snapshots.
+
+Attributes:
+    id(str): ID of the item.
+    op(str): "add", "remove" or "update".
+    changes(dict): Path tuple -> new value for every value that was added or changed, e.g. {("state", "isOn"): True}. For "add" the whole item is set at the empty path ().
+    removed(tuple): Path tuples of values that no longer exist.
+"""
+
+
+def fingerprint(item):
+    """Fingerprint of an item that changes whenever its timestamp or state does.
+
+    Args:
+        item(dict): Device or scene data.
+
+    Returns:
+        tuple: (timestamp or None, hash of the state values)
+    """
+    return item.get("timestamp"), _hash(item.get("state", item))
+
+
+def fingerprints(items):
+    """Fingerprints of all items of a snapshot.
+
+    Args:
+        items(dict): Devices or scenes dict as returned by the API.
+
+    Returns:
+        dict: id -> fingerprint
+    """
+    return {item_id: fingerprint(item) for item_id, item in items.items()}
+
+
+def diff(old, new, old_prints=None, new_prints=None):
+    """Compute patches turning one snapshot into another.
+
+    Args:
+        old(dict): Previous devices or scenes dict.
+        new(dict): Current devices or scenes dict.
+        old_prints(dict): Fingerprints of old if already known. Defaults to None which computes them.
+        new_prints(dict): Fingerprints of new if already known. Defaults to None which computes them.
+
+    Returns:
+        list: Patch for every added, removed or changed item.
+    """
+    if old_prints is None:
+        old_prints = fingerprints(old)
+    if new_prints is None:
+        new_prints = fingerprints(new)
+    patches = []
+    for item_id, item in new.items():
+        previous = old.get(item_id)
+        if previous is None:
+            patches.append(Patch(item_id, "add", {(): item}, ()))
+        elif old_prints[item_id] != new_prints[item_id] or previous != item:
+            patch = item_patch(item_id, previous, item)
+            if patch is not None:
+                patches.append(patch)
+    for item_id in old.keys() - new.keys():
+        patches.append(Patch(item_id, "remove", {}, ()))
+    return patches
+
+
+def item_patch(item_id, old, new):
+    """Compare two versions of an item key by key, recursing into nested dicts.
+
+    Args:
+        item_id(str): ID of the item.
+        old(dict): Previous item data.
+        new(dict): Current item data.
+
+    Returns:
+        Patch: "update" patch or None if the versions are equal.
+    """
+    changes = {}
+    removed = []
+    _compare(old, new, (), changes, removed)
+    if not changes and not removed:
+        return None
+    return Patch(item_id, "update", changes, tuple(removed))
+
+
+def apply(items, patches):
+    """Apply patches to a snapshot. Neither the snapshot nor its items are modified, changed items are copied.
+
+    Args:
+        items(dict): Devices or scenes dict the patches were computed against.
+        patches(list): Patches as returned by diff().
+
+    Returns:
+        dict: Patched devices or scenes dict.
+    """
+    out = dict(items)
+    for patch in patches:
+        if patch.op == "remove":
+            del out[patch.id]
+            continue
+        if patch.op == "add":
+            out[patch.id] = patch.changes[()]
+            continue
+        item = copy.deepcopy(out[patch.id])
+        for path, value in patch.changes.items():
+            target = item
+            for key in path[:-1]:
+                target = target.setdefault(key, {})
+            target[path[-1]] = value
+        for path in patch.removed:
+            target = item
+            for key in path[:-1]:
+                target = target[key]
+            del target[path[-1]]
+        out[patch.id] = item
+    return out
+
+
+class Tracker:
+    """Keeps the latest snapshot and its fingerprints to diff each new snapshot against.
+
+    Args:
+        items(dict): Initial devices or scenes dict. Defaults to empty, making every item of the first update an "add".
+
+    Attributes:
+        items(dict): Latest snapshot.
+        prints(dict): Fingerprints of the latest snapshot.
+    """
+
+    def __init__(self, items=None):
+        self.items = items or {}
+        self.prints = fingerprints(self.items)
+
+    def update(self, items):
+        """Diff a new snapshot against the latest one and make it the latest.
+
+        Args:
+            items(dict): Current devices or scenes dict.
+
+        Returns:
+            list: Patch for every added, removed or changed item.
+        """
+        prints = fingerprints(items)
+        patches = diff(self.items, items, self.prints, prints)
+        self.items = items
+        self.prints = prints
+        return patches
+
+
+def _compare(old, new, path, changes, removed):
+    for key, value in new.items():
+        if key not in old:
+            changes[path + (key,)] = value
+        elif old[key] != value:
+            if isinstance(value, dict) and isinstance(old[key], dict):
+                _compare(old[key], value, path + (key,), changes, removed)
+            else:
+                changes[path + (key,)] = value
+    for key in old.keys() - new.keys():
+        removed.append(path + (key,))
+
+
+def _hash(obj):
+    """Hash the values of a JSON-like dict. Flat dicts, the common case for states, are hashed in one go.
+    Keys are left out to halve the cost, a change of keys alone is caught by the == that confirms equal fingerprints.
+    """
+    try:
+        return hash(tuple(obj.values()))
+    except TypeError:  # nested dicts or lists
+        return hash(tuple(_hashable(v) for v in obj.values()))
+
+
+def _hashable(value):
+    if isinstance(value, dict):
+        return _hash(value)
+    if isinstance(value, list):
+        return tuple(_hashable(v) for v in value)
+    return value
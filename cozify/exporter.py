@@ -0,0 +1,259 @@
+"""Module for exporting hub health, device state and library call metrics in the Prometheus text format.
+
+Run it as a module to serve http://127.0.0.1:9746/metrics for all known hubs::
+
+    python3 -m cozify.exporter --port 9746 --max-age 10
+
+Every scrape within max_age seconds of the previous one is answered with the same rendering, and devices are read through the
+snapshot cache of cozify.cache, so the hubs are polled at most once per max_age no matter how many scrapers there are.
+Snapshots are only reused for half of max_age, so exported device state is never more than 1.5 times max_age old.
+Hubs are read concurrently.
+Library call metrics are those of cozify.metrics, which is enabled when the exporter is created.
+
+Attributes:
+    gauges(dict): Device state key -> (metric name, help text) of the device values exported. Booleans are exported as 0 or 1.
+"""
+
+import argparse
+import http.server
+import threading
+import time
+
+from absl import logging
+
+from . import cache, hub, metrics
+
+gauges = {
+    "reachable": ("cozify_device_reachable", "1 if the hub can reach the device."),
+    "brightness": ("cozify_device_brightness", "Light brightness, 0 to 1."),
+    "temperature": ("cozify_device_temperature_celsius", "Measured temperature."),
+    "humidity": ("cozify_device_humidity_percent", "Measured relative humidity."),
+    "activePower": ("cozify_device_power_watts", "Measured active power."),
+    "batteryV": ("cozify_device_battery_volts", "Battery voltage."),
+}
+
+
+class Exporter:
+    """Renders the metrics of a set of hubs, reusing the rendering for max_age seconds.
+
+    Args:
+        hub_ids(list): Hubs to export. Defaults to None which exports all hubs known at the time of each rendering.
+        max_age(float): Seconds a rendering is reused for. Device snapshots are reused for half of that. Defaults to 10.
+        max_workers(int): Maximum number of hubs read at the same time. Defaults to 8.
+        timeout(float): Seconds to wait for each hub to respond. Defaults to 5.
+        **kwargs: Passed on to cozify.hub.devices(), e.g. remote or port.
+    """
+
+    def __init__(self, hub_ids=None, max_age=10.0, max_workers=8, timeout=5, **kwargs):
+        self.hub_ids = hub_ids
+        self.max_age = max_age
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.kwargs = kwargs
+        self.renders = 0
+        self._lock = threading.Lock()
+        self._rendered = (None, None)  # (time.monotonic() of rendering, text)
+        metrics.enable()
+
+    def render(self):
+        """Get the current metrics. Concurrent callers wait for and share a single rendering.
+
+        Returns:
+            str: Metrics in the Prometheus text exposition format.
+        """
+        with self._lock:
+            when, text = self._rendered
+            if when is None or time.monotonic() - when >= self.max_age:
+                text = self._render()
+                self._rendered = (time.monotonic(), text)
+                self.renders += 1
+            return text
+
+    def _render(self):
+        def read(**kwargs):
+            start = time.perf_counter()
+            devs = hub.devices(**kwargs)
+            return devs, time.perf_counter() - start
+
+        hub_ids = self.hub_ids if self.hub_ids is not None else hub.ids()
+        # snapshots older than half of max_age are re-read, a rendering of older data is never reused for another max_age
+        results, errors = hub._fan_out(
+            read,
+            hub_ids,
+            self.max_workers,
+            self.timeout,
+            dict(self.kwargs, max_age=self.max_age / 2),
+        )
+        up, age, duration = [], [], []
+        values = {key: [] for key in gauges}
+        for hub_id in hub_ids:
+            labels = {"hub_id": hub_id, "hub_name": hub.name(hub_id) or ""}
+            if hub_id in errors:
+                up.append((labels, 0))
+                continue
+            devs, seconds = results[hub_id]
+            duration.append((labels, seconds))
+            up.append((labels, 1))
+            age.append((labels, cache.age(hub_id) or 0.0))
+            for device_id, dev in devs.items():
+                state = dev.get("state", {})
+                device_labels = {
+                    "hub_id": hub_id,
+                    "device_id": device_id,
+                    "name": dev.get("name", ""),
+                    "type": dev.get("type", ""),
+                }
+                for key in gauges:
+                    value = state.get(key)
+                    if isinstance(value, (bool, int, float)):
+                        values[key].append((device_labels, float(value)))
+
+        lines = []
+        _family(
+            lines,
+            "cozify_hub_up",
+            "gauge",
+            "1 if devices could be read from the hub.",
+            up,
+        )
+        _family(
+            lines,
+            "cozify_hub_read_seconds",
+            "gauge",
+            "Time taken to read devices, near 0 when served from the snapshot cache.",
+            duration,
+        )
+        _family(
+            lines,
+            "cozify_hub_snapshot_age_seconds",
+            "gauge",
+            "Age of the device snapshot exported.",
+            age,
+        )
+        for key, (name, description) in gauges.items():
+            _family(lines, name, "gauge", description, values[key])
+        _library(lines, metrics.snapshot())
+        return "\n".join(lines) + "\n"
+
+
+def server(exporter, port=9746, host="127.0.0.1"):
+    """Create a threaded HTTP server that serves the exporter at /metrics. Start it with serve_forever().
+
+    Args:
+        exporter(Exporter): Exporter to serve.
+        port(int): Port to listen on. 0 picks a free port. Defaults to 9746.
+        host(str): Address to listen on. Defaults to localhost only.
+
+    Returns:
+        http.server.ThreadingHTTPServer: Server, not yet serving.
+    """
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                body, code, kind = b"Not found, try /metrics\n", 404, "text/plain"
+            else:
+                body = exporter.render().encode("utf8")
+                code, kind = 200, "text/plain; version=0.0.4; charset=utf-8"
+            self.send_response(code)
+            self.send_header("Content-Type", kind)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            logging.debug("Exporter: " + format % args)
+
+    httpd = http.server.ThreadingHTTPServer((host, port), Handler)
+    httpd.daemon_threads = True
+    return httpd
+
+
+def main(argv=None):
+    """Command line entry point. Serves until interrupted.
+
+    Args:
+        argv(list): Command line arguments without the program name. Defaults to None which uses sys.argv.
+    """
+    parser = argparse.ArgumentParser(
+        prog="python3 -m cozify.exporter",
+        description="Serve Cozify hub metrics for Prometheus.",
+    )
+    parser.add_argument("--host", default="127.0.0.1", help="address to listen on")
+    parser.add_argument("--port", type=int, default=9746, help="port to listen on")
+    parser.add_argument(
+        "--max-age",
+        type=float,
+        default=10.0,
+        help="seconds to reuse a rendering and device snapshots for",
+    )
+    parser.add_argument(
+        "--hub-id", action="append", dest="hub_ids", help="hub to export, repeatable"
+    )
+    parser.add_argument("--remote", action="store_true", help="read hubs remotely")
+    args = parser.parse_args(argv)
+
+    kwargs = {"remote": True} if args.remote else {}
+    httpd = server(Exporter(args.hub_ids, args.max_age, **kwargs), args.port, args.host)
+    logging.info(
+        "Serving metrics at http://{0}:{1}/metrics".format(args.host, args.port)
+    )
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        httpd.server_close()
+
+
+def _library(lines, snapshot):
+    """Append cozify.metrics counters and histograms."""
+    families = {}
+    for c in snapshot["counters"]:
+        families.setdefault(("cozify_" + c.name, "counter"), []).append(
+            (c.labels, c.value)
+        )
+    for (name, kind), samples in families.items():
+        _family(lines, name, kind, "Library " + name[len("cozify_") :] + ".", samples)
+
+    histograms = {}
+    for h in snapshot["histograms"]:
+        histograms.setdefault("cozify_" + h.name, []).append(h)
+    for name, hs in histograms.items():
+        lines.append("# HELP {0} Library {1}.".format(name, name[len("cozify_") :]))
+        lines.append("# TYPE {0} histogram".format(name))
+        for h in hs:
+            for bound, cumulative in h.buckets:
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(
+                    _sample(name + "_bucket", dict(h.labels, le=le), cumulative)
+                )
+            lines.append(_sample(name + "_sum", h.labels, h.sum))
+            lines.append(_sample(name + "_count", h.labels, h.count))
+
+
+def _family(lines, name, kind, description, samples):
+    if not samples:
+        return
+    lines.append("# HELP {0} {1}".format(name, description))
+    lines.append("# TYPE {0} {1}".format(name, kind))
+    for labels, value in samples:
+        lines.append(_sample(name, labels, value))
+
+
+def _sample(name, labels, value):
+    if not labels:
+        return "{0} {1}".format(name, value)
+    return "{0}{{{1}}} {2}".format(
+        name,
+        ",".join('{0}="{1}"'.format(k, _escape(v)) for k, v in labels.items()),
+        value,
+    )
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+if __name__ == "__main__":
+    main()
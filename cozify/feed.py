@@ -0,0 +1,99 @@
+"""Module for turning successive device snapshots into a feed of state changes.
+
+See cozify.hub.watch() and cozify.aio.watch() for the entry points. All watchers poll on the same schedule, aligned
+to multiples of their interval, and read devices through cozify.cache, so watchers of the same hub with the same
+interval share a single fetch per round.
+
+Attributes:
+    ignored_keys(tuple): State keys that change on every report and are never reported as changes themselves.
+"""
+
+import collections
+import time
+
+from . import diff
+
+ignored_keys = ("lastSeen",)
+
+Change = collections.namedtuple(
+    "Change", ["device_id", "keys", "old", "new", "last_seen"]
+)
+Change.__doc__ = """State change of a single device.
+
+Attributes:
+    device_id(str): ID of the changed device.
+    keys(tuple): Sorted names of the changed state keys.
+    old(dict): Previous values of the changed keys, keys missing before are left out. Empty for new devices.
+    new(dict): Current values of the changed keys, keys missing now are left out. Empty for removed devices.
+    last_seen(int): lastSeen timestamp of the device in ms as reported by the hub, None for removed devices.
+"""
+
+
+def changes(old_devs, new_devs):
+    """Compare two device snapshots.
+
+    Devices whose timestamp and lastSeen are unchanged are skipped without comparing their states.
+    Such devices keep their old data in the returned baseline, so changes written through to a cached snapshot
+    (see cozify.cache) are only reported once the hub confirms them.
+
+    Args:
+        old_devs(dict): Previous devices dict.
+        new_devs(dict): Current devices dict.
+
+    Returns:
+        tuple: (list of Change, devices dict to compare the next snapshot against)
+    """
+    events = []
+    baseline = {}
+    for device_id, new in new_devs.items():
+        old = old_devs.get(device_id)
+        if old is None:
+            state = new["state"]
+            events.append(_change(device_id, {}, state, state.get("lastSeen")))
+            baseline[device_id] = new
+            continue
+        if old.get("timestamp") == new.get("timestamp") and old["state"].get(
+            "lastSeen"
+        ) == new["state"].get("lastSeen"):
+            baseline[device_id] = old
+            continue
+        baseline[device_id] = new
+        event = _diff(device_id, old["state"], new["state"])
+        if event is not None:
+            events.append(event)
+    for device_id, old in old_devs.items():
+        if device_id not in new_devs:
+            events.append(_change(device_id, old["state"], {}, None))
+    return events, baseline
+
+
+def next_tick(interval):
+    """Seconds until the next multiple of interval on the monotonic clock, the shared schedule of all watchers."""
+    return interval - time.monotonic() % interval
+
+
+def _diff(device_id, old, new):
+    patch = diff.item_patch(device_id, old, new)
+    if patch is None:
+        return None
+    keys = {path[0] for path in patch.changes} | {path[0] for path in patch.removed}
+    keys.difference_update(ignored_keys)
+    if not keys:
+        return None
+    return _change(
+        device_id,
+        {k: old[k] for k in keys if k in old},
+        {k: new[k] for k in keys if k in new},
+        new.get("lastSeen"),
+    )
+
+
+def _change(device_id, old, new, last_seen):
+    keys = tuple(sorted(k for k in old.keys() | new.keys() if k not in ignored_keys))
+    return Change(
+        device_id,
+        keys,
+        {k: v for k, v in old.items() if k in keys},
+        {k: v for k, v in new.items() if k in keys},
+        last_seen,
+    )
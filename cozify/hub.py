@@ -1,13 +1,15 @@
-"""Module for handling highlevel Cozify Hub operations.
-"""
+"""Module for handling highlevel Cozify Hub operations."""
 
+import concurrent.futures
 import math
 import time
 from enum import Enum
 
 from absl import logging
 
-from . import config, hub_api
+from . import cache, config, feed, hub_api, index
+from . import model as models
+from . import tracing, waiter
 from .Error import APIError, ConnectionError
 
 # Enum of known device capabilities. Alphabetically sorted, numeric value not guaranteed to stay constant between versions if new capabilities are added.
@@ -19,12 +21,17 @@ capability = Enum(
 ### Device data ###
 
 
-def devices(*, capabilities=None, and_filter=False, **kwargs):
+@tracing.traced("hub")
+def devices(
+    *, capabilities=None, and_filter=False, max_age=None, model=False, **kwargs
+):
     """Get up to date full devices data set as a dict. Optionally can be filtered to only include certain devices.
 
     Args:
         capabilities(cozify.hub.capability): Single or list of cozify.hub.capability types to filter by, for example: [ cozify.hub.capability.TEMPERATURE, cozify.hub.capability.HUMIDITY ]. Defaults to no filtering.
         and_filter(bool): Multi-filter by AND instead of default OR. Defaults to False.
+        max_age(float): Accept a cached snapshot up to this many seconds old, 0 forces a fresh fetch. Defaults to None which uses cozify.cache defaults, i.e. no caching unless enabled.
+        model(bool): Return cozify.model.Devices instead of raw dicts. Defaults to False.
         **hub_name(str): optional name of hub to query. Will get converted to hubId for use.
         **hub_id(str): optional id of hub to query. A specified hub_id takes presedence over a hub_name or default Hub. Providing incorrect hub_id's will create cruft in your state but it won't hurt anything beyond failing the current operation.
         **remote(bool): Remote or local query.
@@ -32,39 +39,26 @@ def devices(*, capabilities=None, and_filter=False, **kwargs):
         **hubName(str): Deprecated. Compatibility keyword for hub_name, to be removed in v0.3
 
     Returns:
-        dict: full live device state as returned by the API
+        dict: full live device state as returned by the API, or cozify.model.Devices if model is set.
 
     """
     _fill_kwargs(kwargs)
-    devs = hub_api.devices(**kwargs)
-    if capabilities:
-        if isinstance(capabilities, capability):  # single capability given
-            return {
-                key: value
-                for key, value in devs.items()
-                if capabilities.name in value["capabilities"]["values"]
-            }
-        else:  # multi-filter
-            if and_filter:
-                return {
-                    key: value
-                    for key, value in devs.items()
-                    if all(
-                        c.name in value["capabilities"]["values"] for c in capabilities
-                    )
-                }
-            else:  # or_filter
-                return {
-                    key: value
-                    for key, value in devs.items()
-                    if any(
-                        c.name in value["capabilities"]["values"] for c in capabilities
-                    )
-                }
-    else:  # no filtering
-        return devs
+    idx = None
+    if "mock_devices" in kwargs:
+        devs = hub_api.devices(**kwargs)
+    else:
+        devs = cache.fetch(
+            kwargs["hub_id"], lambda: hub_api.devices(**kwargs), max_age=max_age
+        )
+        if capabilities:
+            idx = cache.capability_index(kwargs["hub_id"], devs)
+    devs = _filter_devices(devs, capabilities, and_filter, idx)
+    if model:
+        return models.Devices(devs)
+    return devs
 
 
+@tracing.traced("hub")
 def device(device_id, **kwargs):
     """Get up to date device data set as a dict.
 
@@ -83,6 +77,7 @@ def device(device_id, **kwargs):
     return devs[device_id]
 
 
+@tracing.traced("hub")
 def await_state(device_id, state, timeout=10, **kwargs):
     """Wait for a device to reach a desired state
 
@@ -95,16 +90,57 @@ def await_state(device_id, state, timeout=10, **kwargs):
         bool: True when state matches or False on timeout.
 
     """
+    return await_states({device_id: state}, timeout=timeout, **kwargs)[device_id]
+
+
+@tracing.traced("hub")
+def await_states(expected, timeout=10, **kwargs):
+    """Wait for many devices to reach their desired states, polling all of them together. See cozify.waiter for the polling schedule.
+
+    Args:
+        expected(dict): device_id -> state dict to expect, or an iterable of (device_id, state) pairs. Only the keys given are compared.
+        timeout(int): Timeout of wait time.
+
+    Returns:
+        dict: device_id -> True if the device reached its state or False on timeout.
+    """
     _fill_kwargs(kwargs)
+    kwargs.setdefault("max_age", 0)  # never trust cached or written-through state here
+
+    w = waiter.Waiter(expected, timeout)
+    while not w.check(devices(**kwargs)):
+        interval = w.next_interval()
+        if interval is None:
+            break
+        time.sleep(interval)
+    return w.outcomes()
 
-    deadline = time.time() + timeout
-    while time.time() < deadline:
-        if has_state(device_id, state, **kwargs):
-            return True
-        time.sleep(0.1)
-    return False
 
+def watch(interval=1.0, *, capabilities=None, and_filter=False, **kwargs):
+    """Generate state change events of devices, polling forever. See cozify.feed for details.
 
+    Args:
+        interval(float): Seconds between polls. Defaults to 1.
+        capabilities(cozify.hub.capability): Only watch devices with these capabilities, see devices(). Defaults to all devices.
+        and_filter(bool): Multi-filter by AND instead of default OR. Defaults to False.
+        **max_age(float): Maximum age of a shared snapshot to use. Defaults to half the interval, keep it well below the interval or ticks get skipped.
+
+    Yields:
+        cozify.feed.Change: One event per changed, added or removed device.
+    """
+    _fill_kwargs(kwargs)
+    # Watchers on the same tick share a fetch, but a snapshot from the previous tick must never be reused
+    kwargs.setdefault("max_age", interval / 2)
+
+    previous = devices(capabilities=capabilities, and_filter=and_filter, **kwargs)
+    while True:
+        time.sleep(feed.next_tick(interval))
+        current = devices(capabilities=capabilities, and_filter=and_filter, **kwargs)
+        events, previous = feed.changes(previous, current)
+        yield from events
+
+
+@tracing.traced("hub")
 def has_state(device_id, state, **kwargs):
     """Check if device state matches the provided state keys. Keys not provided are ignored.
 
@@ -127,6 +163,7 @@ def has_state(device_id, state, **kwargs):
     return True
 
 
+@tracing.traced("hub")
 def device_reachable(device_id, **kwargs):
     """Check if device is reachable.
 
@@ -143,6 +180,7 @@ def device_reachable(device_id, **kwargs):
         raise ValueError("Device not found: {}".format(device_id))
 
 
+@tracing.traced("hub")
 def device_exists(device_id, devs=None, state=None, **kwargs):
     """Check if device exists.
 
@@ -164,6 +202,7 @@ def device_exists(device_id, devs=None, state=None, **kwargs):
         return False
 
 
+@tracing.traced("hub")
 def device_eligible(device_id, capability_filter, devs=None, state=None, **kwargs):
     """Check if device matches a AND devices filter.
 
@@ -189,6 +228,7 @@ def device_eligible(device_id, capability_filter, devs=None, state=None, **kwarg
 ### Device control ###
 
 
+@tracing.traced("hub")
 def device_toggle(device_id, **kwargs):
     """Toggle power state of any device capable of it such as lamps. Eligibility is determined by the capability ON_OFF.
 
@@ -209,6 +249,7 @@ def device_toggle(device_id, **kwargs):
     hub_api.devices_command_state(device_id=device_id, state=new_state, **kwargs)
 
 
+@tracing.traced("hub")
 def device_state_replace(device_id, state, **kwargs):
     """Replace the entire state of a device with the provided state. Useful for example for returning to a stored state.
 
@@ -221,15 +262,18 @@ def device_state_replace(device_id, state, **kwargs):
     """
     _fill_kwargs(kwargs)
 
-    if device_exists(device_id, **kwargs):
-        # blank out fields that don't make sense to set
-        for key in ["lastSeen", "reachable", "maxTemperature", "minTemperature"]:
-            state.pop(key, None)
-        hub_api.devices_command_state(device_id=device_id, state=state, **kwargs)
-    else:
-        raise AttributeError("device {0} does not exist.".format(device_id))
+    try:
+        index.eligible(device_id, **kwargs)
+    except ValueError:
+        raise AttributeError("device {0} does not exist.".format(device_id)) from None
+    # blank out fields that don't make sense to set
+    state = dict(state)
+    for key in ["lastSeen", "reachable", "maxTemperature", "minTemperature"]:
+        state.pop(key, None)
+    hub_api.devices_command_state(device_id=device_id, state=state, **kwargs)
 
 
+@tracing.traced("hub")
 def device_on(device_id, **kwargs):
     """Turn on a device that is capable of turning on. Eligibility is determined by the capability ON_OFF.
 
@@ -237,12 +281,11 @@ def device_on(device_id, **kwargs):
         device_id(str): ID of the device to operate on.
     """
     _fill_kwargs(kwargs)
-    if device_eligible(device_id, capability.ON_OFF, **kwargs):
-        hub_api.devices_command_on(device_id, **kwargs)
-    else:
-        raise ValueError("Device not found or not eligible for action.")
+    index.eligible(device_id, capability.ON_OFF, **kwargs)
+    hub_api.devices_command_on(device_id, **kwargs)
 
 
+@tracing.traced("hub")
 def device_off(device_id, **kwargs):
     """Turn off a device that is capable of turning off. Eligibility is determined by the capability ON_OFF.
 
@@ -250,12 +293,11 @@ def device_off(device_id, **kwargs):
         device_id(str): ID of the device to operate on.
     """
     _fill_kwargs(kwargs)
-    if device_eligible(device_id, capability.ON_OFF, **kwargs):
-        hub_api.devices_command_off(device_id, **kwargs)
-    else:
-        raise ValueError("Device not found or not eligible for action.")
+    index.eligible(device_id, capability.ON_OFF, **kwargs)
+    hub_api.devices_command_off(device_id, **kwargs)
 
 
+@tracing.traced("hub")
 def light_temperature(device_id, temperature=2700, transition=0, **kwargs):
     """Set temperature of a light.
 
@@ -265,24 +307,12 @@ def light_temperature(device_id, temperature=2700, transition=0, **kwargs):
         transition(int): Transition length in milliseconds. Defaults to instant.
     """
     _fill_kwargs(kwargs)
-    state = {}  # will be populated by device_eligible
-    if device_eligible(
-        device_id, capability.COLOR_TEMP, state=state, **kwargs
-    ) and _in_range(
-        temperature,
-        low=state["minTemperature"],
-        high=state["maxTemperature"],
-        description="Temperature",
-    ):
-        state = _clean_state(state)
-        state["colorMode"] = "ct"
-        state["temperature"] = temperature
-        state["transitionMsec"] = transition
-        hub_api.devices_command_state(device_id=device_id, state=state, **kwargs)
-    else:
-        raise ValueError("Device not found or not eligible for action.")
+    state = index.eligible(device_id, capability.COLOR_TEMP, **kwargs)
+    state = _temperature_state(state, temperature, transition)
+    hub_api.devices_command_state(device_id=device_id, state=state, **kwargs)
 
 
+@tracing.traced("hub")
 def light_color(device_id, hue, saturation=1.0, transition=0, **kwargs):
     """Set color (hue & saturation) of a light.
 
@@ -293,21 +323,12 @@ def light_color(device_id, hue, saturation=1.0, transition=0, **kwargs):
         transition(int): Transition length in milliseconds. Defaults to instant.
     """
     _fill_kwargs(kwargs)
-    state = {}  # will be populated by device_eligible
-    if (
-        device_eligible(device_id, capability.COLOR_HS, state=state, **kwargs)
-        and _in_range(hue, low=0.0, high=math.pi * 2, description="Hue")
-        and _in_range(saturation, low=0.0, high=1.0, description="Saturation")
-    ):
-        state = _clean_state(state)
-        state["colorMode"] = "hs"
-        state["hue"] = hue
-        state["saturation"] = saturation
-        hub_api.devices_command_state(device_id=device_id, state=state, **kwargs)
-    else:
-        raise ValueError("Device not found or not eligible for action.")
+    state = index.eligible(device_id, capability.COLOR_HS, **kwargs)
+    state = _color_state(state, hue, saturation)
+    hub_api.devices_command_state(device_id=device_id, state=state, **kwargs)
 
 
+@tracing.traced("hub")
 def light_brightness(device_id, brightness, transition=0, **kwargs):
     """Set brightness of a light.
 
@@ -317,20 +338,33 @@ def light_brightness(device_id, brightness, transition=0, **kwargs):
         transition(int): Transition length in milliseconds. Defaults to instant.
     """
     _fill_kwargs(kwargs)
-    state = {}  # will be populated by device_eligible
-    if device_eligible(
-        device_id, capability.BRIGHTNESS, state=state, **kwargs
-    ) and _in_range(brightness, low=0.0, high=1.0, description="Brightness"):
-        state = _clean_state(state)
-        state["brightness"] = brightness
-        hub_api.devices_command_state(device_id=device_id, state=state, **kwargs)
-    else:
-        raise ValueError("Device not found or not eligible for action.")
+    state = index.eligible(device_id, capability.BRIGHTNESS, **kwargs)
+    state = _brightness_state(state, brightness)
+    hub_api.devices_command_state(device_id=device_id, state=state, **kwargs)
+
+
+def batch(max_size=None, max_bytes=None, **kwargs):
+    """Start a batch of device commands to be sent in a single API call. Best used as a context manager, see cozify.batch
+
+    Args:
+        max_size(int): Maximum number of commands per API call, larger batches are split. Defaults to cozify.batch.max_batch_size.
+        max_bytes(int): Maximum size in bytes of the JSON body of an API call, larger batches are split. Defaults to cozify.batch.max_batch_bytes.
+        **hub_id(str): optional id of hub to operate on. A specified hub_id takes presedence over a hub_name or default Hub.
+        **hub_name(str): optional name of hub to operate on.
+        **remote(bool): Remote or local query.
+
+    Returns:
+        cozify.batch.Batch: Batch builder with on(), off(), state() and light_* methods.
+    """
+    from .batch import Batch
+
+    return Batch(max_size=max_size, max_bytes=max_bytes, **kwargs)
 
 
 ### Scene data
 
 
+@tracing.traced("hub")
 def scenes(*, filters=None, **kwargs):
     """Get full scene data set as a dict. Optionally filters scenes by on/off status.
 
@@ -353,6 +387,7 @@ def scenes(*, filters=None, **kwargs):
     return scns
 
 
+@tracing.traced("hub")
 def scene(scene_id, **kwargs):
     """Get scene data set as a dict.
 
@@ -373,6 +408,7 @@ def scene(scene_id, **kwargs):
 ### Scene control
 
 
+@tracing.traced("hub")
 def scene_toggle(scene_id, **kwargs):
     """Toggle on/off state of given scene.
 
@@ -390,6 +426,7 @@ def scene_toggle(scene_id, **kwargs):
         scene_on(scene_id, **kwargs)
 
 
+@tracing.traced("hub")
 def scene_on(scene_id, **kwargs):
     """Turn on a scene.
 
@@ -400,6 +437,7 @@ def scene_on(scene_id, **kwargs):
     hub_api.scenes_command_on(scene_id, **kwargs)
 
 
+@tracing.traced("hub")
 def scene_off(scene_id, **kwargs):
     """Turn off a scene.
 
@@ -413,6 +451,22 @@ def scene_off(scene_id, **kwargs):
 ### Hub modifiers ###
 
 
+def context(**kwargs):
+    """Resolve a hub's id, tokens, host and remote-ness once for reuse in further calls, see cozify.context
+
+    Args:
+        **hub_id(str): optional id of hub to resolve. A specified hub_id takes presedence over a hub_name or default Hub.
+        **hub_name(str): optional name of hub to resolve.
+        **remote(bool): Remote or local calls.
+
+    Returns:
+        cozify.context.HubContext: Context to pass as the context keyword to hub functions, or to call them through.
+    """
+    from .context import HubContext
+
+    return HubContext(**kwargs)
+
+
 def remote(hub_id, new_state=None):
     """Get remote status of matching hub_id or set a new value for it. Always returns current state at the end.
 
@@ -444,6 +498,7 @@ def autoremote(hub_id, new_state=None):
 
 
 ### Hub info ###
+@tracing.traced("hub")
 def tz(**kwargs):
     """Get timezone of given hub or default hub if no id is specified. For more optional kwargs see cozify.hub_api.get()
 
@@ -458,6 +513,7 @@ def tz(**kwargs):
     return hub_api.tz(**kwargs)
 
 
+@tracing.traced("hub")
 def ping(autorefresh=True, **kwargs):
     """Perform a cheap API call to trigger any potential APIError and return boolean for success/failure. For optional kwargs see cozify.hub_api.get()
 
@@ -624,6 +680,61 @@ def default():
         return config.state["Hubs"]["default"]
 
 
+def ids():
+    """Ids of all hubs known in local state.
+
+    Returns:
+        list: hub_id of every hub.
+    """
+    return [
+        section[5:]  # cut out "Hubs."
+        for section in config.state.sections()
+        if section.startswith("Hubs.")
+    ]
+
+
+### Multiple hubs ###
+
+
+@tracing.traced("hub")
+def devices_all(hub_ids=None, max_workers=8, timeout=5, **kwargs):
+    """Get devices of many hubs concurrently. For other arguments see devices()
+
+    Args:
+        hub_ids(list): Hubs to query. Defaults to None which queries all known hubs, see ids().
+        max_workers(int): Maximum number of hubs queried at the same time. Defaults to 8.
+        timeout(float): Seconds to wait for each hub to respond. Defaults to 5.
+
+    Returns:
+        tuple: (dict of hub_id -> devices dict for hubs that responded, dict of hub_id -> exception for hubs that failed)
+    """
+    return _fan_out(devices, hub_ids, max_workers, timeout, kwargs)
+
+
+@tracing.traced("hub")
+def scenes_all(hub_ids=None, max_workers=8, timeout=5, **kwargs):
+    """Get scenes of many hubs concurrently. For arguments see devices_all() and scenes()
+
+    Returns:
+        tuple: (dict of hub_id -> scenes dict for hubs that responded, dict of hub_id -> exception for hubs that failed)
+    """
+    return _fan_out(scenes, hub_ids, max_workers, timeout, kwargs)
+
+
+@tracing.traced("hub")
+def ping_all(hub_ids=None, max_workers=8, timeout=5, autorefresh=False, **kwargs):
+    """Ping many hubs concurrently. For arguments see devices_all() and ping()
+
+    Args:
+        autorefresh(bool): Wether to attempt renewing expired hub tokens, see ping(). Defaults to False since renewal may be interactive.
+
+    Returns:
+        tuple: (dict of hub_id -> ping result for hubs that could be pinged, dict of hub_id -> exception for hubs that failed)
+    """
+    kwargs["autorefresh"] = autorefresh
+    return _fan_out(ping, hub_ids, max_workers, timeout, kwargs)
+
+
 ### Internals ###
 
 
@@ -638,6 +749,7 @@ def _getAttr(hub_id, attr, default=None, boolean=False):
     Returns:
         str: Value of attribute or exception on failure.
     """
+    tracing.event("state " + attr, "config", hub_id=hub_id)
     section = "Hubs." + hub_id
     if section in config.state:
         if attr not in config.state[section]:
@@ -705,8 +817,52 @@ def _get_id(**kwargs):
     return default()
 
 
+def _fan_out(func, hub_ids, max_workers, timeout, kwargs):
+    """Call a hub function for many hubs in a bounded thread pool, collecting errors instead of raising them.
+
+    Returns:
+        tuple: (dict of hub_id -> return value, dict of hub_id -> exception)
+    """
+    if hub_ids is None:
+        hub_ids = ids()
+    results = {}
+    errors = {}
+    if not hub_ids:
+        return results, errors
+    kwargs["request_timeout"] = timeout
+    with concurrent.futures.ThreadPoolExecutor(
+        max_workers=min(max_workers, len(hub_ids))
+    ) as executor:
+        futures = {
+            executor.submit(func, hub_id=hub_id, **kwargs): hub_id for hub_id in hub_ids
+        }
+        for future in concurrent.futures.as_completed(futures):
+            hub_id = futures[future]
+            try:
+                results[hub_id] = future.result()
+            except Exception as e:
+                logging.warning("Hub {0} failed: {1}".format(hub_id, e))
+                errors[hub_id] = e
+    return results, errors
+
+
+@tracing.traced("hub")
 def _fill_kwargs(kwargs):
     """Check that common items are present in kwargs and fill them if not.
+    A HubContext given as the context keyword is used instead of resolving values from state.
+
+    Args:
+    kwargs(dict): kwargs dictionary to fill. Operated on directly.
+
+    """
+    if "context" in kwargs:
+        kwargs.pop("context").fill(kwargs)
+    else:
+        _resolve_kwargs(kwargs)
+
+
+def _resolve_kwargs(kwargs):
+    """Resolve common items missing from kwargs from state.
 
     Args:
     kwargs(dict): kwargs dictionary to fill. Operated on directly.
@@ -729,6 +885,50 @@ def _fill_kwargs(kwargs):
         kwargs["host"] = host(kwargs["hub_id"])
 
 
+@tracing.traced("hub")
+def _filter_devices(devs, capabilities=None, and_filter=False, capability_index=None):
+    """Filter a devices dict by capabilities. For arguments see devices()
+
+    Args:
+        devs(dict): Devices dict as returned by the API.
+        capability_index(cozify.index.CapabilityIndex): Index of devs to filter with instead of scanning all devices. Defaults to None.
+
+    Returns:
+        dict: Devices matching the filter, or devs as-is if no filter was given.
+    """
+    if capabilities and capability_index is not None:
+        return {
+            key: devs[key] for key in capability_index.select(capabilities, and_filter)
+        }
+    if capabilities:
+        if isinstance(capabilities, capability):  # single capability given
+            return {
+                key: value
+                for key, value in devs.items()
+                if capabilities.name in value["capabilities"]["values"]
+            }
+        else:  # multi-filter
+            if and_filter:
+                return {
+                    key: value
+                    for key, value in devs.items()
+                    if all(
+                        c.name in value["capabilities"]["values"] for c in capabilities
+                    )
+                }
+            else:  # or_filter
+                return {
+                    key: value
+                    for key, value in devs.items()
+                    if any(
+                        c.name in value["capabilities"]["values"] for c in capabilities
+                    )
+                }
+    else:  # no filtering
+        return devs
+
+
+@tracing.traced("hub")
 def _clean_state(state):
     """Return purged state of values so only wanted values can be modified.
 
@@ -746,6 +946,52 @@ def _clean_state(state):
     return out
 
 
+def _temperature_state(state, temperature, transition=0):
+    """Build the command state for light_temperature() from the current device state.
+
+    Returns:
+        dict: Clean state with the new temperature set. Raises a ValueError if out of the device's range.
+    """
+    _in_range(
+        temperature,
+        low=state["minTemperature"],
+        high=state["maxTemperature"],
+        description="Temperature",
+    )
+    state = _clean_state(state)
+    state["colorMode"] = "ct"
+    state["temperature"] = temperature
+    state["transitionMsec"] = transition
+    return state
+
+
+def _color_state(state, hue, saturation=1.0):
+    """Build the command state for light_color() from the current device state.
+
+    Returns:
+        dict: Clean state with the new hue & saturation set. Raises a ValueError if out of range.
+    """
+    _in_range(hue, low=0.0, high=math.pi * 2, description="Hue")
+    _in_range(saturation, low=0.0, high=1.0, description="Saturation")
+    state = _clean_state(state)
+    state["colorMode"] = "hs"
+    state["hue"] = hue
+    state["saturation"] = saturation
+    return state
+
+
+def _brightness_state(state, brightness):
+    """Build the command state for light_brightness() from the current device state.
+
+    Returns:
+        dict: Clean state with the new brightness set. Raises a ValueError if out of range.
+    """
+    _in_range(brightness, low=0.0, high=1.0, description="Brightness")
+    state = _clean_state(state)
+    state["brightness"] = brightness
+    return state
+
+
 def _in_range(value, low, high, description="undefined"):
     """Check that the value is in the given range, raise an error if not.
     None is always considered a valid value.
@@ -4,12 +4,13 @@ Attributes:
     apiPath(str): Hub API endpoint path including version. Things may suddenly stop working if a software update increases the API version on the Hub. Incrementing this value until things work will get you by until a new version is published.
 """
 
-import json
+import concurrent.futures
+import time
 
 import requests
 from absl import logging
 
-from cozify import cloud_api
+from cozify import cache, cloud_api, metrics, routing, session, tracing
 
 from .Error import APIError, ConnectionError
 
@@ -31,9 +32,13 @@ def get(call, hub_token_header=True, base=apiPath, **kwargs):
         **hub_token(str): Hub authentication token.
         **remote(bool): If call is to be local or remote (bounced via cloud).
         **cloud_token(str): Cloud authentication token. Only needed if remote = True.
+        **transport(requests.Session): Session to use for local calls. Defaults to the pooled session of the host, see cozify.session
+        **request_timeout(float): Seconds to wait for a response. Defaults to 5.
+        **route(bool): Set to False to always use the path given by remote even if routing is enabled, see cozify.routing. Defaults to True.
+        **hedge(bool): Set to False to not hedge this read even if hedging is enabled, see cozify.routing. Defaults to True.
     """
     return _call(
-        method=requests.get,
+        method="GET",
         call="{0}{1}".format(base, call),
         hub_token_header=hub_token_header,
         **kwargs
@@ -50,7 +55,7 @@ def put(call, data, hub_token_header=True, base=apiPath, **kwargs):
         base(str): Base path to call from API instead of global apiPath. Defaults to apiPath.
     """
     return _call(
-        method=requests.put,
+        method="PUT",
         call="{0}{1}".format(base, call),
         hub_token_header=hub_token_header,
         data=data,
@@ -63,7 +68,7 @@ def _call(*, call, method, hub_token_header, data=None, **kwargs):
 
     Args:
         call(str): Full API path to call.
-        method(function): requests.get|put function to use for call.
+        method(str): HTTP method to use for call, GET|PUT.
     """
     response = None
     headers = {}
@@ -76,30 +81,19 @@ def _call(*, call, method, hub_token_header, data=None, **kwargs):
             )
         headers["Authorization"] = kwargs["hub_token"]
     if data is not None:
-        data = json.dumps(data)
+        with tracing.span("json encode", "json"):
+            data = metrics.json_dumps(data, "hub", call)
         headers["content-type"] = "application/json"
 
-    if "remote" in kwargs and kwargs["remote"]:  # remote call
-        if "cloud_token" not in kwargs:
-            raise AttributeError("Asked to do remote call but no cloud_token provided.")
-        headers["Authorization"] = kwargs["cloud_token"]
-        headers["X-Hub-Key"] = kwargs["hub_token"]
-        response = cloud_api.remote(apicall=call, data=data, headers=headers)
-    else:  # local call
-        if "host" not in kwargs or not kwargs["host"]:
-            raise AttributeError(
-                "Local call but no hostname was provided. Either set keyword remote or host."
-            )
-        try:
-            response = method(
-                _getBase(**kwargs) + call, headers=headers, data=data, timeout=5
-            )
-        except requests.exceptions.RequestException as e:  # pragma: no cover
-            raise ConnectionError(str(e)) from None
+    if routing.enabled and "hub_id" in kwargs:
+        response = _routed(method, call, headers, data, kwargs)
+    else:
+        response = _send(method, call, headers, data, kwargs.get("remote"), kwargs)
 
     # evaluate response, wether it was remote or local
     if response.status_code == 200:
-        return response.json()
+        with tracing.span("json decode", "json", bytes=len(response.content)):
+            return metrics.json_loads(response.content, "hub", call)
     elif response.status_code == 410:  # pragma: no cover
         raise APIError(
             response.status_code,
@@ -113,6 +107,211 @@ def _call(*, call, method, hub_token_header, data=None, **kwargs):
         )
 
 
+def _send(method, call, headers, data, remote, kwargs):
+    """Send a call over the local or the remote path, recording it to cozify.metrics and cozify.tracing if enabled.
+
+    Returns:
+        requests.response: Response of the hub, as is.
+    """
+    if not metrics.enabled and not tracing.active():
+        return _transport(method, call, headers, data, remote, kwargs)
+    labels = {"hub_id": kwargs.get("hub_id"), "path": "remote" if remote else "local"}
+    with tracing.span(
+        "{0} {1}".format(method, metrics.endpoint(call)), "http", **labels
+    ) as span:
+        start = time.perf_counter()
+        try:
+            response = _transport(method, call, headers, data, remote, kwargs)
+        except ConnectionError:
+            if metrics.enabled:
+                metrics.call(
+                    "hub", method, call, "error", time.perf_counter() - start, **labels
+                )
+            raise
+        except APIError as e:  # remote calls fail in cloud_api on any status but 200
+            span.set(status=e.status_code)
+            if metrics.enabled:
+                metrics.call(
+                    "hub",
+                    method,
+                    call,
+                    e.status_code,
+                    time.perf_counter() - start,
+                    sent=metrics.size(data),
+                    **labels
+                )
+            raise
+        sizes = {"sent": metrics.size(data), "received": len(response.content)}
+        span.set(status=response.status_code, **sizes)
+        if metrics.enabled:
+            metrics.call(
+                "hub",
+                method,
+                call,
+                response.status_code,
+                time.perf_counter() - start,
+                **sizes,
+                **labels
+            )
+    return response
+
+
+def _transport(method, call, headers, data, remote, kwargs):
+    if remote:
+        if "cloud_token" not in kwargs:
+            raise AttributeError("Asked to do remote call but no cloud_token provided.")
+        headers = dict(headers)
+        headers["Authorization"] = kwargs["cloud_token"]
+        headers["X-Hub-Key"] = kwargs["hub_token"]
+        return cloud_api.remote(
+            apicall=call,
+            data=data,
+            headers=headers,
+            timeout=kwargs.get("request_timeout", 5),
+        )
+    if "host" not in kwargs or not kwargs["host"]:
+        raise AttributeError(
+            "Local call but no hostname was provided. Either set keyword remote or host."
+        )
+    try:
+        base = _getBase(**kwargs)
+        http = kwargs.get("transport") or session.get(base)
+        return http.request(
+            method,
+            base + call,
+            headers=headers,
+            data=data,
+            timeout=kwargs.get("request_timeout", 5),
+        )
+    except requests.exceptions.RequestException as e:  # pragma: no cover
+        raise ConnectionError(str(e)) from None
+
+
+def _routed(method, call, headers, data, kwargs):
+    """Send a call over the path picked by cozify.routing and record how it went.
+    The path not in use is probed in the background when due. Failed reads are retried once over the other path.
+    Reads listed in routing.hedge_calls are hedged if hedging is enabled.
+
+    Returns:
+        requests.response: Response of the hub, as is.
+    """
+    hub_id = kwargs["hub_id"]
+    preferred = "remote" if kwargs.get("remote") else "local"
+    available = []
+    if kwargs.get("host"):
+        available.append("local")
+    if kwargs.get("cloud_token") and kwargs.get("autoremote", True):
+        available.append("remote")
+    hedge = kwargs.pop("hedge", True)
+    if not kwargs.pop("route", True) or len(available) < 2:
+        return _timed(method, call, headers, data, preferred, kwargs)
+
+    path = routing.choose(hub_id, preferred)
+    other = "remote" if path == "local" else "local"
+    routing.probe(
+        hub_id,
+        other,
+        lambda: tz(
+            **dict(
+                kwargs,
+                remote=other == "remote",
+                request_timeout=routing.probe_timeout,
+                route=False,
+            )
+        ),
+    )
+    if (
+        hedge
+        and routing.hedging
+        and method == "GET"
+        and call.endswith(routing.hedge_calls)
+    ):
+        return _hedged(method, call, headers, data, path, other, kwargs)
+    try:
+        return _timed(method, call, headers, data, path, kwargs)
+    except (ConnectionError, APIError) as e:
+        if method != "GET" or not _path_failed(e):
+            raise  # a command may have gone through, don't repeat it
+        logging.warning(
+            "Call to hub {0} failed over {1} path, retrying over {2} path: {3}".format(
+                hub_id, path, other, e
+            )
+        )
+        return _timed(method, call, headers, data, other, kwargs)
+
+
+def _hedged(method, call, headers, data, path, other, kwargs):
+    """Send a read over path and, if it isn't answered within the hedge delay, over the other path as well.
+    The call that loses the race is left to finish in the background so its outcome still gets recorded.
+
+    Returns:
+        requests.response: The first successful response, or the first response at all if neither succeeded.
+    """
+    hub_id = kwargs["hub_id"]
+    executor = routing.executor()
+    first = executor.submit(_timed, method, call, headers, data, path, kwargs)
+    try:
+        response = first.result(timeout=routing.hedge_delay(hub_id, path))
+    except concurrent.futures.TimeoutError:
+        pass
+    except (ConnectionError, APIError) as e:
+        if not _path_failed(e):
+            routing.record_hedge(hub_id, hedged=False)
+            raise
+        # failed fast, hedge right away
+    else:
+        if response.status_code < 500:
+            routing.record_hedge(hub_id, hedged=False)
+            return response
+
+    logging.debug(
+        "Hedging read {0} to hub {1} over {2} path.".format(call, hub_id, other)
+    )
+    second = executor.submit(_timed, method, call, headers, data, other, kwargs)
+    fallback = None
+    pending = {first, second}
+    while pending:
+        done, pending = concurrent.futures.wait(
+            pending, return_when=concurrent.futures.FIRST_COMPLETED
+        )
+        for future in done:
+            error = future.exception()
+            if (error is None and future.result().status_code < 500) or (
+                error is not None and not _path_failed(error)
+            ):
+                routing.record_hedge(hub_id, hedged=True, won=future is second)
+                return future.result()
+            fallback = fallback or future
+    routing.record_hedge(hub_id, hedged=True)
+    return fallback.result()
+
+
+def _timed(method, call, headers, data, path, kwargs):
+    """_send() with the outcome recorded to cozify.routing. Server side errors count as failures of the path."""
+    start = time.monotonic()
+    try:
+        response = _send(method, call, headers, data, path == "remote", kwargs)
+    except (
+        ConnectionError,
+        APIError,
+    ) as e:  # remote replies other than 200 are raised by cloud_api
+        if _path_failed(e):
+            routing.record(kwargs["hub_id"], path)
+        else:
+            routing.record(kwargs["hub_id"], path, time.monotonic() - start)
+        raise
+    if response.status_code >= 500:
+        routing.record(kwargs["hub_id"], path)
+    else:
+        routing.record(kwargs["hub_id"], path, time.monotonic() - start)
+    return response
+
+
+def _path_failed(e):
+    """Check if an exception of a call means its path failed, i.e. no answer or a server side error, rather than the hub refusing the call."""
+    return isinstance(e, ConnectionError) or e.status_code >= 500
+
+
 def hub(**kwargs):
     """1:1 implementation of /hub API call. For kwargs see cozify.hub_api.get()
 
@@ -149,6 +348,8 @@ def devices(**kwargs):
 def devices_command(command, **kwargs):
     """1:1 implementation of /devices/command. For kwargs see cozify.hub_api.put()
 
+    On success the command is written through to any cached devices snapshot of the hub, see cozify.cache
+
     Args:
         command(dict): dictionary of type DeviceData containing the changes wanted. Will be converted to json.
 
@@ -156,7 +357,10 @@ def devices_command(command, **kwargs):
         str: What ever the API replied or raises an APIEerror on failure.
     """
     logging.debug("command json to send: {0}".format(command))
-    return put("/devices/command", command, **kwargs)
+    reply = put("/devices/command", command, **kwargs)
+    if "hub_id" in kwargs:
+        cache.apply(kwargs["hub_id"], command)
+    return reply
 
 
 def devices_command_generic(*, device_id, command=None, request_type, **kwargs):
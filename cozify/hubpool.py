@@ -0,0 +1,285 @@
+"""Module for driving many hubs from one process without overloading any single hub.
+
+A HubPool keeps a resolved HubContext (see cozify.context) per hub and runs calls on a shared thread pool.
+Each hub has its own queue: at most max_in_flight calls run against a hub at a time and the rest wait their turn
+without tying up worker threads. Commands are additionally spaced out to at most commands_per_second per hub:
+a command waits in the queue until its slot opens, and calls queued after it wait behind it.
+
+Example::
+
+    from cozify import hub
+    from cozify.hubpool import HubPool
+
+    with HubPool(max_in_flight=2) as pool:
+        results, errors = pool.map(hub.devices, capabilities=hub.capability.TEMPERATURE)
+        pool.command(hub_id, hub.device_off, device_id).result()
+        print(pool.stats())
+"""
+
+import collections
+import concurrent.futures
+import threading
+import time
+
+from absl import logging
+
+from . import context
+
+HubStats = collections.namedtuple(
+    "HubStats",
+    ["queued", "in_flight", "completed", "failed", "latency_avg", "latency_max"],
+)
+HubStats.__doc__ = """Load and latency of a single hub in a HubPool.
+
+Attributes:
+    queued(int): Calls waiting for a free slot.
+    in_flight(int): Calls currently running.
+    completed(int): Calls finished successfully.
+    failed(int): Calls finished with an exception.
+    latency_avg(float): Average seconds a finished call took to run, not counting time queued. None if nothing has finished.
+    latency_max(float): Longest seconds a finished call took to run. None if nothing has finished.
+"""
+
+
+class HubPool:
+    """Concurrent calls to many hubs with per hub limits.
+
+    Args:
+        hub_ids(list): Hubs to manage. Defaults to None which uses all known hubs, see cozify.hub.ids().
+        max_in_flight(int): Maximum concurrent calls per hub. Defaults to 2.
+        commands_per_second(float): Maximum rate of commands per hub. Defaults to None for no limit.
+        max_workers(int): Size of the shared thread pool. Defaults to 16.
+        **kwargs: Hub selection overrides applied to every hub context, e.g. remote.
+    """
+
+    def __init__(
+        self,
+        hub_ids=None,
+        max_in_flight=2,
+        commands_per_second=None,
+        max_workers=16,
+        **kwargs
+    ):
+        from . import hub
+
+        if max_in_flight < 1:
+            raise ValueError(
+                "max_in_flight must be at least 1, got: {0}".format(max_in_flight)
+            )
+        if hub_ids is None:
+            hub_ids = hub.ids()
+        self.max_in_flight = max_in_flight
+        self.command_interval = 1.0 / commands_per_second if commands_per_second else 0
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers)
+        self._lock = threading.Lock()
+        self._closed = False
+        self._hubs = {hub_id: _Hub(hub_id, kwargs) for hub_id in hub_ids}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    @property
+    def hub_ids(self):
+        """list: Ids of the managed hubs."""
+        return list(self._hubs)
+
+    def context(self, hub_id):
+        """Get the HubContext of a hub, resolved on first use.
+
+        Returns:
+            cozify.context.HubContext: Context of the hub.
+        """
+        return self._hub(hub_id).context()
+
+    def submit(self, hub_id, func, *args, **kwargs):
+        """Queue a call against a hub.
+
+        Args:
+            hub_id(str): Hub to call.
+            func(function): Function to call, called with the hub context as the context keyword. Any cozify.hub function works.
+            *args: Positional arguments for func.
+            **kwargs: Keyword arguments for func.
+
+        Returns:
+            concurrent.futures.Future: Result of the call.
+
+        Raises:
+            RuntimeError: The pool has been closed.
+        """
+        return self._submit(hub_id, False, func, args, kwargs)
+
+    def command(self, hub_id, func, *args, **kwargs):
+        """Queue a command against a hub, rate limited by commands_per_second. For arguments see submit()
+
+        Returns:
+            concurrent.futures.Future: Result of the call.
+        """
+        return self._submit(hub_id, True, func, args, kwargs)
+
+    def map(self, func, *args, hub_ids=None, **kwargs):
+        """Call a function against many hubs and wait for all of them. For arguments see submit()
+
+        Args:
+            hub_ids(list): Hubs to call. Defaults to None which calls all managed hubs.
+
+        Returns:
+            tuple: (dict of hub_id -> return value, dict of hub_id -> exception for calls that failed)
+        """
+        futures = {
+            hub_id: self.submit(hub_id, func, *args, **kwargs)
+            for hub_id in (self.hub_ids if hub_ids is None else hub_ids)
+        }
+        results = {}
+        errors = {}
+        for hub_id, future in futures.items():
+            try:
+                results[hub_id] = future.result()
+            except Exception as e:
+                errors[hub_id] = e
+        return results, errors
+
+    def stats(self):
+        """Current load and latency per hub.
+
+        Returns:
+            dict: hub_id -> HubStats
+        """
+        with self._lock:
+            return {hub_id: h.stats() for hub_id, h in self._hubs.items()}
+
+    def close(self, wait=True):
+        """Stop accepting calls and shut down the thread pool.
+
+        Args:
+            wait(bool): Wait for queued and running calls to finish, including rate limited commands. Defaults to True. False cancels queued calls instead.
+        """
+        with self._lock:
+            self._closed = True
+            if not wait:
+                for h in self._hubs.values():
+                    if h.timer is not None:
+                        h.timer.cancel()
+                        h.timer = None
+                    while h.queue:
+                        h.queue.popleft()[0].cancel()
+                    if not h.in_flight:
+                        h.idle.set()
+        if wait:
+            for h in list(self._hubs.values()):
+                h.idle.wait()
+        self._executor.shutdown(wait=wait)
+
+    def _hub(self, hub_id):
+        h = self._hubs.get(hub_id)
+        if h is None:
+            raise ValueError("Hub not managed by this pool: {0}".format(hub_id))
+        return h
+
+    def _submit(self, hub_id, is_command, func, args, kwargs):
+        h = self._hub(hub_id)
+        future = concurrent.futures.Future()
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("HubPool is closed, cannot submit calls")
+            h.queue.append((future, is_command, func, args, kwargs))
+            h.idle.clear()
+            self._dispatch(h)
+        return future
+
+    def _dispatch(self, h):
+        """Start queued calls of a hub while it has free slots. Called with _lock held."""
+        while h.queue and h.in_flight < self.max_in_flight:
+            if h.queue[0][1] and self.command_interval:
+                now = time.monotonic()
+                if h.next_command > now:
+                    # come back when the slot opens instead of holding a worker thread until then
+                    if h.timer is None:
+                        h.timer = threading.Timer(
+                            h.next_command - now, self._wake, (h,)
+                        )
+                        h.timer.daemon = True
+                        h.timer.start()
+                    return
+                h.next_command = now + self.command_interval
+            call = h.queue.popleft()
+            h.in_flight += 1
+            self._executor.submit(self._run, h, *call)
+
+    def _wake(self, h):
+        with self._lock:
+            h.timer = None
+            self._dispatch(h)
+
+    def _run(self, h, future, is_command, func, args, kwargs):
+        if not future.set_running_or_notify_cancel():
+            self._done(h, None, False)
+            return
+        try:
+            ctx = h.context()
+            start = time.monotonic()
+            result = func(*args, context=ctx, **kwargs)
+        except Exception as e:
+            logging.debug("HubPool call to hub {0} failed: {1}".format(h.hub_id, e))
+            future.set_exception(e)
+            self._done(h, None, True)
+            return
+        except BaseException as e:
+            # not ours to handle, but don't leave the caller and close() waiting forever
+            future.set_exception(e)
+            self._done(h, None, True)
+            raise
+        latency = time.monotonic() - start
+        future.set_result(result)
+        self._done(h, latency, False)
+
+    def _done(self, h, latency, failed):
+        with self._lock:
+            h.in_flight -= 1
+            if failed:
+                h.failed += 1
+            elif latency is not None:  # None for cancelled calls
+                h.completed += 1
+                h.latency_total += latency
+                h.latency_max = max(h.latency_max, latency)
+            self._dispatch(h)
+            if not h.queue and not h.in_flight:
+                h.idle.set()
+
+
+class _Hub:
+    """Queue, context and counters of a single hub in a HubPool."""
+
+    def __init__(self, hub_id, kwargs):
+        self.hub_id = hub_id
+        self.kwargs = dict(kwargs, hub_id=hub_id)
+        self.queue = collections.deque()
+        self.in_flight = 0
+        self.completed = 0
+        self.failed = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+        self.idle = threading.Event()
+        self.idle.set()
+        self._context = None
+        self._context_lock = threading.Lock()
+        self.next_command = 0.0  # time.monotonic() when the next command may start
+        self.timer = None  # pending re-dispatch of a command waiting for its slot
+
+    def context(self):
+        with self._context_lock:
+            if self._context is None:
+                self._context = context.HubContext(**self.kwargs)
+            return self._context
+
+    def stats(self):
+        return HubStats(
+            queued=len(self.queue),
+            in_flight=self.in_flight,
+            completed=self.completed,
+            failed=self.failed,
+            latency_avg=self.latency_total / self.completed if self.completed else None,
+            latency_max=self.latency_max if self.completed else None,
+        )
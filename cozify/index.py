@@ -0,0 +1,187 @@
+"""Module for the device indexes used to validate commands without refetching all devices and to filter devices by capability.
+
+An index is built per hub from a devices snapshot and kept for a while. Command helpers such as hub.device_on() or
+hub.light_brightness() check eligibility and value ranges against it so only the command itself needs to go to the hub.
+The index is rebuilt once it gets older than ttl, or sooner when a device is not found in it or lacks the capability.
+
+Attributes:
+    ttl(float): Seconds an index is trusted before it's rebuilt. Defaults to 300.
+    miss_interval(float): Minimum age in seconds of an index before an eligibility miss triggers a rebuild. Prevents repeated rebuilds when asking for devices that really don't exist. Defaults to 1.
+"""
+
+import threading
+import time
+
+from absl import logging
+
+from . import model
+
+ttl = 300.0
+miss_interval = 1.0
+
+_indexes = {}  # hub_id -> DeviceIndex
+_lock = threading.Lock()
+
+
+class DeviceIndex:
+    """Capabilities and states of all devices of a snapshot.
+
+    States are the device state dicts of the snapshot. They are only used as templates for building commands
+    and for the value ranges they carry, such as minTemperature & maxTemperature, so they don't need to be live.
+
+    Args:
+        devs(dict): Devices dict as returned by the API.
+
+    Attributes:
+        created(float): time.monotonic() timestamp of when the index was built.
+        capabilities(dict): device_id -> frozenset of capability names.
+        states(dict): device_id -> state dict of the device in the snapshot.
+    """
+
+    def __init__(self, devs):
+        self.created = time.monotonic()
+        self.capabilities = {}
+        self.states = {}
+        for device_id, dev in devs.items():
+            self.capabilities[device_id] = frozenset(dev["capabilities"]["values"])
+            self.states[device_id] = dev["state"]
+
+    def age(self):
+        """Seconds since the index was built."""
+        return time.monotonic() - self.created
+
+    def eligible(self, device_id, capability=None):
+        """Check if a device is known and has a capability.
+
+        Args:
+            device_id(str): ID of the device to check.
+            capability(hub.capability): Capability to require. Defaults to None which only checks existence.
+
+        Returns:
+            dict: Copy of the device state as a command template, or None if the device is not eligible.
+        """
+        caps = self.capabilities.get(device_id)
+        if caps is None or (capability is not None and capability.name not in caps):
+            return None
+        return dict(self.states[device_id])
+
+
+class CapabilityIndex:
+    """Capability bitmasks and an inverted index of a devices snapshot, making capability filtering cheap.
+
+    Args:
+        devs(dict): Devices dict as returned by the API.
+
+    Attributes:
+        masks(dict): device_id -> bitmask of known capabilities, see cozify.model.capability_mask().
+        overflow(dict): device_id -> frozenset of capability names unknown to cozify.hub.capability. Only devices with any are included.
+        devices(dict): capability name -> list of ids of devices with the capability in snapshot order, unknown capabilities included.
+    """
+
+    def __init__(self, devs):
+        self.masks = {}
+        self.overflow = {}
+        self.devices = {}
+        for device_id, dev in devs.items():
+            names = dev["capabilities"]["values"]
+            self.masks[device_id], overflow = model.capability_mask(names)
+            if overflow:
+                self.overflow[device_id] = overflow
+            for name in names:
+                self.devices.setdefault(name, []).append(device_id)
+
+    def select(self, capabilities, and_filter=False):
+        """Find devices by capabilities.
+
+        Args:
+            capabilities(cozify.hub.capability): Single or list of capabilities to filter by.
+            and_filter(bool): Require all capabilities instead of any. Defaults to False.
+
+        Returns:
+            list: Ids of matching devices in snapshot order.
+        """
+        if not isinstance(capabilities, (list, tuple, set, frozenset)):
+            return list(self.devices.get(capabilities.name, ()))
+        want = 0
+        for c in capabilities:
+            want |= model.capability_bit(c)
+        if and_filter:  # only the devices of the rarest capability can match
+            rarest = min((self.devices.get(c.name, ()) for c in capabilities), key=len)
+            return [i for i in rarest if self.masks[i] & want == want]
+        return [i for i, mask in self.masks.items() if mask & want]
+
+
+def lookup(hub_id):
+    """Get the current index of a hub if it's still within ttl.
+
+    Returns:
+        DeviceIndex: Index or None if there is no valid index.
+    """
+    idx = _indexes.get(hub_id)
+    if idx is not None and idx.age() < ttl:
+        return idx
+    return None
+
+
+def store(hub_id, devs):
+    """Build and store a new index for a hub from a devices snapshot.
+
+    Args:
+        hub_id(str): Id of hub the snapshot is from.
+        devs(dict): Unfiltered devices dict as returned by the API.
+
+    Returns:
+        DeviceIndex: The new index.
+    """
+    idx = DeviceIndex(devs)
+    with _lock:
+        _indexes[hub_id] = idx
+    logging.debug(
+        "Device index for hub {0} rebuilt: {1} devices".format(hub_id, len(devs))
+    )
+    return idx
+
+
+def invalidate(hub_id=None):
+    """Drop stored indexes so they get rebuilt on next use.
+
+    Args:
+        hub_id(str): Hub to invalidate. Defaults to None which invalidates all hubs.
+    """
+    with _lock:
+        if hub_id is None:
+            _indexes.clear()
+        else:
+            _indexes.pop(hub_id, None)
+
+
+def needs_refresh(idx):
+    """Decide if an eligibility miss against an index warrants rebuilding it."""
+    return idx is None or idx.age() >= miss_interval
+
+
+def eligible(device_id, capability=None, **kwargs):
+    """Check device eligibility against the index of a hub, rebuilding it if needed.
+
+    Args:
+        device_id(str): ID of the device to check.
+        capability(hub.capability): Capability to require. Defaults to None which only checks existence.
+        **hub_id(str): Hub the device is on. Expected to be filled, see hub._fill_kwargs().
+        **mock_devices(dict): If defined, a throwaway index is built from it instead.
+
+    Returns:
+        dict: Copy of the device state as a command template. Raises a ValueError if the device is not eligible.
+    """
+    from . import hub
+
+    if "mock_devices" in kwargs:
+        idx = DeviceIndex(kwargs["mock_devices"])
+    else:
+        idx = lookup(kwargs["hub_id"])
+    state = idx.eligible(device_id, capability) if idx else None
+    if state is None and needs_refresh(idx):
+        idx = store(kwargs["hub_id"], hub.devices(**kwargs))
+        state = idx.eligible(device_id, capability)
+    if state is None:
+        raise ValueError("Device not found or not eligible for action.")
+    return state
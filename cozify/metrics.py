@@ -0,0 +1,275 @@
+"""Module for collecting per-call metrics of the hub and cloud APIs.
+
+Metrics are opt-in. Once enabled with metrics.enable(), every call made by cozify.hub_api, cozify.cloud_api and cozify.aio is counted
+and timed, keyed by api, method, endpoint, hub_id, path (local, remote or cloud) and status (HTTP status code or 'error' for connection errors).
+JSON encoding and decoding of payloads is timed separately. While disabled the only cost per call is a check of metrics.enabled.
+
+Collected metrics:
+    calls_total(counter): Number of calls.
+    bytes_sent_total(counter): Request payload bytes sent.
+    bytes_received_total(counter): Response body bytes received.
+    call_seconds(histogram): Call latency, including the network round trip but not JSON processing.
+    json_encode_seconds(histogram): Time spent encoding request payloads, keyed by api and endpoint.
+    json_decode_seconds(histogram): Time spent decoding response bodies, keyed by api and endpoint.
+
+Attributes:
+    enabled(bool): True when metrics are collected. Defaults to False.
+    buckets(tuple): Upper bounds in seconds of histogram buckets. An implicit +Inf bucket is always added.
+"""
+
+import bisect
+import collections
+import functools
+import json
+import re
+import threading
+import time
+from urllib.parse import urlsplit
+
+enabled = False
+buckets = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+Counter = collections.namedtuple("Counter", ["name", "labels", "value"])
+Counter.__doc__ = """Snapshot of a counter, labels is a dict."""
+
+Histogram = collections.namedtuple(
+    "Histogram", ["name", "labels", "count", "sum", "buckets"]
+)
+Histogram.__doc__ = """Snapshot of a histogram, labels is a dict and buckets a tuple of (upper bound, cumulative count) pairs ending in +Inf."""
+
+_counters = {}  # (name, labels tuple) -> value
+_histograms = {}  # (name, labels tuple) -> [count per bucket, count, sum]
+_lock = threading.Lock()
+_version = re.compile(r"^/(?:cc|ui)/[0-9.]+")
+
+
+def enable():
+    """Start collecting metrics."""
+    global enabled
+    enabled = True
+
+
+def disable():
+    """Stop collecting metrics. Already collected metrics are kept until reset()."""
+    global enabled
+    enabled = False
+
+
+def reset():
+    """Forget all collected metrics."""
+    with _lock:
+        _counters.clear()
+        _histograms.clear()
+
+
+def inc(name, value=1, **labels):
+    """Increment a counter.
+
+    Args:
+        name(str): Name of the counter.
+        value(int): Amount to increment by. Defaults to 1.
+        **labels: Labels the counter is keyed by.
+    """
+    key = (name, tuple(sorted(labels.items())))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def observe(name, value, **labels):
+    """Record a value into a histogram.
+
+    Args:
+        name(str): Name of the histogram.
+        value(float): Value to record, usually seconds.
+        **labels: Labels the histogram is keyed by.
+    """
+    key = (name, tuple(sorted(labels.items())))
+    i = bisect.bisect_left(buckets, value)
+    with _lock:
+        h = _histograms.get(key)
+        if h is None:
+            h = _histograms[key] = [[0] * (len(buckets) + 1), 0, 0.0]
+        h[0][i] += 1
+        h[1] += 1
+        h[2] += value
+
+
+def call(api, method, url, status, seconds, sent=0, received=0, hub_id="", path=""):
+    """Record a finished API call.
+
+    Args:
+        api(str): API called, 'hub' or 'cloud'.
+        method(str): HTTP method of the call.
+        url(str): Full url or path of the call. Reduced to its endpoint, see endpoint().
+        status(int): HTTP status code of the response or 'error' if no response was received.
+        seconds(float): Time the call took.
+        sent(int): Request payload bytes. Defaults to 0.
+        received(int): Response body bytes. Defaults to 0.
+        hub_id(str): Hub called. Defaults to '' for cloud calls.
+        path(str): Path the call went over, 'local', 'remote' or 'cloud'. Defaults to ''.
+    """
+    labels = {
+        "api": api,
+        "method": method,
+        "endpoint": endpoint(url),
+        "hub_id": hub_id or "",
+        "path": path,
+        "status": str(status),
+    }
+    inc("calls_total", **labels)
+    if sent:
+        inc("bytes_sent_total", sent, **labels)
+    if received:
+        inc("bytes_received_total", received, **labels)
+    observe("call_seconds", seconds, **labels)
+
+
+def size(data):
+    """Get the size of a payload as sent over the wire.
+
+    Args:
+        data(str): Payload, str is measured utf8 encoded. None for no payload.
+
+    Returns:
+        int: Size in bytes.
+    """
+    if data is None:
+        return 0
+    if isinstance(data, str):
+        return len(data.encode("utf8"))
+    return len(data)
+
+
+def json_dumps(data, api, url):
+    """json.dumps() that is timed into json_encode_seconds when enabled.
+
+    Args:
+        data(object): Payload to encode.
+        api(str): API the payload is for, 'hub' or 'cloud'.
+        url(str): Full url or path the payload is sent to.
+
+    Returns:
+        str: Encoded payload.
+    """
+    if not enabled:
+        return json.dumps(data)
+    start = time.perf_counter()
+    encoded = json.dumps(data)
+    observe(
+        "json_encode_seconds",
+        time.perf_counter() - start,
+        api=api,
+        endpoint=endpoint(url),
+    )
+    return encoded
+
+
+def json_loads(body, api, url):
+    """json.loads() that is timed into json_decode_seconds when enabled.
+
+    Args:
+        body(bytes): Response body to decode.
+        api(str): API the body is from, 'hub' or 'cloud'.
+        url(str): Full url or path the body was received from.
+
+    Returns:
+        object: Decoded body.
+    """
+    if not enabled:
+        return json.loads(body)
+    start = time.perf_counter()
+    decoded = json.loads(body)
+    observe(
+        "json_decode_seconds",
+        time.perf_counter() - start,
+        api=api,
+        endpoint=endpoint(url),
+    )
+    return decoded
+
+
+@functools.lru_cache(maxsize=256)
+def endpoint(url):
+    """Reduce a call url to the endpoint it is keyed by, without host and API version. All remote calls share the '/hub/remote' endpoint.
+
+    Args:
+        url(str): Full url or path of the call, e.g. 'https://cloud2.cozify.fi/ui/0.2/user/requestlogin' or '/cc/1.14/devices'
+
+    Returns:
+        str: Endpoint, e.g. '/user/requestlogin' or '/devices'
+    """
+    path = _version.sub("", urlsplit(url).path)
+    if path.startswith("/hub/remote/"):
+        return "/hub/remote"
+    return path or "/"
+
+
+def snapshot():
+    """Get a consistent copy of all collected metrics.
+
+    Returns:
+        dict: 'counters' -> list of Counter, 'histograms' -> list of Histogram, both sorted by name and labels.
+    """
+    with _lock:
+        counters = sorted(_counters.items())
+        histograms = sorted(
+            (key, (list(h[0]), h[1], h[2])) for key, h in _histograms.items()
+        )
+    bounds = buckets + (float("inf"),)
+    return {
+        "counters": [
+            Counter(name=name, labels=dict(labels), value=value)
+            for (name, labels), value in counters
+        ],
+        "histograms": [
+            Histogram(
+                name=name,
+                labels=dict(labels),
+                count=count,
+                sum=total,
+                buckets=tuple(
+                    (bound, sum(counts[: i + 1])) for i, bound in enumerate(bounds)
+                ),
+            )
+            for (name, labels), (counts, count, total) in histograms
+        ],
+    }
+
+
+def quantile(histogram, q):
+    """Estimate a quantile of a histogram snapshot by linear interpolation within the bucket it falls in.
+
+    Args:
+        histogram(Histogram): Histogram from snapshot().
+        q(float): Quantile to estimate, between 0 and 1.
+
+    Returns:
+        float: Estimated value or None for an empty histogram. Values in the +Inf bucket are estimated as the largest finite bound.
+    """
+    if not histogram.count:
+        return None
+    rank = q * histogram.count
+    lower, below = 0.0, 0
+    for bound, cumulative in histogram.buckets:
+        if cumulative >= rank:
+            if bound == float("inf"):
+                return lower
+            inside = cumulative - below
+            return lower + (bound - lower) * (rank - below) / inside
+        lower, below = bound, cumulative
+    return lower  # pragma: no cover
@@ -0,0 +1,264 @@
+"""Module for a compact, typed representation of devices as an alternative to the raw API dicts.
+
+Devices are converted lazily: hub.devices(model=True) returns a Devices mapping that turns each raw device dict
+into a Device on first access. Devices keep their capabilities as a bitmask over cozify.hub.capability and their
+state as a State sharing its key tuple with every other state of the same shape. Repeated strings such as types,
+manufacturers and room ids are interned so thousands of devices share a single copy.
+
+Example::
+
+    from cozify import hub
+
+    for dev in hub.devices(model=True).values():
+        if dev.has(hub.capability.TEMPERATURE):
+            print(dev.name, dev.state["temperature"])
+"""
+
+import collections.abc
+import sys
+import threading
+
+_empty = frozenset()
+_bits = None  # capability name -> bit, built on first use
+_layouts = {}  # state keys tuple -> _Layout
+_layouts_lock = threading.Lock()
+
+
+def capability_mask(names):
+    """Turn capability names into a bitmask over cozify.hub.capability.
+
+    Args:
+        names(iterable): Capability names as reported by the API.
+
+    Returns:
+        tuple: (int bitmask of known capabilities, frozenset of names not in cozify.hub.capability)
+    """
+    bits = _capability_bits()
+    mask = 0
+    overflow = None
+    for name in names:
+        bit = bits.get(name)
+        if bit is None:
+            if overflow is None:
+                overflow = set()
+            overflow.add(sys.intern(name))
+        else:
+            mask |= bit
+    return mask, frozenset(overflow) if overflow else _empty
+
+
+def capability_bit(capability):
+    """Bit of a cozify.hub.capability in capability masks."""
+    return 1 << (capability.value - 1)
+
+
+def capability_names(mask):
+    """Turn a capability bitmask back into capability names.
+
+    Returns:
+        list: Names of the capabilities set in mask, in cozify.hub.capability order.
+    """
+    return [name for name, bit in _capability_bits().items() if mask & bit]
+
+
+class State(collections.abc.Mapping):
+    """Read-only device state. Behaves like the state dict it was built from.
+
+    Args:
+        state(dict): Device state as returned by the API.
+    """
+
+    __slots__ = ("_layout", "_values")
+
+    def __init__(self, state):
+        self._layout = _layout(tuple(state))
+        self._values = tuple(
+            sys.intern(v) if type(v) is str else v for v in state.values()
+        )
+
+    def __getitem__(self, key):
+        return self._values[self._layout.index[key]]
+
+    def __iter__(self):
+        return iter(self._layout.keys)
+
+    def __len__(self):
+        return len(self._values)
+
+    def __repr__(self):
+        return "State({0!r})".format(dict(self))
+
+
+class Device:
+    """Single device.
+
+    Args:
+        dev(dict): Device data as returned by the API.
+
+    Attributes:
+        id(str): Device id.
+        name(str): Device name.
+        type(str): Device type, e.g. LIGHT.
+        manufacturer(str): Manufacturer name, may be None.
+        model(str): Model name, may be None.
+        room(tuple): Ids of the rooms of the device.
+        groups(tuple): Ids of the groups of the device.
+        zones(tuple): Ids of the zones of the device.
+        timestamp(int): Timestamp in ms of the latest data.
+        capability_mask(int): Bitmask of known capabilities, see capability_mask().
+        capability_overflow(frozenset): Names of capabilities not known to cozify.hub.capability.
+        state(State): Device state.
+    """
+
+    __slots__ = (
+        "id",
+        "name",
+        "type",
+        "manufacturer",
+        "model",
+        "room",
+        "groups",
+        "zones",
+        "rwx",
+        "timestamp",
+        "capability_mask",
+        "capability_overflow",
+        "state",
+    )
+
+    def __init__(self, dev):
+        self.id = dev["id"]
+        self.name = dev["name"]
+        self.type = _intern(dev.get("type"))
+        self.manufacturer = _intern(dev.get("manufacturer"))
+        self.model = _intern(dev.get("model"))
+        self.room = _ids(dev.get("room"))
+        self.groups = _ids(dev.get("groups"))
+        self.zones = _ids(dev.get("zones"))
+        self.rwx = dev.get("rwx")
+        self.timestamp = dev.get("timestamp")
+        self.capability_mask, self.capability_overflow = capability_mask(
+            dev["capabilities"]["values"]
+        )
+        self.state = State(dev["state"])
+
+    @property
+    def capabilities(self):
+        """frozenset: Names of all capabilities of the device, including unknown ones."""
+        return frozenset(capability_names(self.capability_mask)).union(
+            self.capability_overflow
+        )
+
+    def has(self, capability):
+        """Check if the device has a capability.
+
+        Args:
+            capability(cozify.hub.capability): Capability to check.
+
+        Returns:
+            bool: True if the device has the capability.
+        """
+        return bool(self.capability_mask & capability_bit(capability))
+
+    def to_dict(self):
+        """Convert back to the dict form as returned by the API.
+
+        Returns:
+            dict: Device data.
+        """
+        return {
+            "capabilities": {"type": "SET", "values": sorted(self.capabilities)},
+            "groups": list(self.groups),
+            "id": self.id,
+            "manufacturer": self.manufacturer,
+            "model": self.model,
+            "name": self.name,
+            "room": list(self.room),
+            "rwx": self.rwx,
+            "state": dict(self.state),
+            "timestamp": self.timestamp,
+            "type": self.type,
+            "zones": list(self.zones),
+        }
+
+    def __repr__(self):
+        return "Device(id={0!r}, name={1!r}, type={2!r})".format(
+            self.id, self.name, self.type
+        )
+
+
+class Devices(collections.abc.Mapping):
+    """Read-only mapping of device id to Device, converting each device from its raw dict on first access.
+
+    Args:
+        devs(dict): Devices dict as returned by the API. Not modified.
+    """
+
+    __slots__ = ("_raw", "_devices")
+
+    def __init__(self, devs):
+        self._raw = dict(devs)
+        self._devices = dict.fromkeys(devs)
+
+    def __getitem__(self, device_id):
+        dev = self._devices[device_id]
+        if dev is None:
+            raw = self._raw.get(device_id)
+            if raw is None:  # converted by another thread meanwhile
+                return self._devices[device_id]
+            dev = Device(raw)
+            # store before dropping the raw dict so a concurrent reader always finds one of them
+            self._devices[device_id] = dev
+            self._raw.pop(device_id, None)
+        return dev
+
+    def __contains__(self, device_id):
+        return device_id in self._devices
+
+    def __iter__(self):
+        return iter(self._devices)
+
+    def __len__(self):
+        return len(self._devices)
+
+    def __repr__(self):
+        return "Devices({0} devices, {1} converted)".format(
+            len(self._devices), len(self._devices) - len(self._raw)
+        )
+
+
+class _Layout:
+    __slots__ = ("keys", "index")
+
+    def __init__(self, keys):
+        self.keys = keys
+        self.index = {k: i for i, k in enumerate(keys)}
+
+
+def _layout(keys):
+    layout = _layouts.get(keys)
+    if layout is None:
+        with _layouts_lock:
+            layout = _layouts.setdefault(
+                keys, _Layout(tuple(sys.intern(k) for k in keys))
+            )
+    return layout
+
+
+def _capability_bits():
+    global _bits
+    if _bits is None:
+        from . import hub
+
+        _bits = {c.name: capability_bit(c) for c in hub.capability}
+    return _bits
+
+
+def _intern(value):
+    return sys.intern(value) if type(value) is str else value
+
+
+def _ids(values):
+    if not values:
+        return ()
+    return tuple(sys.intern(v) for v in values)
@@ -1,39 +1,33 @@
 import time
 
-from . import config
+from . import hub, sensors
 
 
 # expects Cozify devices type json data
 def getMultisensorData(data):  # pragma: no cover
-    """Deprecated, will be removed in v0.3"""
-    out = []
-    for device in data:
-        state = data[device]["state"]
-        devtype = state["type"]
-
-        if devtype == "STATE_MULTI_SENSOR":
-            name = data[device]["name"]
-            if "lastSeen" in state:
-                timestamp = state["lastSeen"]
-            else:
-                # if no time of measurement is known we must make a reasonable assumption
-                # Stored here in milliseconds to match accuracy of what the hub will give you
-                timestamp = time.time() * 1000
-            if "temperature" in state:
-                temperature = state["temperature"]
-            else:
-                temperature = None
-            if "humidity" in state:
-                humidity = state["humidity"]
-            else:
-                humidity = None
-
-            out.append(
-                {
-                    "name": name,
-                    "time": timestamp,
-                    "temperature": temperature,
-                    "humidity": humidity,
-                }
-            )
-    return out
+    """Deprecated, will be removed in v0.3. Use cozify.sensors.extract() instead."""
+    multisensors = {
+        device_id: dev
+        for device_id, dev in data.items()
+        if dev["state"]["type"] == "STATE_MULTI_SENSOR"
+    }
+    columns = sensors.extract(
+        multisensors, [hub.capability.TEMPERATURE, hub.capability.HUMIDITY]
+    )
+    # if no time of measurement is known we must make a reasonable assumption
+    # Stored here in milliseconds to match accuracy of what the hub will give you
+    now = time.time() * 1000
+    return [
+        {
+            "name": name,
+            "time": now if timestamp is None else timestamp,
+            "temperature": temperature,
+            "humidity": humidity,
+        }
+        for name, timestamp, temperature, humidity in zip(
+            columns["name"],
+            columns["time"],
+            columns["temperature"],
+            columns["humidity"],
+        )
+    ]
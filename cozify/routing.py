@@ -0,0 +1,323 @@
+"""Module for latency-aware routing of hub calls over the local and the remote (cloud bounced) path.
+
+Routing is opt-in. Once enabled with routing.enable(), every cozify.hub_api call that names its hub_id and could go either way,
+i.e. a host is known for the hub and a cloud token is available, is sent over whichever path is currently healthy and answers faster.
+The remoteness configured with hub.remote() is only the initial preference until both paths have been measured.
+The path not in use is re-probed in the background every reprobe_interval seconds with a cheap call,
+so a hub that becomes reachable on the LAN again automatically stops paying for the cloud round trip.
+
+With hedging also enabled, idempotent reads listed in hedge_calls that haven't been answered within the hedge delay are sent over the
+other path as well and whichever answer comes back first is used. The hedge delay is the p95 round trip time of the path called first,
+so only the slowest calls get hedged.
+
+Attributes:
+    enabled(bool): True when calls are routed. Defaults to False.
+    window(int): Number of most recent calls per hub and path that statistics are kept over. Defaults to 20.
+    reprobe_interval(float): Seconds after which the path not in use is probed again. Defaults to 30.
+    probe_timeout(float): Seconds a background probe waits for a reply. Defaults to 2.
+    max_error_rate(float): Share of failed calls over the window above which a path is considered unhealthy. Defaults to 0.5.
+    max_consecutive_errors(int): Number of failed calls in a row after which a path is considered unhealthy. Defaults to 2.
+    hedging(bool): True when reads are hedged. Defaults to False.
+    hedge_calls(tuple): API paths of the reads that may be hedged, without the API version prefix.
+    hedge_min_delay(float): Lower bound in seconds of the hedge delay. Defaults to 0.05.
+    hedge_default_delay(float): Hedge delay in seconds until the path called first has been measured. Defaults to 1.
+    hedge_workers(int): Maximum number of threads running hedged calls. Defaults to 16.
+"""
+
+import collections
+import concurrent.futures
+import math
+import statistics
+import threading
+import time
+
+from absl import logging
+
+enabled = False
+window = 20
+reprobe_interval = 30.0
+probe_timeout = 2.0
+max_error_rate = 0.5
+max_consecutive_errors = 2
+hedging = False
+hedge_calls = ("/devices", "/scenes", "/hub/tz")
+hedge_min_delay = 0.05
+hedge_default_delay = 1.0
+hedge_workers = 16
+
+paths = ("local", "remote")
+
+PathStats = collections.namedtuple(
+    "PathStats", ["calls", "errors", "error_rate", "rtt", "p95", "healthy"]
+)
+PathStats.__doc__ = """Rolling statistics of one path to a hub, see stats(). rtt and p95 are in seconds and None until a call has succeeded."""
+
+HedgeStats = collections.namedtuple(
+    "HedgeStats", ["calls", "hedged", "wins", "hedge_rate", "win_rate"]
+)
+HedgeStats.__doc__ = """Counts of hedgeable reads to a hub, how many of them were hedged and how many the hedge won, see hedge_stats()."""
+
+_paths = {}  # (hub_id, path) -> _Path
+_hedges = {}  # hub_id -> [hedgeable calls, hedged calls, hedge wins]
+_executor = None
+_lock = threading.Lock()
+
+
+class _Path:
+    __slots__ = ("rtts", "outcomes", "consecutive", "last", "probing")
+
+    def __init__(self):
+        self.rtts = collections.deque(maxlen=window)  # seconds of successful calls
+        self.outcomes = collections.deque(maxlen=window)  # True for a failed call
+        self.consecutive = 0  # failed calls in a row
+        self.last = 0.0  # time.monotonic() of last call or probe
+        self.probing = False
+
+    def healthy(self):
+        if self.consecutive >= max_consecutive_errors:
+            return False
+        return not self.outcomes or self.error_rate() <= max_error_rate
+
+    def error_rate(self):
+        if not self.outcomes:
+            return 0.0
+        return sum(self.outcomes) / len(self.outcomes)
+
+    def rtt(self):
+        return statistics.median(self.rtts) if self.rtts else None
+
+    def p95(self):
+        if not self.rtts:
+            return None
+        ordered = sorted(self.rtts)
+        return ordered[math.ceil(0.95 * len(ordered)) - 1]
+
+
+def enable(window_size=None, reprobe=None, hedge=None):
+    """Enable routing of hub calls.
+
+    Args:
+        window_size(int): Number of recent calls to keep statistics over. Defaults to None to keep current value.
+        reprobe(float): Seconds after which the path not in use is probed again. Defaults to None to keep current value.
+        hedge(bool): True to hedge reads over both paths. Defaults to None to keep current value.
+    """
+    global enabled, window, reprobe_interval, hedging
+    if window_size is not None:
+        if window_size < 1:
+            raise ValueError("Window must be at least 1, got: {0}".format(window_size))
+        window = window_size
+        reset()
+    if reprobe is not None:
+        reprobe_interval = reprobe
+    if hedge is not None:
+        hedging = hedge
+    enabled = True
+
+
+def disable():
+    """Disable routing and hedging and forget all statistics. Calls go over the path configured with hub.remote() again."""
+    global enabled, hedging
+    enabled = False
+    hedging = False
+    reset()
+
+
+def reset(hub_id=None):
+    """Forget collected statistics.
+
+    Args:
+        hub_id(str): Hub to forget. Defaults to None which forgets all hubs.
+    """
+    with _lock:
+        if hub_id is None:
+            _paths.clear()
+            _hedges.clear()
+        else:
+            for path in paths:
+                _paths.pop((hub_id, path), None)
+            _hedges.pop(hub_id, None)
+
+
+def choose(hub_id, preferred="local"):
+    """Pick the path to send the next call to a hub over.
+
+    A healthy path is always picked over an unhealthy one. Between two healthy paths the one with the lower median round trip time wins,
+    as long as both have been measured. Otherwise the preferred path is used.
+
+    Args:
+        hub_id(str): Hub to call.
+        preferred(str): Path to use when the statistics don't tell the paths apart, 'local' or 'remote'. Defaults to 'local'.
+
+    Returns:
+        str: 'local' or 'remote'
+    """
+    other = _other(preferred)
+    with _lock:
+        mine, theirs = _get(hub_id, preferred), _get(hub_id, other)
+        if mine.healthy() != theirs.healthy():
+            return preferred if mine.healthy() else other
+        mine_rtt, theirs_rtt = mine.rtt(), theirs.rtt()
+        if mine_rtt is not None and theirs_rtt is not None and theirs_rtt < mine_rtt:
+            return other
+    return preferred
+
+
+def record(hub_id, path, rtt=None):
+    """Record the outcome of a call.
+
+    Args:
+        hub_id(str): Hub that was called.
+        path(str): Path the call went over, 'local' or 'remote'.
+        rtt(float): Seconds the call took. Defaults to None which records a failed call.
+    """
+    with _lock:
+        p = _get(hub_id, path)
+        p.last = time.monotonic()
+        if rtt is None:
+            p.outcomes.append(True)
+            p.consecutive += 1
+            return
+        if p.consecutive >= max_consecutive_errors:
+            # path recovered, don't let the errors that got it benched keep it there
+            logging.info("Routing: {0} path to hub {1} recovered.".format(path, hub_id))
+            p.outcomes.clear()
+        p.consecutive = 0
+        p.outcomes.append(False)
+        p.rtts.append(rtt)
+
+
+def probe(hub_id, path, func):
+    """Probe a path in the background if it hasn't been used for reprobe_interval seconds.
+
+    Args:
+        hub_id(str): Hub to probe.
+        path(str): Path to probe, 'local' or 'remote'.
+        func(callable): Called without arguments in a background thread to do the probing call. It is expected to record() its own outcome, any exception is swallowed.
+
+    Returns:
+        bool: True if a probe was started.
+    """
+    with _lock:
+        p = _get(hub_id, path)
+        if p.probing or time.monotonic() - p.last < reprobe_interval:
+            return False
+        p.probing = True
+
+    def run():
+        try:
+            func()
+        except Exception as e:
+            logging.debug(
+                "Routing: probe of {0} path to hub {1} failed: {2}".format(
+                    path, hub_id, e
+                )
+            )
+        finally:
+            with _lock:
+                p.probing = False
+                p.last = time.monotonic()
+
+    threading.Thread(target=run, daemon=True).start()
+    return True
+
+
+def stats(hub_id):
+    """Get rolling statistics of both paths to a hub.
+
+    Args:
+        hub_id(str): Hub to get statistics for.
+
+    Returns:
+        dict: path name -> PathStats
+    """
+    with _lock:
+        result = {}
+        for path in paths:
+            p = _paths.get((hub_id, path)) or _Path()
+            result[path] = PathStats(
+                calls=len(p.outcomes),
+                errors=sum(p.outcomes),
+                error_rate=p.error_rate(),
+                rtt=p.rtt(),
+                p95=p.p95(),
+                healthy=p.healthy(),
+            )
+        return result
+
+
+def hedge_delay(hub_id, path):
+    """Get the time to wait for a read over a path before hedging it over the other path.
+
+    Args:
+        hub_id(str): Hub to call.
+        path(str): Path called first, 'local' or 'remote'.
+
+    Returns:
+        float: Seconds to wait, the p95 round trip time of the path but at least hedge_min_delay.
+    """
+    with _lock:
+        p95 = _get(hub_id, path).p95()
+    if p95 is None:
+        return hedge_default_delay
+    return max(p95, hedge_min_delay)
+
+
+def record_hedge(hub_id, hedged, won=False):
+    """Record the outcome of a hedgeable read.
+
+    Args:
+        hub_id(str): Hub that was called.
+        hedged(bool): True if the read was sent over the other path as well.
+        won(bool): True if the answer over the other path was used.
+    """
+    with _lock:
+        counts = _hedges.setdefault(hub_id, [0, 0, 0])
+        counts[0] += 1
+        counts[1] += bool(hedged)
+        counts[2] += bool(won)
+
+
+def hedge_stats(hub_id):
+    """Get hedging statistics of a hub since routing was enabled or reset.
+
+    Args:
+        hub_id(str): Hub to get statistics for.
+
+    Returns:
+        HedgeStats: Counts of hedgeable reads, hedged reads and hedge wins with hedge_rate = hedged / calls and win_rate = wins / hedged.
+    """
+    with _lock:
+        calls, hedged, wins = _hedges.get(hub_id, (0, 0, 0))
+    return HedgeStats(
+        calls=calls,
+        hedged=hedged,
+        wins=wins,
+        hedge_rate=hedged / calls if calls else 0.0,
+        win_rate=wins / hedged if hedged else 0.0,
+    )
+
+
+def executor():
+    """Get the shared thread pool hedged calls are run in.
+
+    Returns:
+        concurrent.futures.ThreadPoolExecutor: Executor with at most hedge_workers threads.
+    """
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=hedge_workers, thread_name_prefix="cozify-hedge"
+            )
+        return _executor
+
+
+def _get(hub_id, path):
+    p = _paths.get((hub_id, path))
+    if p is None:
+        p = _paths[(hub_id, path)] = _Path()
+    return p
+
+
+def _other(path):
+    return "remote" if path == "local" else "local"
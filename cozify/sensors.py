@@ -0,0 +1,75 @@
+"""Module for extracting sensor readings from devices dicts in columnar form.
+
+One pass over the devices collects every requested sensor value, keyed by capability, into one list per column.
+Rows are devices that have any of the requested sensor capabilities, values a device doesn't report are None.
+
+Example::
+
+    from cozify import hub, sensors
+
+    readings = sensors.extract(hub.devices(), [hub.capability.TEMPERATURE, hub.capability.HUMIDITY])
+    for name, temperature in zip(readings["name"], readings["temperature"]):
+        print(name, temperature)
+
+Attributes:
+    fields(dict): Sensor capability name -> state key holding its value. Change to adapt to new hub firmware.
+"""
+
+fields = {
+    "TEMPERATURE": "temperature",
+    "HUMIDITY": "humidity",
+    "LUX": "lux",
+    "MOISTURE": "moisture",
+    "ACTIVE_POWER": "activePower",
+    "BATTERY_U": "batteryV",
+    "CONTACT": "open",
+    "MOTION": "motion",
+    "SMOKE": "alert",
+}
+
+
+def extract(devs, capabilities=None):
+    """Extract sensor readings into columns.
+
+    Args:
+        devs(dict): Devices dict as returned by the API.
+        capabilities(list): cozify.hub.capability sensor types to extract. Defaults to None which extracts all in fields.
+
+    Returns:
+        dict: Column name -> list of values, one per matching device. Columns are id, name, type and time (lastSeen in ms, None if unknown) followed by the state key of every requested capability.
+    """
+    if capabilities is None:
+        wanted = dict(fields)
+    else:
+        if not isinstance(capabilities, (list, tuple, set, frozenset)):
+            capabilities = [capabilities]
+        try:
+            wanted = {c.name: fields[c.name] for c in capabilities}
+        except KeyError as e:
+            raise ValueError("Not a sensor capability: {0}".format(e.args[0])) from None
+    keys = list(wanted.values())
+    columns = {"id": [], "name": [], "type": [], "time": []}
+    values = {key: [] for key in keys}
+    columns.update(values)
+    for device_id, dev in devs.items():
+        reported = [wanted[c] for c in dev["capabilities"]["values"] if c in wanted]
+        if not reported:
+            continue
+        state = dev["state"]
+        columns["id"].append(device_id)
+        columns["name"].append(dev["name"])
+        columns["type"].append(state.get("type"))
+        columns["time"].append(state.get("lastSeen"))
+        for key in keys:
+            values[key].append(state.get(key) if key in reported else None)
+    return columns
+
+
+def rows(columns):
+    """Turn columns from extract() into one dict per device.
+
+    Returns:
+        list: Dicts of column name -> value.
+    """
+    names = list(columns)
+    return [dict(zip(names, row)) for row in zip(*columns.values())]
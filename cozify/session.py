@@ -0,0 +1,131 @@
+"""Module for managing pooled keep-alive HTTP sessions shared by the API modules.
+
+One requests.Session is kept per base address, i.e. one per hub host and one for the cloud.
+Connections are thus reused between calls instead of paying for a new TCP (and TLS) handshake every time.
+
+Attributes:
+    pool_maxsize(int): Maximum number of keep-alive connections kept per base address. Defaults to 10.
+    idle_timeout(float): Seconds a session may stay unused before it gets evicted and its connections closed. Defaults to 60.
+"""
+
+import atexit
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from absl import logging
+from requests.adapters import HTTPAdapter
+
+pool_maxsize = 10
+idle_timeout = 60.0
+
+_sessions = {}  # base -> [requests.Session, last used monotonic timestamp]
+_lock = threading.Lock()
+_last_evict = 0.0
+
+
+def configure(maxsize=None, idle=None):
+    """Change pool settings. Already open sessions are closed so the new settings apply to all further calls.
+
+    Args:
+        maxsize(int): Maximum number of keep-alive connections per base address. Defaults to None to keep current value.
+        idle(float): Seconds of inactivity after which a session is evicted. Defaults to None to keep current value.
+    """
+    global pool_maxsize, idle_timeout
+    if maxsize is not None:
+        if maxsize < 1:
+            raise ValueError("Pool size must be at least 1, got: {0}".format(maxsize))
+        pool_maxsize = maxsize
+    if idle is not None:
+        idle_timeout = idle
+    close()
+
+
+def get(base):
+    """Get the pooled session for a base address, creating it if needed.
+
+    Args:
+        base(str): Base address of the API, e.g. 'http://192.168.1.10:8893'. Any path is ignored.
+
+    Returns:
+        requests.Session: Session to perform the call with.
+    """
+    key = _key(base)
+    now = time.monotonic()
+    if now - _last_evict > 1.0:
+        evict()
+    with _lock:
+        entry = _sessions.get(key)
+        if entry is None:
+            logging.debug("Opening new pooled session for {0}".format(key))
+            entry = [_new_session(), now]
+            _sessions[key] = entry
+        else:
+            entry[1] = now
+        return entry[0]
+
+
+def evict(max_idle=None):
+    """Close sessions that have been idle for too long.
+
+    Args:
+        max_idle(float): Idle time in seconds to evict after. Defaults to None which uses idle_timeout.
+
+    Returns:
+        int: Number of sessions evicted.
+    """
+    global _last_evict
+    if max_idle is None:
+        max_idle = idle_timeout
+    now = time.monotonic()
+    _last_evict = now
+    with _lock:
+        stale = [key for key, (_, used) in _sessions.items() if now - used > max_idle]
+        for key in stale:
+            logging.debug("Evicting idle pooled session for {0}".format(key))
+            _sessions.pop(key)[0].close()
+    return len(stale)
+
+
+def close(base=None):
+    """Close pooled sessions explicitly. Closed sessions are transparently reopened if used again.
+
+    Args:
+        base(str): Base address of the session to close. Defaults to None which closes all sessions.
+    """
+    with _lock:
+        if base is None:
+            keys = list(_sessions)
+        else:
+            keys = [_key(base)]
+        for key in keys:
+            entry = _sessions.pop(key, None)
+            if entry is not None:
+                entry[0].close()
+
+
+def active():
+    """List base addresses that currently have an open pooled session.
+
+    Returns:
+        list: Base addresses as 'scheme://host:port' strings.
+    """
+    with _lock:
+        return list(_sessions)
+
+
+def _key(base):
+    parts = urlsplit(base)
+    return "{0}://{1}".format(parts.scheme, parts.netloc)
+
+
+def _new_session():
+    s = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_maxsize)
+    s.mount("http://", adapter)
+    s.mount("https://", adapter)
+    return s
+
+
+atexit.register(close)
@@ -0,0 +1,251 @@
+"""Module for columnar device tables backed by NumPy, for analytics over many devices and snapshots.
+
+Requires the optional numpy dependency: pip install cozify[table]
+
+A DeviceTable has one row per device per appended snapshot. Numeric state fields become float columns with a mask of
+where the field was present, so devices of mixed types share one table. Snapshots are appended as chunks and only
+concatenated when columns are read, so appending in a polling loop stays cheap.
+
+Example::
+
+    from cozify import hub
+    from cozify.table import DeviceTable
+
+    table = DeviceTable(hub.devices())
+    sensors = table.with_capability(hub.capability.TEMPERATURE)
+    print(sensors.aggregate("temperature", how="mean", by="room"))
+
+Attributes:
+    numeric_fields(tuple): State fields collected as numeric columns by default.
+"""
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover
+    np = None
+
+from . import model
+
+numeric_fields = (
+    "brightness",
+    "temperature",
+    "humidity",
+    "lux",
+    "moisture",
+    "activePower",
+    "totalPower",
+    "batteryV",
+    "hue",
+    "saturation",
+)
+
+_label_columns = ("id", "name", "room", "type")
+_aggregates = ("count", "sum", "mean", "min", "max")
+
+
+class DeviceTable:
+    """Columnar table of device data.
+
+    Args:
+        devs(dict): Devices dict as returned by the API to start the table with. Defaults to None for an empty table.
+        fields(tuple): Numeric state fields to collect. Defaults to numeric_fields.
+        time(float): Time of the snapshot, see append().
+
+    Attributes:
+        fields(tuple): Numeric state fields collected.
+        snapshots(int): Number of snapshots appended.
+    """
+
+    def __init__(self, devs=None, fields=None, time=None):
+        if np is None:
+            raise ImportError(
+                "DeviceTable requires numpy, install it with: pip install cozify[table]"
+            )
+        self.fields = tuple(fields or numeric_fields)
+        self.snapshots = 0
+        self._chunks = {name: [] for name in self._column_names()}
+        if devs is not None:
+            self.append(devs, time=time)
+
+    def append(self, devs, time=None):
+        """Append a snapshot as new rows.
+
+        Args:
+            devs(dict): Devices dict as returned by the API.
+            time(float): Time of the snapshot, stored per row in the "time" column. Defaults to None which uses the lastSeen of each device in seconds.
+
+        Returns:
+            DeviceTable: self
+        """
+        count = len(devs)
+        labels = {name: [] for name in _label_columns}
+        masks = []
+        last_seen = []
+        values = {field: [] for field in self.fields}
+        for dev in devs.values():
+            state = dev["state"]
+            labels["id"].append(dev["id"])
+            labels["name"].append(dev["name"])
+            room = dev.get("room")
+            labels["room"].append(room[0] if room else None)
+            labels["type"].append(dev.get("type"))
+            masks.append(model.capability_mask(dev["capabilities"]["values"])[0])
+            last_seen.append(state.get("lastSeen") or 0)
+            for field in self.fields:
+                values[field].append(state.get(field))
+
+        chunk = {name: np.array(labels[name], dtype=object) for name in labels}
+        chunk["capabilities"] = np.array(masks, dtype=np.int64)
+        chunk["lastSeen"] = np.array(last_seen, dtype=np.int64)
+        if time is None:
+            chunk["time"] = chunk["lastSeen"] / 1000.0
+        else:
+            chunk["time"] = np.full(count, time, dtype=np.float64)
+        chunk["snapshot"] = np.full(count, self.snapshots, dtype=np.int64)
+        for field in self.fields:
+            column = np.array(values[field], dtype=object)
+            present = np.array([v is not None for v in values[field]], dtype=bool)
+            floats = np.zeros(count, dtype=np.float64)
+            floats[present] = column[present].astype(np.float64)
+            chunk[field] = floats
+            chunk[field + "?"] = present
+        for name, array in chunk.items():
+            self._chunks[name].append(array)
+        self.snapshots += 1
+        return self
+
+    def __len__(self):
+        return sum(len(c) for c in self._chunks["id"])
+
+    def column(self, name):
+        """Get a column.
+
+        Args:
+            name(str): A numeric field, or one of: id, name, room, type, capabilities, lastSeen, time, snapshot.
+
+        Returns:
+            numpy.ndarray: Column values. Numeric fields are returned as a numpy.ma.MaskedArray masking rows where the field was missing.
+        """
+        if name in self.fields:
+            return np.ma.MaskedArray(self._column(name), mask=~self._column(name + "?"))
+        if name not in self._chunks or name.endswith("?"):
+            raise ValueError("No such column: {0}".format(name))
+        return self._column(name)
+
+    def present(self, field):
+        """Boolean row mask of where a numeric field was present."""
+        return self._column(field + "?")
+
+    def select(self, rows):
+        """Get a new table with only some rows.
+
+        Args:
+            rows(numpy.ndarray): Boolean mask or integer indexes of rows to keep.
+
+        Returns:
+            DeviceTable: Table with the selected rows.
+        """
+        out = DeviceTable.__new__(DeviceTable)
+        out.fields = self.fields
+        out.snapshots = self.snapshots
+        out._chunks = {name: [self._column(name)[rows]] for name in self._chunks}
+        return out
+
+    def with_capability(self, capabilities, and_filter=False):
+        """Get a new table with only devices with capabilities. For arguments see cozify.hub.devices()"""
+        if not isinstance(capabilities, (list, tuple, set, frozenset)):
+            capabilities = [capabilities]
+        want = 0
+        for c in capabilities:
+            want |= model.capability_bit(c)
+        masks = self._column("capabilities") & want
+        return self.select(masks == want if and_filter else masks != 0)
+
+    def latest(self):
+        """Get a new table with only the rows of the latest snapshot."""
+        return self.select(self._column("snapshot") == self.snapshots - 1)
+
+    def aggregate(self, field, how="mean", by=None):
+        """Aggregate a numeric field over the rows where it's present.
+
+        Args:
+            field(str): Numeric field to aggregate.
+            how(str): One of count, sum, mean, min or max. Defaults to mean.
+            by(str): Column to group by, e.g. "room", "id" or "snapshot". Defaults to None for no grouping.
+
+        Returns:
+            float or dict: Aggregate value, or group -> aggregate value if grouped. Groups without any values are left out, as is an ungrouped aggregate of nothing which returns None.
+        """
+        if how not in _aggregates:
+            raise ValueError(
+                "Unknown aggregate {0}, expected one of: {1}".format(how, _aggregates)
+            )
+        if field not in self.fields:
+            raise ValueError("Not a numeric field: {0}".format(field))
+        present = self.present(field)
+        values = self._column(field)[present]
+        if by is None:
+            if not len(values):
+                return None
+            return _aggregate(values, how)
+        keys, groups = _factorize(self.column(by)[present])
+        counts = np.bincount(groups, minlength=len(keys))
+        if how == "count":
+            result = counts
+        elif how in ("sum", "mean"):
+            result = np.bincount(groups, weights=values, minlength=len(keys))
+            if how == "mean":
+                result = result / counts
+        else:
+            result = np.full(len(keys), np.inf if how == "min" else -np.inf)
+            (np.minimum if how == "min" else np.maximum).at(result, groups, values)
+        return {key: value.item() for key, value in zip(keys, result)}
+
+    def _column_names(self):
+        names = list(_label_columns) + ["capabilities", "lastSeen", "time", "snapshot"]
+        for field in self.fields:
+            names += [field, field + "?"]
+        return names
+
+    def _column(self, name):
+        chunks = self._chunks[name]
+        if len(chunks) != 1:  # consolidate on read so appends stay cheap
+            if chunks:
+                chunks[:] = [np.concatenate(chunks)]
+            else:
+                return np.array([], dtype=_empty_dtype(name))
+        return chunks[0]
+
+
+def _empty_dtype(name):
+    if name in _label_columns:
+        return object
+    if name.endswith("?"):
+        return bool
+    if name in ("capabilities", "lastSeen", "snapshot"):
+        return np.int64
+    return np.float64
+
+
+def _factorize(column):
+    """Group ids of column values.
+
+    Returns:
+        tuple: (list of distinct values in order of appearance, numpy.ndarray of group id per row)
+    """
+    if column.dtype != object:
+        keys, groups = np.unique(column, return_inverse=True)
+        return [k.item() for k in keys], groups
+    index = {}
+    groups = np.fromiter(
+        (index.setdefault(v, len(index)) for v in column),
+        dtype=np.int64,
+        count=len(column),
+    )
+    return list(index), groups
+
+
+def _aggregate(values, how):
+    if how == "count":
+        return len(values)
+    return getattr(values, how)().item()
@@ -40,6 +40,7 @@ def tmp_cloud():
     cloud._setAttr("remotetoken", obj.token)
     cloud._setAttr("last_refresh", obj.iso_yesterday)
     yield obj
+    config.flush()  # don't let a deferred write recreate the file
     os.remove(obj.configpath)
     logging.error("exiting, tried to remove: {0}".format(obj.configpath))
 
@@ -225,3 +226,18 @@ def _h6_dict(d):
     w = j.encode("utf8")
     h = hashlib.md5(w)
     return h.hexdigest()[:6]
+
+
+@pytest.fixture
+def mock_hub(tmp_hub):
+    """Stand-in hub served locally, registered as the host of tmp_hub. Calls need port=mock_hub.port."""
+    from cozify import cache, index
+
+    from cozify.benchmark.mock_hub import MockHub
+
+    index.invalidate()
+    cache.disable()
+    with MockHub() as mock:
+        config.state[tmp_hub.section]["host"] = mock.host
+        yield mock
+    cache.disable()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+import asyncio
+
+import pytest
+
+from cozify import aio, hub
+from cozify.Error import APIError, ConnectionError
+from cozify.test import debug
+from cozify.test.fixtures import mock_hub, tmp_cloud, tmp_hub
+
+
+@pytest.mark.logic
+def test_aio_devices_filter(tmp_hub):
+    ids, devs = tmp_hub.devices()
+    out = asyncio.run(
+        aio.devices(capabilities=hub.capability.COLOR_LOOP, mock_devices=devs)
+    )
+    assert out == hub.devices(capabilities=hub.capability.COLOR_LOOP, mock_devices=devs)
+
+
+@pytest.mark.logic
+def test_aio_devices(mock_hub):
+    devs = asyncio.run(aio.devices(port=mock_hub.port))
+    assert devs == mock_hub.devices
+    assert asyncio.run(aio.tz(port=mock_hub.port)) == "Europe/Helsinki"
+    assert asyncio.run(aio.ping(port=mock_hub.port))
+
+
+@pytest.mark.logic
+def test_aio_concurrent_commands(mock_hub):
+    lights = hub.devices(capabilities=hub.capability.BRIGHTNESS, port=mock_hub.port)
+
+    async def run():
+        await asyncio.gather(
+            *[aio.light_brightness(i, 0.42, port=mock_hub.port) for i in lights]
+        )
+        await asyncio.gather(*[aio.device_off(i, port=mock_hub.port) for i in lights])
+        await aio.close()
+
+    asyncio.run(run())
+    for i in lights:
+        assert mock_hub.devices[i]["state"]["brightness"] == 0.42
+        assert not mock_hub.devices[i]["state"]["isOn"]
+    assert mock_hub.count("PUT", "/devices/command") == 2 * len(lights)
+
+
+@pytest.mark.logic
+def test_aio_not_eligible(mock_hub):
+    twilight = next(
+        iter(hub.devices(capabilities=hub.capability.TWILIGHT, port=mock_hub.port))
+    )
+    with pytest.raises(ValueError):
+        asyncio.run(aio.light_brightness(twilight, 0.5, port=mock_hub.port))
+    with pytest.raises(ValueError):
+        asyncio.run(aio.device_on("dead-beef", port=mock_hub.port))
+
+
+@pytest.mark.logic
+def test_aio_errors(mock_hub):
+    with pytest.raises(APIError):
+        asyncio.run(aio.get("/nonexistent", **mock_hub.kwargs()))
+    mock_hub.stop()
+    with pytest.raises(ConnectionError):
+        asyncio.run(aio.tz(port=mock_hub.port))
+
+
+@pytest.mark.logic
+def test_aio_closed_loops_dropped(mock_hub):
+    asyncio.run(aio.tz(port=mock_hub.port))
+    asyncio.run(aio.tz(port=mock_hub.port))
+    assert len(aio._pools) == 1
+
+
+@pytest.mark.logic
+def test_aio_stale_connection_retry():
+    """A connection the other end dropped after a response is retried for reads, but commands are never sent twice."""
+    received = []
+
+    async def serve(reader, writer):
+        # answer the first request of each connection, then drop it silently
+        request = await reader.readuntil(b"\r\n\r\n")
+        length = [
+            int(line.split(b":")[1])
+            for line in request.split(b"\r\n")
+            if line.lower().startswith(b"content-length")
+        ]
+        await reader.readexactly(length[0] if length else 0)
+        received.append(request.split(b" ")[0].decode())
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Length: 2\r\n\r\n{}")
+        await writer.drain()
+        await reader.read(1)
+        writer.close()
+
+    async def run(method):
+        server = await asyncio.start_server(serve, "127.0.0.1", 0)
+        url = "http://127.0.0.1:{0}/".format(server.sockets[0].getsockname()[1])
+        try:
+            await aio._request(method, url, {}, "{}" if method == "PUT" else None)
+            return await aio._request(
+                method, url, {}, "{}" if method == "PUT" else None
+            )
+        finally:
+            await aio.close()
+            server.close()
+
+    assert asyncio.run(run("GET"))[0] == 200
+    assert received == ["GET", "GET"]
+    del received[:]
+    with pytest.raises(ConnectionError):
+        asyncio.run(run("PUT"))
+    assert received == ["PUT"]
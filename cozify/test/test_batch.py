@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+import json
+
+import pytest
+
+from cozify import hub
+from cozify.test import debug
+from cozify.test.fixtures import mock_hub, tmp_cloud, tmp_hub
+
+
+@pytest.mark.logic
+def test_batch_single_call(mock_hub):
+    lights = hub.devices(capabilities=hub.capability.BRIGHTNESS, port=mock_hub.port)
+    mock_hub.reset()
+    with hub.batch(port=mock_hub.port) as b:
+        for i in lights:
+            b.on(i).light_brightness(i, 0.3)
+        assert len(b) == 2 * len(lights)
+    assert mock_hub.count("GET", "/devices") == 1
+    assert mock_hub.count("PUT", "/devices/command") == 1
+    for i in lights:
+        assert mock_hub.devices[i]["state"]["isOn"]
+        assert mock_hub.devices[i]["state"]["brightness"] == 0.3
+
+
+@pytest.mark.logic
+def test_batch_split(mock_hub):
+    ids = list(hub.devices(capabilities=hub.capability.ON_OFF, port=mock_hub.port))
+    mock_hub.reset()
+    b = hub.batch(max_size=2, port=mock_hub.port)
+    for i in ids:
+        b.off(i)
+    replies = b.flush()
+    assert len(replies) == mock_hub.count("PUT", "/devices/command") == 2
+    assert not b.commands
+    assert not any(mock_hub.devices[i]["state"]["isOn"] for i in ids)
+
+
+@pytest.mark.logic
+def test_batch_not_eligible(mock_hub):
+    twilight = next(
+        iter(hub.devices(capabilities=hub.capability.TWILIGHT, port=mock_hub.port))
+    )
+    mock_hub.reset()
+    with pytest.raises(ValueError):
+        with hub.batch(port=mock_hub.port) as b:
+            b.light_brightness(twilight, 0.5)
+    with pytest.raises(ValueError):
+        hub.batch(port=mock_hub.port).on("dead-beef")
+    with pytest.raises(AttributeError):
+        hub.batch(port=mock_hub.port).state("dead-beef", {})
+    with pytest.raises(ValueError):
+        hub.batch(max_size=0, port=mock_hub.port)
+    assert mock_hub.count("PUT", "/devices/command") == 0
+
+
+@pytest.mark.logic
+def test_batch_split_bytes(mock_hub):
+    ids = list(hub.devices(capabilities=hub.capability.ON_OFF, port=mock_hub.port))
+    mock_hub.reset()
+    b = hub.batch(port=mock_hub.port)
+    for i in ids:
+        b.off(i)
+    b.max_bytes = len(json.dumps(b.commands[:2]))  # room for exactly two commands
+    replies = b.flush()
+    assert len(replies) == mock_hub.count("PUT", "/devices/command") == 2
+    b.max_bytes = 1  # oversized commands still go out, one per call
+    b.on(ids[0]).on(ids[1])
+    assert len(b.flush()) == 2
+    assert mock_hub.devices[ids[0]]["state"]["isOn"]
+
+
+@pytest.mark.logic
+def test_batch_devices(mock_hub):
+    b = hub.batch(port=mock_hub.port)
+    assert b.devices() == mock_hub.devices
+    assert b.devices() is b.devices()
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+import json
+
+import pytest
+
+from cozify import benchmark, config
+from cozify.benchmark import __main__ as cli
+from cozify.test import debug
+
+
+@pytest.mark.logic
+def test_benchmark_run():
+    state_file = config.state_file
+    results = benchmark.run(iterations=5, warmup=1, devices=14)
+    assert config.state_file == state_file
+    assert set(results["results"]) == set(benchmark.cases)
+    for name, r in results["results"].items():
+        assert r["errors"] == 0, name
+        assert r["iterations"] == 5
+        assert 0 < r["min_ms"] <= r["p50_ms"] <= r["p99_ms"] <= r["max_ms"]
+        assert r["throughput"] > 0
+    assert results["meta"]["devices"] == 14
+    assert json.loads(json.dumps(results)) == results
+    with pytest.raises(ValueError):
+        benchmark.run(names=["no-such-case"])
+
+
+@pytest.mark.logic
+def test_benchmark_concurrency():
+    calls = []
+    r = benchmark.measure(
+        lambda: calls.append(1), iterations=20, warmup=2, concurrency=4
+    )
+    assert len(calls) == 22
+    assert r["errors"] == 0 and r["iterations"] == 20
+    r = benchmark.measure(lambda: 1 / 0, iterations=3, warmup=0)
+    assert r["errors"] == 3 and r["p50_ms"] is None and r["throughput"] == 0
+
+
+@pytest.mark.logic
+def test_benchmark_compare():
+    def results(p50, throughput):
+        return {
+            "results": {
+                "ping": {"p50_ms": p50, "p99_ms": p50 * 2, "throughput": throughput}
+            }
+        }
+
+    assert benchmark.compare(results(1.0, 100), results(1.05, 95)) == []
+    assert benchmark.compare(results(1.0, 100), results(1.5, 50)) == [
+        ("ping", "p50_ms", 1.0, 1.5),
+        ("ping", "p99_ms", 2.0, 3.0),
+        ("ping", "throughput", 100, 50),
+    ]
+    assert benchmark.compare({"results": {}}, results(1.0, 100)) == []
+    assert benchmark.percentile([1, 2, 3, 4], 0.5) == 2
+    assert benchmark.percentile([1, 2, 3, 4], 0.99) == 4
+
+
+@pytest.mark.logic
+def test_benchmark_main(tmp_path, capsys):
+    output = str(tmp_path / "results.json")
+    argv = ["--cases", "ping,hub_info", "--iterations", "3", "--output", output]
+    assert cli.main(argv) == 0
+    with open(output) as f:
+        assert set(json.load(f)["results"]) == {"ping", "hub_info"}
+    assert "hub_info" in capsys.readouterr().out
+    assert cli.main(argv[:4] + ["--compare", output, "--threshold", "100"]) == 0
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+import asyncio
+import threading
+
+import pytest
+
+from cozify import aio, cache, hub
+from cozify.test import debug
+from cozify.test.fixtures import mock_hub, tmp_cloud, tmp_hub
+
+
+@pytest.mark.logic
+def test_cache_disabled(mock_hub):
+    hub.devices(port=mock_hub.port)
+    hub.devices(port=mock_hub.port)
+    assert mock_hub.count("GET", "/devices") == 2
+    assert cache.age(hub.default()) is None
+
+
+@pytest.mark.logic
+def test_cache_enabled(mock_hub):
+    cache.enable(max_age=60)
+    device_id = next(iter(mock_hub.devices))
+    devs = hub.devices(port=mock_hub.port)
+    assert hub.device(device_id, port=mock_hub.port) is devs[device_id]
+    assert hub.device_exists(device_id, port=mock_hub.port)
+    assert hub.has_state(device_id, {"reachable": True}, port=mock_hub.port)
+    assert asyncio.run(aio.devices(port=mock_hub.port)) is devs
+    assert mock_hub.count("GET", "/devices") == 1
+
+    hub.devices(max_age=0, port=mock_hub.port)
+    assert mock_hub.count("GET", "/devices") == 2
+    cache.invalidate(hub.default())
+    hub.devices(port=mock_hub.port)
+    assert mock_hub.count("GET", "/devices") == 3
+
+
+@pytest.mark.logic
+def test_cache_per_call(mock_hub):
+    hub.devices(max_age=60, port=mock_hub.port)
+    hub.devices(max_age=60, port=mock_hub.port)
+    hub.devices(port=mock_hub.port)  # default is still no caching
+    assert mock_hub.count("GET", "/devices") == 2
+
+
+@pytest.mark.logic
+def test_cache_shared_fetch(mock_hub):
+    cache.enable(max_age=60)
+    mock_hub.latency = 0.2
+    threads = [
+        threading.Thread(target=hub.devices, kwargs={"port": mock_hub.port})
+        for _ in range(10)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert mock_hub.count("GET", "/devices") == 1
+
+
+@pytest.mark.logic
+def test_cache_write_through(mock_hub):
+    cache.enable(max_age=60)
+    hub_id = hub.default()
+    devs = hub.devices(port=mock_hub.port)
+    lamp = next(
+        iter(hub.devices(capabilities=hub.capability.BRIGHTNESS, port=mock_hub.port))
+    )
+    hub.device_off(lamp, port=mock_hub.port)
+    hub.light_brightness(lamp, 0.25, port=mock_hub.port)
+
+    dev = hub.device(lamp, port=mock_hub.port)
+    assert dev["state"]["isOn"] is False
+    assert dev["state"]["brightness"] == 0.25
+    assert devs[lamp]["state"]["brightness"] != 0.25  # handed out snapshot untouched
+    assert cache.pending(hub_id) == {lamp: {"isOn": False, "brightness": 0.25}}
+    assert mock_hub.count("GET", "/devices") == 1
+
+    assert hub.await_state(lamp, {"isOn": False}, port=mock_hub.port)
+    assert mock_hub.count("GET", "/devices") == 2
+    assert cache.pending(hub_id) == {}
+
+
+@pytest.mark.logic
+def test_cache_write_through_uncached(mock_hub):
+    lamp = next(iter(mock_hub.devices))
+    hub.device_off(lamp, port=mock_hub.port)
+    assert cache.age(hub.default()) is None
+    assert cache.pending(hub.default()) == {}
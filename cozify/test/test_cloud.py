@@ -8,6 +8,7 @@ import time
 import pytest
 
 from cozify import cloud, config, hub
+from cozify.benchmark.mock_hub import MockHub
 from cozify.Error import AuthenticationError
 from cozify.test import debug
 from cozify.test.fixtures import *
@@ -113,3 +114,74 @@ def test_cloud_remote_match(live_cloud, live_hub):
     remote_tz = live_hub.tz(remote=True)
 
     assert local_tz == remote_tz
+
+
+@pytest.fixture
+def lan_hub(tmp_cloud, monkeypatch):
+    from cozify import cloud_api, hub_api
+
+    with MockHub() as mock:
+        getBase = hub_api._getBase
+        monkeypatch.setattr(
+            hub_api,
+            "_getBase",
+            lambda host, port=None, **kwargs: getBase(host, port=mock.port),
+        )
+        # only the first address has a hub listening
+        monkeypatch.setattr(cloud_api, "lan_ip", lambda: ["127.0.0.1", "127.0.0.2"])
+        monkeypatch.setattr(cloud, "probe_timeout", 0.5)
+        writes = []
+        stateWrite = config.stateWrite
+        monkeypatch.setattr(
+            config, "stateWrite", lambda *a: writes.append(a) or stateWrite(*a)
+        )
+        yield mock, writes
+    config.setStatePath()
+
+
+@pytest.mark.logic
+def test_cloud_update_hubs(lan_hub):
+    mock, writes = lan_hub
+    config.state.add_section("Hubs." + mock.hub_id)  # only known hubs are updated
+    cloud.update_hubs()
+    assert hub.host(mock.hub_id) == "127.0.0.1"
+    assert hub.name(mock.hub_id) == mock.name
+    assert len(writes) == 1
+
+
+@pytest.mark.logic
+def test_cloud_update_hubs_unknown(lan_hub, monkeypatch):
+    from cozify import hub_api
+
+    mock, writes = lan_hub
+    with MockHub() as other:
+        other.hub_id = "deadbeef-aaaa-bbbb-cccc-unknownhubdd"
+        # both addresses answer, each with its own hub
+        ports = {"127.0.0.1": mock.port, "127.0.0.2": other.port}
+        monkeypatch.setattr(
+            hub_api,
+            "_getBase",
+            lambda host, port=None, **kwargs: "http://127.0.0.1:{0}".format(
+                ports[host]
+            ),
+        )
+        config.state.add_section("Hubs." + mock.hub_id)
+        cloud.update_hubs()
+    assert hub.host(mock.hub_id) == "127.0.0.1"
+    assert not hub.exists(other.hub_id)
+    assert len(writes) == 1
+
+
+@pytest.mark.logic
+def test_cloud_authenticate_lan_probe(lan_hub, monkeypatch):
+    from cozify import cloud_api
+
+    mock, writes = lan_hub
+    monkeypatch.setattr(cloud, "_need_cloud_token", lambda trust: False)
+    monkeypatch.setattr(cloud_api, "hubkeys", lambda token: {mock.hub_id: "hubtoken"})
+    assert cloud.authenticate(trustHub=False)
+    assert hub.host(mock.hub_id) == "127.0.0.1"
+    assert hub.token(mock.hub_id) == "hubtoken"
+    assert not hub.remote(mock.hub_id)
+    assert hub.default() == mock.hub_id
+    assert len(writes) == 1
@@ -1,6 +1,8 @@
 #!/usr/bin/env python3
 
 import os
+import subprocess
+import sys
 import tempfile
 
 import pytest
@@ -31,3 +33,38 @@ def test_config_XDG_basedir(tmp_hub):
     assert config._initXDG()
     assert os.path.isdir(td)
     os.removedirs(td + "/python-cozify")
+
+
+@pytest.mark.logic
+def test_config_import_side_effect_free():
+    with tempfile.TemporaryDirectory() as td:
+        env = dict(os.environ, XDG_CONFIG_HOME=os.path.join(td, "config"))
+        subprocess.run(
+            [sys.executable, "-c", "import cozify.hub, cozify.cloud"],
+            env=env,
+            check=True,
+        )
+        assert not os.path.exists(env["XDG_CONFIG_HOME"])
+
+
+@pytest.mark.logic
+def test_config_read_does_not_write(tmp_hub):
+    with tempfile.TemporaryDirectory() as td:
+        path = os.path.join(td, "missing", "state.cfg")
+        config.setStatePath(path)
+        assert "Cloud" in config.state
+        config.dump_state()
+        assert not os.path.exists(os.path.dirname(path))
+        config.state["Cloud"]["email"] = "example@example.com"
+        config.stateWrite()
+        config.flush()
+        assert os.path.exists(path)
+
+
+@pytest.mark.logic
+def test_config_default_path_resolved_late(tmp_hub, monkeypatch):
+    with tempfile.TemporaryDirectory() as td:
+        monkeypatch.setenv("XDG_CONFIG_HOME", td)
+        config.setStatePath()
+        assert config.state_file.startswith(td)
+        assert not os.path.exists(config.state_file)
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+
+import configparser
+import os
+import threading
+import time
+
+import pytest
+
+from cozify import config
+
+
+@pytest.fixture
+def state_dir(tmp_path, monkeypatch):
+    writes = []
+    replace = os.replace
+
+    def counting_replace(src, dst):
+        writes.append((dst, threading.current_thread()))
+        replace(src, dst)
+
+    monkeypatch.setattr(os, "replace", counting_replace)
+    monkeypatch.setattr(config, "write_delay", 60.0)
+    config.setStatePath(str(tmp_path / "state.cfg"))
+    config.stateWrite(config.state)
+    writes.clear()
+    yield tmp_path, writes
+    config.setStatePath()
+
+
+def _stored(path):
+    with open(path) as cf:
+        return cf.read()
+
+
+def _wait(writes, count):
+    deadline = time.monotonic() + 5
+    while len(writes) < count:
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+@pytest.mark.logic
+def test_config_write_coalesced(state_dir):
+    tmp_path, writes = state_dir
+    config.state["Cloud"]["first"] = "1"
+    config._last_write = 0.0  # outside of the window, written right away
+    config.stateWrite()
+    _wait(writes, 1)
+    assert writes[0][1] is not threading.current_thread()  # never on the caller
+    config.state["Cloud"]["second"] = "2"
+    config.stateWrite()
+    config.state["Cloud"]["third"] = "3"
+    config.stateWrite()
+    assert len(writes) == 1
+    assert "second" not in _stored(config.state_file)
+    config.flush()
+    assert len(writes) == 2
+    assert "third" in _stored(config.state_file)
+
+
+@pytest.mark.logic
+def test_config_write_unchanged_skipped(state_dir):
+    tmp_path, writes = state_dir
+    config._last_write = 0.0
+    config.stateWrite()
+    config.flush()
+    assert writes == []
+
+
+@pytest.mark.logic
+def test_config_write_atomic(state_dir):
+    tmp_path, writes = state_dir
+    config.state["Cloud"]["key"] = "value"
+    config.stateWrite()
+    config.flush()
+    assert os.listdir(tmp_path) == ["state.cfg"]
+    assert os.stat(config.state_file).st_mode & 0o777 == 0o600
+
+
+@pytest.mark.logic
+def test_config_write_flushed_on_path_change(state_dir):
+    tmp_path, writes = state_dir
+    path = config.state_file
+    config.state["Cloud"]["key"] = "value"
+    config.stateWrite()
+    config.setStatePath(str(tmp_path / "other.cfg"))
+    assert "key" in _stored(path)
+
+
+@pytest.mark.logic
+def test_config_write_snapshot(state_dir):
+    tmp_path, writes = state_dir
+    config.state["Cloud"]["written"] = "1"
+    config.stateWrite()  # deferred, serialized now
+    config.state["Cloud"]["unwritten"] = "2"
+    config.flush()
+    assert "written" in _stored(config.state_file)
+    assert "unwritten" not in _stored(config.state_file)
+
+
+@pytest.mark.logic
+def test_config_write_tmpstate_replaces_deferred(state_dir):
+    tmp_path, writes = state_dir
+    config.state["Cloud"]["stale"] = "1"
+    config.stateWrite()  # deferred
+    tmpstate = configparser.ConfigParser()
+    tmpstate["Cloud"] = {"fresh": "1"}
+    config.stateWrite(tmpstate)
+    config.flush()
+    assert "fresh" in _stored(config.state_file)
+    assert "stale" not in _stored(config.state_file)
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+import pytest
+
+from cozify import hub, session
+from cozify.test import debug
+from cozify.test.fixtures import mock_hub, tmp_cloud, tmp_hub
+
+
+@pytest.mark.logic
+def test_context_resolve(tmp_hub):
+    ctx = hub.context()
+    assert ctx.hub_id == tmp_hub.id
+    assert ctx.host == tmp_hub.host
+    assert ctx.hub_token == tmp_hub.token
+    assert not ctx.remote
+    assert ctx.transport is not None
+    assert hub.context(hub_name=tmp_hub.name).hub_id == tmp_hub.id
+    assert hub.context(remote=True).transport is None
+
+
+@pytest.mark.logic
+def test_context_fill(tmp_hub, monkeypatch):
+    ctx = hub.context()
+
+    def forbidden(*args, **kwargs):
+        raise AssertionError("state lookup on the hot path")
+
+    monkeypatch.setattr(hub, "token", forbidden)
+    monkeypatch.setattr(hub, "remote", forbidden)
+    kwargs = {"context": ctx, "host": "10.0.0.1"}
+    hub._fill_kwargs(kwargs)
+    assert "context" not in kwargs
+    assert kwargs["hub_token"] == tmp_hub.token
+    assert kwargs["host"] == "10.0.0.1"
+
+
+@pytest.mark.logic
+def test_context_calls(mock_hub):
+    ctx = hub.context(port=mock_hub.port)
+    assert ctx.devices() == mock_hub.devices
+    assert hub.devices(context=ctx) == mock_hub.devices
+    assert ctx.tz() == "Europe/Helsinki"
+    lamp = next(iter(ctx.devices(capabilities=hub.capability.ON_OFF)))
+    ctx.device_off(lamp)
+    assert not mock_hub.devices[lamp]["state"]["isOn"]
+    with pytest.raises(AttributeError):
+        ctx.default()
+
+
+@pytest.mark.logic
+def test_context_session_evicted(mock_hub):
+    ctx = hub.context(port=mock_hub.port)
+    assert ctx.tz() == "Europe/Helsinki"
+    assert session.evict(max_idle=0.0) >= 1
+    assert session.active() == []
+    assert ctx.tz() == "Europe/Helsinki"
+    assert session.active() == [ctx.base]
+    assert ctx.transport is session.get(ctx.base)
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+import copy
+
+import pytest
+
+from cozify import diff
+from cozify.test import debug
+from cozify.benchmark.mock_hub import synthetic_devices, synthetic_scenes
+
+
+@pytest.mark.logic
+def test_diff_devices():
+    old = synthetic_devices(20)
+    new = copy.deepcopy(old)
+    ids = list(old)
+    new[ids[0]]["state"]["isOn"] = not old[ids[0]]["state"]["isOn"]
+    new[ids[0]]["timestamp"] += 1
+    del new[ids[1]]["state"]["reachable"]
+    new[ids[2]]["name"] = "renamed"  # outside of the state
+    del new[ids[3]]
+    new["new"] = copy.deepcopy(old[ids[4]])
+
+    patches = {p.id: p for p in diff.diff(old, new)}
+    assert set(patches) == {ids[0], ids[1], ids[2], ids[3], "new"}
+    assert patches[ids[0]] == diff.Patch(
+        ids[0],
+        "update",
+        {
+            ("state", "isOn"): new[ids[0]]["state"]["isOn"],
+            ("timestamp",): new[ids[0]]["timestamp"],
+        },
+        (),
+    )
+    assert patches[ids[1]].removed == (("state", "reachable"),)
+    assert patches[ids[2]].changes == {("name",): "renamed"}
+    assert patches[ids[3]].op == "remove"
+    assert patches["new"].changes == {(): new["new"]}
+
+    patched = diff.apply(old, patches.values())
+    assert patched == new
+    assert old == synthetic_devices(20)  # untouched
+
+
+@pytest.mark.logic
+def test_diff_scenes():
+    old = synthetic_scenes(5)
+    new = copy.deepcopy(old)
+    scene_id = next(iter(new))
+    new[scene_id]["isOn"] = True
+    assert diff.diff(old, new) == [
+        diff.Patch(scene_id, "update", {("isOn",): True}, ())
+    ]
+
+    assert hash(-1) == hash(-2)  # equal fingerprints, yet different
+    old = {"s": {"id": "s", "level": -1}}
+    assert diff.diff(old, {"s": {"id": "s", "level": -2}}) == [
+        diff.Patch("s", "update", {("level",): -2}, ())
+    ]
+
+
+@pytest.mark.logic
+def test_diff_nested_fingerprint():
+    item = {"state": {"type": "X", "nested": {"a": [1, 2]}}}
+    changed = copy.deepcopy(item)
+    changed["state"]["nested"]["a"].append(3)
+    assert diff.fingerprint(item) == diff.fingerprint(copy.deepcopy(item))
+    assert diff.fingerprint(item) != diff.fingerprint(changed)
+    assert diff.item_patch("x", item, changed).changes == {
+        ("state", "nested", "a"): [1, 2, 3]
+    }
+
+
+@pytest.mark.logic
+def test_diff_tracker():
+    devs = synthetic_devices(10)
+    tracker = diff.Tracker()
+    assert len(tracker.update(devs)) == 10
+    assert tracker.update(copy.deepcopy(devs)) == []
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+import concurrent.futures
+import threading
+
+import pytest
+import requests
+
+from cozify import exporter, hub, metrics
+from cozify.test import debug
+from cozify.test.fixtures import mock_hub, tmp_cloud, tmp_hub
+
+
+@pytest.fixture
+def served(mock_hub):
+    exp = exporter.Exporter(max_age=60, port=mock_hub.port)
+    httpd = exporter.server(exp, port=0)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    yield exp, "http://127.0.0.1:{0}".format(httpd.server_address[1])
+    httpd.shutdown()
+    httpd.server_close()
+    metrics.disable()
+    metrics.reset()
+
+
+@pytest.mark.logic
+def test_exporter_render(mock_hub, tmp_hub):
+    metrics.reset()
+    exp = exporter.Exporter(max_age=60, port=mock_hub.port)
+    text = exp.render()
+    metrics.disable()
+    assert (
+        'cozify_hub_up{{hub_id="{0}",hub_name="{1}"}} 1'.format(
+            tmp_hub.id, tmp_hub.name
+        )
+        in text.splitlines()
+    )
+    assert "# TYPE cozify_device_brightness gauge" in text
+    samples = [line for line in text.splitlines() if not line.startswith("#")]
+    assert len([s for s in samples if s.startswith("cozify_device_reachable{")]) == 5
+    assert len([s for s in samples if s.startswith("cozify_device_brightness{")]) == 4
+    assert any(
+        s.startswith("cozify_calls_total{") and 'endpoint="/devices"' in s
+        for s in samples
+    )
+    assert any(s.startswith("cozify_call_seconds_bucket{") for s in samples)
+    assert any('le="+Inf"' in s for s in samples)
+    assert exp.render() is text
+
+
+@pytest.mark.logic
+def test_exporter_shared_snapshot(served, mock_hub):
+    exp, base = served
+    mock_hub.reset()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=8) as executor:
+        replies = list(
+            executor.map(lambda _: requests.get(base + "/metrics"), range(16))
+        )
+    assert all(r.status_code == 200 for r in replies)
+    assert len({r.text for r in replies}) == 1
+    assert replies[0].headers["Content-Type"].startswith("text/plain; version=0.0.4")
+    assert exp.renders == 1
+    assert mock_hub.count("GET", "/devices") == 1
+    assert requests.get(base + "/").status_code == 404
+
+
+@pytest.mark.logic
+def test_exporter_hub_down(tmp_hub):
+    exp = exporter.Exporter(hub_ids=[tmp_hub.id], max_age=0, port=1)
+    metrics.disable()
+    text = exp.render()
+    assert (
+        'cozify_hub_up{{hub_id="{0}",hub_name="{1}"}} 0'.format(
+            tmp_hub.id, tmp_hub.name
+        )
+        in text.splitlines()
+    )
+    assert "cozify_device_reachable" not in text
+
+
+@pytest.mark.logic
+def test_exporter_escape():
+    assert exporter._sample("m", {"name": 'a "b"\\\n'}, 1.0) == (
+        'm{name="a \\"b\\"\\\\\\n"} 1.0'
+    )
+
+
+@pytest.mark.logic
+def test_exporter_snapshot_age(mock_hub, tmp_hub, monkeypatch):
+    seen = []
+    devices = hub.devices
+
+    def recording(**kwargs):
+        seen.append(kwargs)
+        return devices(**kwargs)
+
+    monkeypatch.setattr(hub, "devices", recording)
+    exp = exporter.Exporter(max_age=60, timeout=2, port=mock_hub.port)
+    metrics.disable()
+    exp.render()
+    (kwargs,) = seen
+    assert kwargs["hub_id"] == tmp_hub.id
+    assert kwargs["max_age"] == 30  # shorter than a rendering is reused for
+    assert kwargs["request_timeout"] == 2
@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+import pytest
+
+from cozify import config, hub
+from cozify.Error import ConnectionError
+from cozify.test import debug
+from cozify.test.fixtures import mock_hub, tmp_cloud, tmp_hub
+
+unreachable = "deadbeef-aaaa-bbbb-cccc-unreachabled"
+
+
+@pytest.fixture
+def two_hubs(mock_hub, tmp_hub):
+    section = "Hubs.{0}".format(unreachable)
+    config.state.add_section(section)
+    config.state[section]["hubname"] = "Unreachable"
+    config.state[section]["host"] = "127.0.0.2"  # nothing listens there
+    config.state[section]["hubtoken"] = tmp_hub.token
+    yield mock_hub
+
+
+@pytest.mark.logic
+def test_ids(two_hubs, tmp_hub):
+    assert sorted(hub.ids()) == sorted([tmp_hub.id, unreachable])
+
+
+@pytest.mark.logic
+def test_devices_all(two_hubs, tmp_hub):
+    results, errors = hub.devices_all(
+        timeout=1, capabilities=hub.capability.TWILIGHT, port=two_hubs.port
+    )
+    assert list(results) == [tmp_hub.id]
+    assert len(results[tmp_hub.id]) == 1
+    assert list(errors) == [unreachable]
+    assert isinstance(errors[unreachable], ConnectionError)
+
+
+@pytest.mark.logic
+def test_scenes_all(two_hubs, tmp_hub):
+    results, errors = hub.scenes_all(hub_ids=[tmp_hub.id], port=two_hubs.port)
+    assert results[tmp_hub.id] == two_hubs.scenes
+    assert errors == {}
+    assert hub.devices_all(hub_ids=[]) == ({}, {})
+
+
+@pytest.mark.logic
+def test_ping_all(mock_hub, tmp_hub):
+    assert hub.ping_all(port=mock_hub.port) == ({tmp_hub.id: True}, {})
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+import asyncio
+import copy
+import threading
+import time
+
+import pytest
+
+from cozify import aio, feed, hub
+from cozify.test import debug
+from cozify.test.fixtures import mock_hub, tmp_cloud, tmp_hub
+from cozify.benchmark.mock_hub import synthetic_devices
+
+
+@pytest.mark.logic
+def test_feed_changes():
+    old = synthetic_devices(3)
+    new = copy.deepcopy(old)
+    changed, untouched, removed = list(old)
+    del new[removed]
+    new[changed]["state"]["isOn"] = not old[changed]["state"]["isOn"]
+    new[changed]["state"]["lastSeen"] += 1
+    new[changed]["timestamp"] += 1
+    new[untouched]["state"]["isOn"] = "ignored, timestamps unchanged"
+    events, baseline = feed.changes(old, new)
+
+    assert len(events) == 2
+    assert events[0] == feed.Change(
+        changed,
+        ("isOn",),
+        {"isOn": old[changed]["state"]["isOn"]},
+        {"isOn": new[changed]["state"]["isOn"]},
+        new[changed]["state"]["lastSeen"],
+    )
+    assert events[1].device_id == removed and events[1].new == {}
+    assert baseline[untouched] is old[untouched]
+    assert removed not in baseline
+
+    events, baseline = feed.changes({}, baseline)
+    assert len(events) == 2 and all(e.old == {} for e in events)
+
+
+@pytest.mark.logic
+def test_feed_touch_only():
+    old = synthetic_devices(1)
+    new = copy.deepcopy(old)
+    for dev in new.values():
+        dev["state"]["lastSeen"] += 1
+        dev["timestamp"] += 1
+    assert feed.changes(old, new)[0] == []
+
+
+def _light(mock_hub):
+    return next(
+        i
+        for i, d in mock_hub.devices.items()
+        if "BRIGHTNESS" in d["capabilities"]["values"]
+    )
+
+
+@pytest.mark.logic
+def test_watch(mock_hub):
+    light = _light(mock_hub)
+    timer = threading.Timer(0.15, mock_hub.report, [light], {"brightness": 0.25})
+    timer.start()
+    events = hub.watch(
+        interval=0.1, capabilities=hub.capability.BRIGHTNESS, port=mock_hub.port
+    )
+    event = next(events)
+    timer.join()
+    assert event.device_id == light
+    assert event.keys == ("brightness",)
+    assert event.new == {"brightness": 0.25}
+    assert event.last_seen == mock_hub.devices[light]["state"]["lastSeen"]
+
+
+@pytest.mark.logic
+def test_aio_watch(mock_hub):
+    light = _light(mock_hub)
+
+    async def scenario():
+        loop = asyncio.get_running_loop()
+        events = aio.watch(interval=0.1, port=mock_hub.port)
+        loop.call_later(0.15, lambda: mock_hub.report(light, brightness=0.75))
+        event = await events.__anext__()
+        await events.aclose()
+        await aio.close()
+        return event
+
+    event = asyncio.run(scenario())
+    assert event.device_id == light
+    assert event.new == {"brightness": 0.75}
+
+
+@pytest.mark.logic
+def test_watch_every_tick(mock_hub):
+    light = _light(mock_hub)
+    interval = 0.2
+    changes = 6
+    seen = []
+
+    def consume():
+        events = hub.watch(
+            interval=interval,
+            capabilities=hub.capability.BRIGHTNESS,
+            port=mock_hub.port,
+        )
+        for event in events:
+            seen.append(event.new["brightness"])
+            if len(seen) == changes:
+                return
+
+    consumer = threading.Thread(target=consume, daemon=True)
+    consumer.start()
+    time.sleep(interval)  # let the watcher take its baseline
+    mock_hub.reset()
+    for i in range(changes):
+        # change state mid-tick, once per tick
+        time.sleep(feed.next_tick(interval) + interval / 2)
+        mock_hub.report(light, brightness=(i + 1) / 10)
+    consumer.join(timeout=interval * 4)
+    assert seen == [(i + 1) / 10 for i in range(changes)]
+    # one fetch per tick, none served from the previous tick's snapshot
+    assert mock_hub.count("GET", "/devices") >= changes
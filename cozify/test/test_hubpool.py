@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+import threading
+import time
+
+import pytest
+
+from cozify import hub
+from cozify.hubpool import HubPool
+from cozify.test import debug
+from cozify.test.fixtures import mock_hub, tmp_cloud, tmp_hub
+
+
+@pytest.mark.logic
+def test_hubpool_map(mock_hub, tmp_hub):
+    with HubPool(port=mock_hub.port) as pool:
+        assert pool.hub_ids == [tmp_hub.id]
+        results, errors = pool.map(hub.devices, capabilities=hub.capability.TWILIGHT)
+        assert len(results[tmp_hub.id]) == 1
+        assert errors == {}
+        _, errors = pool.map(hub.device, "no-such-device")
+        assert isinstance(errors[tmp_hub.id], KeyError)
+        stats = pool.stats()[tmp_hub.id]
+        assert (stats.completed, stats.failed, stats.queued, stats.in_flight) == (
+            1,
+            1,
+            0,
+            0,
+        )
+        assert stats.latency_avg > 0
+    with pytest.raises(ValueError):
+        HubPool(max_in_flight=0)
+
+
+@pytest.mark.logic
+def test_hubpool_in_flight_limit(tmp_hub):
+    running = []
+    peak = []
+    lock = threading.Lock()
+
+    def slow(context=None):
+        with lock:
+            running.append(1)
+            peak.append(len(running))
+        time.sleep(0.05)
+        with lock:
+            running.pop()
+        return context.hub_id
+
+    with HubPool(max_in_flight=2) as pool:
+        futures = [pool.submit(tmp_hub.id, slow) for _ in range(6)]
+        assert pool.stats()[tmp_hub.id].queued > 0
+        assert [f.result() for f in futures] == [tmp_hub.id] * 6
+    assert max(peak) == 2
+    with pytest.raises(ValueError):
+        pool.submit("unknown", slow)
+
+
+@pytest.mark.logic
+def test_hubpool_command_rate(mock_hub, tmp_hub):
+    lamp = next(
+        i
+        for i, d in mock_hub.devices.items()
+        if "ON_OFF" in d["capabilities"]["values"]
+    )
+    with HubPool(commands_per_second=20, max_in_flight=4, port=mock_hub.port) as pool:
+        start = time.monotonic()
+        futures = [pool.command(tmp_hub.id, hub.device_on, lamp) for _ in range(5)]
+        for f in futures:
+            f.result()
+        assert time.monotonic() - start >= 0.2  # 5 commands at 20/s
+    assert mock_hub.count("PUT", "/devices/command") == 5
+
+
+@pytest.mark.logic
+def test_hubpool_command_slot_frees_workers(tmp_hub):
+    started = []
+
+    def command(context=None):
+        started.append(time.monotonic())
+
+    with HubPool(commands_per_second=5, max_in_flight=2, max_workers=1) as pool:
+        futures = [pool.command(tmp_hub.id, command) for _ in range(3)]
+        futures[0].result()
+        time.sleep(0.05)
+        stats = pool.stats()[tmp_hub.id]
+        assert (stats.queued, stats.in_flight) == (2, 0)  # waiting without a worker
+        read = pool.submit(tmp_hub.id, lambda context=None: "read")
+        assert read.result() == "read"  # queued behind the commands
+        assert started[2] - started[0] >= 0.39
+    assert pool.stats()[tmp_hub.id].completed == 4
+
+
+@pytest.mark.logic
+def test_hubpool_closed(tmp_hub):
+    pool = HubPool(commands_per_second=1)
+    first = pool.command(tmp_hub.id, lambda context=None: None)
+    queued = pool.command(tmp_hub.id, lambda context=None: None)
+    first.result()
+    pool.close(wait=False)
+    assert queued.cancelled()
+    with pytest.raises(RuntimeError):
+        pool.submit(tmp_hub.id, lambda context=None: None)
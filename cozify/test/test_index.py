@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+import pytest
+
+from cozify import cache, hub, index
+from cozify.test import debug
+from cozify.test.fixtures import mock_hub, tmp_cloud, tmp_hub
+from cozify.benchmark.mock_hub import synthetic_devices
+
+
+@pytest.mark.logic
+def test_index_eligible(tmp_hub):
+    ids, devs = tmp_hub.devices()
+    idx = index.DeviceIndex(devs)
+    state = idx.eligible(ids["lamp_osram"], hub.capability.COLOR_TEMP)
+    assert state == devs[ids["lamp_osram"]]["state"]
+    assert state is not devs[ids["lamp_osram"]]["state"]
+    assert idx.eligible(ids["twilight_nexa"])
+    assert idx.eligible(ids["twilight_nexa"], hub.capability.COLOR_TEMP) is None
+    assert idx.eligible("dead-beef") is None
+
+
+@pytest.mark.logic
+def test_index_commands_skip_fetch(mock_hub):
+    lights = hub.devices(capabilities=hub.capability.BRIGHTNESS, port=mock_hub.port)
+    mock_hub.reset()
+    for i in lights:
+        hub.device_on(i, port=mock_hub.port)
+        hub.light_brightness(i, 0.7, port=mock_hub.port)
+    assert mock_hub.count("GET", "/devices") == 1
+    assert mock_hub.count("PUT", "/devices/command") == 2 * len(lights)
+    assert all(mock_hub.devices[i]["state"]["brightness"] == 0.7 for i in lights)
+
+
+@pytest.mark.logic
+def test_index_miss_refresh(mock_hub, monkeypatch):
+    hub.device_off(next(iter(mock_hub.devices)), port=mock_hub.port)
+    mock_hub.reset()
+    with pytest.raises(ValueError):
+        hub.device_on("dead-beef", port=mock_hub.port)
+    assert mock_hub.count("GET", "/devices") == 0  # index too young to rebuild
+    monkeypatch.setattr(index, "miss_interval", 0.0)
+    with pytest.raises(ValueError):
+        hub.device_on("dead-beef", port=mock_hub.port)
+    assert mock_hub.count("GET", "/devices") == 1
+    with pytest.raises(AttributeError):
+        hub.device_state_replace("dead-beef", {}, port=mock_hub.port)
+
+
+@pytest.mark.logic
+def test_index_ttl(mock_hub, monkeypatch):
+    device_id = next(iter(mock_hub.devices))
+    hub.device_on(device_id, port=mock_hub.port)
+    assert index.lookup(mock_hub.hub_id) is None  # keyed by tmp_hub id, not mock's
+    hub_id = hub.default()
+    assert index.lookup(hub_id)
+    monkeypatch.setattr(index, "ttl", 0.0)
+    assert index.lookup(hub_id) is None
+    mock_hub.reset()
+    hub.device_on(device_id, port=mock_hub.port)
+    assert mock_hub.count("GET", "/devices") == 1
+    index.invalidate(hub_id)
+    assert not index._indexes
+
+
+@pytest.mark.logic
+def test_capability_index_filters(tmp_hub):
+    devs = synthetic_devices(21)
+    devs[next(iter(devs))]["capabilities"]["values"].append("FLUX_CAPACITOR")
+    idx = index.CapabilityIndex(devs)
+    filters = [
+        (hub.capability.BRIGHTNESS, False),
+        (hub.capability.SMOKE, False),
+        ([hub.capability.TEMPERATURE, hub.capability.HUMIDITY], True),
+        ([hub.capability.TEMPERATURE, hub.capability.HUMIDITY], False),
+        ([hub.capability.ON_OFF, hub.capability.SMOKE], True),
+    ]
+    for capabilities, and_filter in filters:
+        scanned = hub._filter_devices(devs, capabilities, and_filter)
+        indexed = hub._filter_devices(devs, capabilities, and_filter, idx)
+        assert list(indexed) == list(scanned)
+    assert idx.overflow == {next(iter(devs)): {"FLUX_CAPACITOR"}}
+    assert idx.devices["FLUX_CAPACITOR"] == [next(iter(devs))]
+
+
+@pytest.mark.logic
+def test_capability_index_cached(mock_hub):
+    cache.enable(max_age=60)
+    lights = hub.devices(capabilities=hub.capability.BRIGHTNESS, port=mock_hub.port)
+    devs = cache.get(hub.default())
+    idx = cache.capability_index(hub.default(), devs)
+    assert idx is not None
+    assert list(idx.devices["BRIGHTNESS"]) == list(lights)
+    assert cache.capability_index(hub.default(), dict(devs)) is None  # not the snapshot
+
+    hub.device_off(next(iter(lights)), port=mock_hub.port)  # written through
+    assert cache.capability_index(hub.default(), cache.get(hub.default())) is idx
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+import asyncio
+
+import pytest
+
+from cozify import aio, cloud_api, hub_api, metrics, session
+from cozify.Error import APIError, ConnectionError
+from cozify.test import debug
+from cozify.benchmark.mock_hub import MockHub
+
+
+@pytest.fixture
+def collecting():
+    metrics.reset()
+    metrics.enable()
+    yield metrics
+    metrics.disable()
+    metrics.reset()
+
+
+def _counter(snapshot, name, **labels):
+    return sum(
+        c.value
+        for c in snapshot["counters"]
+        if c.name == name and labels.items() <= c.labels.items()
+    )
+
+
+def _histogram(snapshot, name, **labels):
+    return [
+        h
+        for h in snapshot["histograms"]
+        if h.name == name and labels.items() <= h.labels.items()
+    ]
+
+
+@pytest.mark.logic
+def test_metrics_disabled():
+    metrics.reset()
+    with MockHub() as mock:
+        hub_api.devices(**mock.kwargs())
+    assert metrics.snapshot() == {"counters": [], "histograms": []}
+
+
+@pytest.mark.logic
+def test_metrics_hub_calls(collecting):
+    with MockHub(hub_token="secret") as mock:
+        kwargs = dict(mock.kwargs(), hub_token="secret")
+        devs = hub_api.devices(**kwargs)
+        hub_api.devices_command_on(next(iter(devs)), **kwargs)
+        with pytest.raises(APIError):
+            hub_api.tz(**dict(kwargs, hub_token="wrong"))
+    session.close()  # drop the keep-alive connection to the stopped hub
+    with pytest.raises(ConnectionError):
+        hub_api.tz(**kwargs)
+
+    snap = metrics.snapshot()
+    local = {"api": "hub", "hub_id": mock.hub_id, "path": "local"}
+    assert (
+        _counter(snap, "calls_total", endpoint="/devices", status="200", **local) == 1
+    )
+    assert (
+        _counter(
+            snap, "calls_total", endpoint="/devices/command", method="PUT", **local
+        )
+        == 1
+    )
+    assert _counter(snap, "calls_total", endpoint="/hub/tz", status="401") == 1
+    assert _counter(snap, "calls_total", endpoint="/hub/tz", status="error") == 1
+    assert _counter(snap, "bytes_received_total", endpoint="/devices") > 100
+    assert _counter(snap, "bytes_sent_total", endpoint="/devices/command") > 0
+
+    (latency,) = _histogram(snap, "call_seconds", endpoint="/devices")
+    assert latency.count == 1 and latency.sum > 0
+    assert latency.buckets[-1] == (float("inf"), 1)
+    assert _histogram(snap, "json_decode_seconds", endpoint="/devices")[0].count == 1
+    assert _histogram(snap, "json_encode_seconds", endpoint="/devices/command")
+
+
+@pytest.mark.logic
+def test_metrics_aio_and_cloud(collecting):
+    with MockHub() as mock:
+        asyncio.run(aio.tz(**mock.kwargs()))
+        info = cloud_api.get(
+            "/hub", base="http://{0}:{1}".format(mock.host, mock.port), no_headers=True
+        )
+    assert info["hubId"] == mock.hub_id
+    snap = metrics.snapshot()
+    assert _counter(snap, "calls_total", api="hub", endpoint="/hub/tz") == 1
+    assert (
+        _counter(snap, "calls_total", api="cloud", path="cloud", endpoint="/hub") == 1
+    )
+
+
+@pytest.mark.logic
+def test_metrics_endpoint():
+    assert metrics.endpoint("/cc/1.14/devices") == "/devices"
+    assert metrics.endpoint(cloud_api.cloudBase + "/user/requestlogin") == (
+        "/user/requestlogin"
+    )
+    assert metrics.endpoint(cloud_api.cloudBase + "/hub/remote/cc/1.14/hub/tz") == (
+        "/hub/remote"
+    )
+
+
+@pytest.mark.logic
+def test_metrics_quantile(collecting):
+    for value in (0.001, 0.002, 0.003, 0.004, 20.0):
+        metrics.observe("test_seconds", value, kind="test")
+    (h,) = metrics.snapshot()["histograms"]
+    assert h.labels == {"kind": "test"} and h.count == 5
+    assert 0.001 <= metrics.quantile(h, 0.5) <= 0.005
+    assert metrics.quantile(h, 0.99) == metrics.buckets[-1]
+    assert metrics.quantile(h._replace(count=0), 0.5) is None
+
+
+@pytest.mark.logic
+def test_metrics_remote_recorded_once(collecting, monkeypatch):
+    with MockHub() as mock:
+        # stand-in cloud answers the bounced call with 404, one round trip either way
+        monkeypatch.setattr(
+            cloud_api, "cloudBase", "http://{0}:{1}".format(mock.host, mock.port)
+        )
+        with pytest.raises(APIError):
+            hub_api.tz(**dict(mock.kwargs(), remote=True))
+    snap = metrics.snapshot()
+    assert _counter(snap, "calls_total") == 1
+    assert _counter(snap, "calls_total", api="hub", path="remote") == 1
+
+
+@pytest.mark.logic
+def test_metrics_size():
+    assert metrics.size(None) == 0
+    assert metrics.size('{"name": "Työhuone"}') == 21
+    assert metrics.size(b"abc") == 3
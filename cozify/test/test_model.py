@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+import concurrent.futures
+import sys
+import threading
+
+import pytest
+
+from cozify import hub, model
+from cozify.test import debug
+from cozify.test.fixtures import mock_hub, tmp_cloud, tmp_hub
+from cozify.benchmark.mock_hub import synthetic_devices
+
+
+@pytest.mark.logic
+def test_model_device():
+    raw = synthetic_devices(1)
+    dev = model.Device(next(iter(raw.values())))
+    src = next(iter(raw.values()))
+    assert dev.to_dict() == dict(
+        src,
+        capabilities={"type": "SET", "values": sorted(src["capabilities"]["values"])},
+    )
+    assert dev.state == src["state"]
+    assert dev.state["isOn"] == src["state"]["isOn"]
+    assert dev.has(hub.capability.BRIGHTNESS)
+    assert not dev.has(hub.capability.TEMPERATURE)
+    with pytest.raises(AttributeError):
+        dev.extra = 1
+
+
+@pytest.mark.logic
+def test_model_capability_overflow():
+    mask, overflow = model.capability_mask(["ON_OFF", "FLUX_CAPACITOR"])
+    assert mask == model.capability_bit(hub.capability.ON_OFF)
+    assert overflow == {"FLUX_CAPACITOR"}
+    assert model.capability_names(mask) == ["ON_OFF"]
+    assert model.capability_mask(["ON_OFF"])[1] is model.capability_mask([])[1]
+
+
+@pytest.mark.logic
+def test_model_shared_layout():
+    devs = model.Devices(synthetic_devices(14))
+    states = [d.state for d in devs.values()]
+    assert states[0]._layout is states[7]._layout  # same template
+    assert devs[next(iter(devs))].type is devs[list(devs)[7]].type
+
+
+@pytest.mark.logic
+def test_model_lazy():
+    raw = synthetic_devices(3)
+    devs = model.Devices(raw)
+    assert len(devs._raw) == 3
+    first = next(iter(devs))
+    assert devs[first] is devs[first]
+    assert len(devs._raw) == 2
+    assert len(raw) == 3  # source untouched
+    assert list(devs) == list(raw)
+
+
+@pytest.mark.logic
+def test_model_lazy_threads():
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    try:
+        for _ in range(200):
+            devs = model.Devices(synthetic_devices(20))
+            start = threading.Barrier(4)
+
+            def read(_):
+                start.wait()
+                return [devs[i].id for i in list(devs)]
+
+            with concurrent.futures.ThreadPoolExecutor(4) as pool:
+                seen = list(pool.map(read, range(4)))
+            assert all(ids == list(devs) for ids in seen)
+            assert repr(devs) == "Devices(20 devices, 20 converted)"
+    finally:
+        sys.setswitchinterval(interval)
+
+
+@pytest.mark.logic
+def test_model_devices(mock_hub):
+    devs = hub.devices(
+        model=True, capabilities=hub.capability.TWILIGHT, port=mock_hub.port
+    )
+    assert isinstance(devs, model.Devices)
+    assert [d.type for d in devs.values()] == ["TWILIGHT"]
@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+import time
+
+import pytest
+import requests
+
+from cozify import cloud_api, hub_api, routing
+from cozify.Error import APIError
+from cozify.test import debug
+from cozify.benchmark.mock_hub import MockHub
+
+
+@pytest.fixture
+def routed():
+    routing.enable(reprobe=0.0)
+    yield routing
+    routing.disable()
+    routing.reprobe_interval = 30.0
+
+
+@pytest.fixture
+def two_paths(routed, monkeypatch):
+    """A hub reachable both locally and through a stand-in for the cloud remote path."""
+    with MockHub() as local, MockHub() as cloud:
+
+        def remote(apicall, headers, data=None, timeout=5):
+            response = requests.request(
+                "PUT" if data else "GET",
+                "http://{0}:{1}{2}".format(cloud.host, cloud.port, apicall),
+                headers={"Authorization": headers["X-Hub-Key"]},
+                data=data,
+                timeout=timeout,
+            )
+            if response.status_code != 200:  # like cloud_api, only 200 is returned
+                raise APIError(response.status_code, response.text)
+            return response
+
+        monkeypatch.setattr(cloud_api, "remote", remote)
+        yield local, cloud
+
+
+@pytest.mark.logic
+def test_routing_choose(routed):
+    hub_id = "deadbeef"
+    assert routing.choose(hub_id) == "local"
+    assert routing.choose(hub_id, preferred="remote") == "remote"
+    routing.record(hub_id, "local", 0.2)
+    assert routing.choose(hub_id, preferred="remote") == "remote"  # not measured
+    routing.record(hub_id, "remote", 0.1)
+    assert routing.choose(hub_id) == "remote"
+    routing.record(hub_id, "remote")
+    routing.record(hub_id, "remote")
+    stats = routing.stats(hub_id)
+    assert not stats["remote"].healthy
+    assert (stats["remote"].calls, stats["remote"].errors) == (3, 2)
+    assert routing.choose(hub_id, preferred="remote") == "local"
+    routing.record(hub_id, "remote", 0.1)  # recovery clears the errors
+    stats = routing.stats(hub_id)
+    assert stats["remote"].healthy and stats["remote"].errors == 0
+    assert routing.choose(hub_id) == "remote"
+    assert routing.stats("unknown")["local"].rtt is None
+
+
+@pytest.mark.logic
+def test_routing_prefers_faster_path(two_paths):
+    local, cloud = two_paths
+    local.latency = 0.05
+    kwargs = local.kwargs()
+    for _ in range(5):
+        assert hub_api.tz(**kwargs) == "Europe/Helsinki"
+    deadline = time.monotonic() + 5
+    while routing.choose(local.hub_id) != "remote":
+        assert time.monotonic() < deadline
+        time.sleep(0.05)
+    cloud.reset()
+    hub_api.tz(**kwargs)
+    assert cloud.count("GET", "/hub/tz") >= 1
+
+    # local gets faster, remote slower: background probes bring calls back home
+    local.latency, cloud.latency = 0.0, 0.05
+    deadline = time.monotonic() + 5
+    while routing.choose(local.hub_id) != "local":
+        assert time.monotonic() < deadline
+        hub_api.tz(**kwargs)
+    assert routing.stats(local.hub_id)["local"].healthy
+
+
+@pytest.mark.logic
+def test_routing_read_failover(two_paths):
+    local, cloud = two_paths
+    kwargs = local.kwargs()
+    local.stop()
+    assert len(hub_api.devices(route=True, **kwargs)) == 5
+    assert routing.stats(local.hub_id)["local"].errors >= 1
+    assert cloud.count("GET", "/devices") == 1
+    # route=False sticks to the configured path
+    with pytest.raises(hub_api.ConnectionError):
+        hub_api.devices(route=False, **kwargs)
+
+
+@pytest.fixture
+def cloud_unavailable(monkeypatch):
+    """Make the remote path answer every call with a 503."""
+    calls = []
+
+    def remote(apicall, headers, data=None, timeout=5):
+        calls.append(apicall)
+        raise APIError(503, "Service Unavailable")
+
+    monkeypatch.setattr(cloud_api, "remote", remote)
+    return calls
+
+
+@pytest.mark.logic
+def test_routing_remote_server_errors(two_paths, cloud_unavailable, monkeypatch):
+    local, cloud = two_paths
+    monkeypatch.setattr(routing, "reprobe_interval", 60.0)
+    kwargs = dict(local.kwargs(), remote=True)
+    assert hub_api.tz(**kwargs) == "Europe/Helsinki"  # reads are retried locally
+    stats = routing.stats(local.hub_id)["remote"]
+    assert (stats.calls, stats.errors, stats.healthy) == (1, 1, False)
+
+    routing.reset(local.hub_id)
+    lamp = next(iter(local.devices))
+    local.reset()
+    with pytest.raises(APIError):
+        hub_api.devices_command_on(lamp, **kwargs)  # commands are not repeated
+    assert local.count("PUT", "/devices/command") == 0
+    hub_api.devices_command_on(lamp, **kwargs)  # remote is benched now
+    assert local.count("PUT", "/devices/command") == 1
+    assert len(cloud_unavailable) == 2
+
+
+@pytest.mark.logic
+def test_routing_disabled_by_default():
+    assert not routing.enabled
+    with MockHub() as local:
+        hub_api.tz(**local.kwargs())
+    assert routing.stats(local.hub_id)["local"].calls == 0
+
+
+@pytest.fixture
+def hedged(two_paths, monkeypatch):
+    routing.enable(reprobe=60.0, hedge=True)
+    monkeypatch.setattr(routing, "hedge_default_delay", 0.05)
+    yield two_paths
+
+
+@pytest.mark.logic
+def test_routing_hedge_wins(hedged):
+    local, cloud = hedged
+    local.latency = 0.5
+    start = time.monotonic()
+    assert len(hub_api.devices(**local.kwargs())) == 5
+    assert time.monotonic() - start < 0.4
+    stats = routing.hedge_stats(local.hub_id)
+    assert (stats.calls, stats.hedged, stats.wins) == (1, 1, 1)
+    assert stats.hedge_rate == stats.win_rate == 1.0
+    assert cloud.count("GET", "/devices") == 1
+
+
+@pytest.mark.logic
+def test_routing_hedge_not_needed(hedged, monkeypatch):
+    local, cloud = hedged
+    monkeypatch.setattr(routing, "hedge_default_delay", 1.0)
+    kwargs = local.kwargs()
+    hub_api.scenes(**kwargs)
+    hub_api.devices(hedge=False, **kwargs)
+    stats = routing.hedge_stats(local.hub_id)
+    assert (stats.calls, stats.hedged, stats.wins) == (1, 0, 0)
+    assert stats.hedge_rate == 0.0
+    assert cloud.count("GET", "/scenes") == 0
+    assert routing.hedge_delay(local.hub_id, "local") == routing.hedge_min_delay
+
+
+@pytest.mark.logic
+def test_routing_hedge_fast_failure(hedged):
+    local, cloud = hedged
+    local.stop()
+    assert hub_api.tz(**local.kwargs()) == "Europe/Helsinki"
+    stats = routing.hedge_stats(local.hub_id)
+    assert (stats.hedged, stats.wins) == (1, 1)
+
+
+@pytest.mark.logic
+def test_routing_hedge_remote_server_error(hedged, cloud_unavailable):
+    local, cloud = hedged
+    assert hub_api.tz(**dict(local.kwargs(), remote=True)) == "Europe/Helsinki"
+    stats = routing.hedge_stats(local.hub_id)
+    assert (stats.hedged, stats.wins) == (1, 1)
+    assert routing.stats(local.hub_id)["remote"].errors == 1
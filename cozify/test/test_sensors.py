@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+import copy
+
+import pytest
+
+from cozify import hub, multisensor, sensors
+from cozify.test import debug
+from cozify.benchmark.mock_hub import multisensor as sensor_template
+from cozify.benchmark.mock_hub import synthetic_devices
+
+
+@pytest.mark.logic
+def test_sensors_extract():
+    devs = synthetic_devices(14)
+    columns = sensors.extract(devs)
+    assert list(columns)[:4] == ["id", "name", "type", "time"]
+    assert set(sensors.fields.values()) <= set(columns)
+    # 2 multisensors & 2 power plugs
+    assert len(columns["id"]) == 4
+    assert columns["humidity"].count(sensor_template["state"]["humidity"]) == 2
+    assert columns["activePower"].count(None) == 2
+
+
+@pytest.mark.logic
+def test_sensors_extract_selected():
+    devs = synthetic_devices(14)
+    columns = sensors.extract(devs, hub.capability.ACTIVE_POWER)
+    assert list(columns) == ["id", "name", "type", "time", "activePower"]
+    assert len(columns["id"]) == 2
+    rows = sensors.rows(columns)
+    assert rows[0]["activePower"] == devs[rows[0]["id"]]["state"]["activePower"]
+    with pytest.raises(ValueError):
+        sensors.extract(devs, [hub.capability.ON_OFF])
+
+
+@pytest.mark.logic
+def test_multisensor_compat():
+    devs = synthetic_devices(7)
+    # other devices measuring temperature are not multisensors
+    thermostat = copy.deepcopy(sensor_template)
+    thermostat["id"] = "thermostat"
+    thermostat["state"]["type"] = "STATE_THERMOSTAT"
+    devs["thermostat"] = thermostat
+    data = multisensor.getMultisensorData(devs)
+    assert data == [
+        {
+            "name": d["name"],
+            "time": d["state"]["lastSeen"],
+            "temperature": d["state"]["temperature"],
+            "humidity": d["state"]["humidity"],
+        }
+        for d in devs.values()
+        if d["state"]["type"] == "STATE_MULTI_SENSOR"
+    ]
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+import time
+
+import pytest
+
+from cozify import session
+from cozify.test import debug
+
+
+@pytest.fixture
+def clean_sessions():
+    session.close()
+    yield session
+    session.configure(maxsize=10, idle=60.0)
+
+
+@pytest.mark.logic
+def test_session_reuse(clean_sessions):
+    s = session.get("http://127.0.0.1:8893/cc/1.14/devices")
+    assert s is session.get("http://127.0.0.1:8893/cc/1.14/scenes")
+    assert s is not session.get("http://127.0.0.2:8893/cc/1.14/devices")
+    assert s is not session.get("https://127.0.0.1:8893")
+    assert len(session.active()) == 3
+
+
+@pytest.mark.logic
+def test_session_close(clean_sessions):
+    s = session.get("http://127.0.0.1:8893")
+    session.get("https://cloud2.cozify.fi/ui/0.2")
+    session.close("http://127.0.0.1:8893/anything")
+    assert session.active() == ["https://cloud2.cozify.fi"]
+    assert s is not session.get("http://127.0.0.1:8893")
+    session.close()
+    assert not session.active()
+
+
+@pytest.mark.logic
+def test_session_evict(clean_sessions):
+    session.get("http://127.0.0.1:8893")
+    assert session.evict() == 0
+    time.sleep(0.01)
+    assert session.evict(max_idle=0.0) == 1
+    assert not session.active()
+
+
+@pytest.mark.logic
+def test_session_configure(clean_sessions):
+    session.get("http://127.0.0.1:8893")
+    session.configure(maxsize=2, idle=5.0)
+    assert not session.active()
+    adapter = session.get("http://127.0.0.1:8893").get_adapter("http://127.0.0.1")
+    assert adapter._pool_maxsize == 2
+    with pytest.raises(ValueError):
+        session.configure(maxsize=0)
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+import pytest
+
+from cozify import hub
+from cozify.test import debug
+from cozify.benchmark.mock_hub import multisensor, synthetic_devices
+
+np = pytest.importorskip("numpy")
+from cozify.table import DeviceTable  # noqa: E402
+
+
+@pytest.mark.logic
+def test_table_columns():
+    devs = synthetic_devices(14)
+    table = DeviceTable(devs)
+    assert len(table) == 14
+    assert list(table.column("id")) == list(devs)
+    brightness = table.column("brightness")
+    expected = [d["state"].get("brightness") for d in devs.values()]
+    assert brightness.count() == sum(v is not None for v in expected)
+    assert brightness.compressed().tolist() == [v for v in expected if v is not None]
+    with pytest.raises(ValueError):
+        table.column("brightness?")
+
+
+@pytest.mark.logic
+def test_table_filter_aggregate():
+    devs = synthetic_devices(14)
+    table = DeviceTable(devs)
+    sensors = table.with_capability(
+        [hub.capability.TEMPERATURE, hub.capability.HUMIDITY], and_filter=True
+    )
+    assert len(sensors) == 2
+    assert sensors.aggregate("humidity") == multisensor["state"]["humidity"]
+    assert sensors.aggregate("humidity", how="count") == 2
+    rooms = table.aggregate("brightness", how="max", by="room")
+    assert set(rooms) == {
+        d["room"][0] for d in devs.values() if "brightness" in d["state"]
+    }
+    assert table.select(table.present("lux")).aggregate("lux") is None
+    with pytest.raises(ValueError):
+        table.aggregate("humidity", how="median")
+
+
+@pytest.mark.logic
+def test_table_append():
+    devs = synthetic_devices(7)
+    table = DeviceTable(devs, time=1.0)
+    for dev in devs.values():
+        if "humidity" in dev["state"]:
+            dev["state"]["humidity"] += 10
+    table.append(devs, time=2.0)
+    assert len(table) == 14
+    assert table.snapshots == 2
+    assert table.latest().column("time").tolist() == [2.0] * 7
+    by_snapshot = table.aggregate("humidity", by="snapshot")
+    assert by_snapshot[1] - by_snapshot[0] == pytest.approx(10)
+    assert len(DeviceTable()) == 0
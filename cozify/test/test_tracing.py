@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+import asyncio
+import json
+
+import pytest
+
+import cozify
+from cozify import aio, hub, tracing
+from cozify.test import debug
+from cozify.test.fixtures import mock_hub, tmp_cloud, tmp_hub
+
+
+def _lamp(mock_hub):
+    return next(
+        i
+        for i, d in mock_hub.devices.items()
+        if "BRIGHTNESS" in d["capabilities"]["values"]
+    )
+
+
+@pytest.mark.logic
+def test_trace_light_brightness(mock_hub):
+    lamp = _lamp(mock_hub)
+    with cozify.trace() as t:
+        hub.light_brightness(lamp, 0.5, port=mock_hub.port)
+    assert not tracing.active()
+
+    (op,) = t.children
+    assert op.name == "hub.light_brightness" and op.category == "hub"
+    names = [s.name for s in t.spans()]
+    assert names.index("hub._fill_kwargs") < names.index("GET /devices")
+    assert names.index("GET /devices") < names.index("PUT /devices/command")
+    assert "hub._clean_state" in names
+    assert t.count("http") == 2
+    assert t.count("config") >= 3
+    get, put = t.spans("http")
+    assert get.attrs["status"] == 200 and get.attrs["received"] > 100
+    assert put.attrs["sent"] > 0 and put.attrs["path"] == "local"
+    assert [s.name for s in t.spans("json")] == [
+        "json decode",
+        "json encode",
+        "json decode",
+    ]
+    tree = t.tree().splitlines()
+    assert tree[0].startswith("trace [trace]")
+    assert tree[1].startswith("  hub.light_brightness [hub]")
+
+
+@pytest.mark.logic
+def test_trace_cache_and_errors(mock_hub):
+    with cozify.trace() as t:
+        hub.devices(port=mock_hub.port, max_age=60)
+        hub.devices(port=mock_hub.port, max_age=60)
+        with pytest.raises(KeyError):
+            hub.device("no-such-device", port=mock_hub.port, max_age=60)
+    assert [s.name for s in t.spans("cache")] == [
+        "cache miss",
+        "cache hit",
+        "cache hit",
+    ]
+    assert t.count("http") == 1
+    assert t.children[-1].attrs["error"] == "KeyError"
+
+
+@pytest.mark.logic
+def test_trace_chrome(mock_hub, tmp_path):
+    with cozify.trace("tz") as t:
+        hub.tz(port=mock_hub.port)
+    path = tmp_path / "trace.json"
+    document = t.chrome(str(path))
+    assert json.loads(path.read_text()) == document
+    events = document["traceEvents"]
+    assert events[0]["name"] == "tz" and events[0]["ts"] == 0
+    http = [e for e in events if e["cat"] == "http"]
+    assert http[0]["ph"] == "X" and http[0]["dur"] > 0
+    assert all(e["ph"] == "i" for e in events if e["cat"] == "config")
+
+
+@pytest.mark.logic
+def test_trace_aio(mock_hub):
+    async def main():
+        with cozify.trace() as t:
+            await asyncio.gather(aio.tz(port=mock_hub.port), aio.tz(port=mock_hub.port))
+        await aio.close()
+        return t
+
+    t = asyncio.run(main())
+    assert t.count("http") == 2
+
+
+@pytest.mark.logic
+def test_trace_inactive():
+    assert tracing.span("anything", "hub") is tracing._null
+    tracing.event("anything", "hub")
+    with tracing.span("anything", "hub") as s:
+        s.set(status=200)
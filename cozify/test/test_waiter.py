@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+import asyncio
+import threading
+
+import pytest
+
+from cozify import aio, hub, hub_api, waiter
+from cozify.test import debug
+from cozify.test.fixtures import mock_hub, tmp_cloud, tmp_hub
+
+
+def _lamps(mock_hub):
+    return [
+        i
+        for i, d in mock_hub.devices.items()
+        if "ON_OFF" in d["capabilities"]["values"]
+    ]
+
+
+@pytest.mark.logic
+def test_waiter_backoff(monkeypatch):
+    monkeypatch.setattr(waiter, "initial_interval", 0.1)
+    monkeypatch.setattr(waiter, "max_interval", 0.2)
+    w = waiter.Waiter({}, timeout=60)
+    assert [w.next_interval() for _ in range(3)] == [0.1, pytest.approx(0.15), 0.2]
+    assert waiter.Waiter({}, timeout=0).next_interval() is None
+
+
+@pytest.mark.logic
+def test_waiter_matches():
+    dev = {"state": {"isOn": True, "brightness": 0.5}}
+    assert waiter.matches(dev, {"isOn": True})
+    assert not waiter.matches(dev, {"isOn": False})
+    assert not waiter.matches(dev, {"temperature": 20})
+    assert not waiter.matches(None, {"isOn": True})
+
+
+@pytest.mark.logic
+def test_await_states(mock_hub):
+    lamps = _lamps(mock_hub)
+    expected = {i: {"isOn": True} for i in lamps}
+    commands = [{"id": i, "type": "CMD_DEVICE_ON"} for i in lamps]
+    timer = threading.Timer(0.3, hub_api.devices_command, [commands], mock_hub.kwargs())
+    timer.start()
+    outcomes = hub.await_states(expected, timeout=5, port=mock_hub.port)
+    timer.join()
+    assert outcomes == dict.fromkeys(lamps, True)
+    # one shared poll per round instead of one per device per round
+    assert mock_hub.count("GET", "/devices") < 15
+
+
+@pytest.mark.logic
+def test_await_states_timeout(mock_hub):
+    lamps = _lamps(mock_hub)
+    hub_api.devices_command(
+        [{"id": lamps[0], "type": "CMD_DEVICE_OFF"}], **mock_hub.kwargs()
+    )
+    expected = [(lamps[0], {"isOn": False}), (lamps[1], {"isOn": "never"})]
+    outcomes = hub.await_states(expected, timeout=0.3, port=mock_hub.port)
+    assert outcomes == {lamps[0]: True, lamps[1]: False}
+    assert not hub.await_state(
+        lamps[1], {"isOn": "never"}, timeout=0.1, port=mock_hub.port
+    )
+
+
+@pytest.mark.logic
+def test_aio_await_states(mock_hub):
+    lamps = _lamps(mock_hub)
+
+    async def scenario():
+        wait = asyncio.create_task(
+            aio.await_states(
+                {i: {"isOn": False} for i in lamps}, timeout=5, port=mock_hub.port
+            )
+        )
+        await asyncio.sleep(0.2)
+        await asyncio.gather(
+            *[aio.devices_command_off(i, **mock_hub.kwargs()) for i in lamps]
+        )
+        outcomes = await wait
+        await aio.close()
+        return outcomes
+
+    assert asyncio.run(scenario()) == dict.fromkeys(lamps, True)
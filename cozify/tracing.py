@@ -0,0 +1,309 @@
+"""Module for tracing what high-level operations do under the hood.
+
+Everything the library does inside a trace block is recorded as a tree of timed spans: hub operations, kwargs resolution,
+state lookups, HTTP calls with their payload sizes and status, JSON processing and device snapshot cache hits and misses::
+
+    import cozify
+    from cozify import hub
+
+    with cozify.trace() as t:
+        hub.light_brightness(device_id, 0.5)
+    t.print()  # indented tree with timings
+    print(t.count("http"), "round trips")
+    t.chrome("trace.json")  # open in chrome://tracing or https://ui.perfetto.dev
+
+Tracing follows the context it was started in, including asyncio tasks started within it, but not calls made from other threads.
+Outside a trace block instrumentation costs a single context variable lookup.
+
+Attributes:
+    categories(tuple): Span categories recorded by the library.
+"""
+
+import contextvars
+import functools
+import json
+import os
+import threading
+import time
+
+categories = ("hub", "config", "cache", "http", "json")
+
+_current = contextvars.ContextVar("cozify_trace", default=None)  # innermost open span
+
+
+class Span:
+    """A timed step within a trace.
+
+    Attributes:
+        name(str): What was done, e.g. 'GET /devices'.
+        category(str): Kind of step, see categories.
+        start(float): time.perf_counter() when the step started.
+        end(float): time.perf_counter() when the step ended, None while open. Equals start for instant events.
+        attrs(dict): Details of the step, e.g. bytes sent or status.
+        children(list): Spans started within this one.
+    """
+
+    __slots__ = ("name", "category", "start", "end", "attrs", "children", "thread")
+
+    def __init__(self, name, category, attrs):
+        self.name = name
+        self.category = category
+        self.attrs = attrs
+        self.children = []
+        self.thread = threading.get_ident()
+        self.start = time.perf_counter()
+        self.end = None
+
+    @property
+    def duration(self):
+        """float: Seconds the step took, up to now for an open span."""
+        return (time.perf_counter() if self.end is None else self.end) - self.start
+
+    def set(self, **attrs):
+        """Add details to the span, e.g. once a response has arrived."""
+        self.attrs.update(attrs)
+
+    def walk(self, depth=0):
+        """Iterate over this span and all spans within it, depth first.
+
+        Yields:
+            tuple: (depth, Span)
+        """
+        yield depth, self
+        for child in self.children:
+            yield from child.walk(depth + 1)
+
+
+class _Open:
+    """Context manager of a span in an active trace."""
+
+    __slots__ = ("span", "token")
+
+    def __init__(self, parent, name, category, attrs):
+        self.span = Span(name, category, attrs)
+        parent.children.append(self.span)
+        self.token = None
+
+    def __enter__(self):
+        self.token = _current.set(self.span)
+        return self.span
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.span.end = time.perf_counter()
+        if exc_type is not None:
+            self.span.attrs["error"] = exc_type.__name__
+        _current.reset(self.token)
+
+
+class _Null:
+    """Stand-in for spans outside of a trace, does nothing."""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        pass
+
+    def set(self, **attrs):
+        pass
+
+
+_null = _Null()
+
+
+class Trace(Span):
+    """Root of a trace, use as a context manager. See trace()."""
+
+    __slots__ = ("token",)
+
+    def __init__(self, name="trace"):
+        super().__init__(name, "trace", {})
+        self.token = None
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        self.token = _current.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.end = time.perf_counter()
+        _current.reset(self.token)
+
+    def spans(self, category=None):
+        """List recorded spans in the order they were started.
+
+        Args:
+            category(str): Only list spans of this category. Defaults to None which lists all.
+
+        Returns:
+            list: Span objects.
+        """
+        return [
+            s
+            for _, s in self.walk()
+            if s is not self and (category is None or s.category == category)
+        ]
+
+    def count(self, category=None):
+        """Count recorded spans, e.g. count('http') for the number of round trips.
+
+        Args:
+            category(str): Only count spans of this category. Defaults to None which counts all.
+
+        Returns:
+            int: Number of spans.
+        """
+        return len(self.spans(category))
+
+    def tree(self):
+        """Render the trace as an indented tree, one span per line with its duration and details.
+
+        Returns:
+            str: Rendered tree.
+        """
+        lines = []
+        for depth, s in self.walk():
+            attrs = " ".join("{0}={1}".format(k, v) for k, v in s.attrs.items())
+            lines.append(
+                "{0}{1} [{2}] {3:.3f} ms {4}".format(
+                    "  " * depth, s.name, s.category, s.duration * 1000, attrs
+                ).rstrip()
+            )
+        return "\n".join(lines)
+
+    def print(self):
+        """Print the tree of the trace to stdout."""
+        print(self.tree())
+
+    def chrome(self, path=None):
+        """Export the trace in the Chrome trace event format, viewable in chrome://tracing or Perfetto.
+
+        Args:
+            path(str): File to write the JSON to. Defaults to None which only returns it.
+
+        Returns:
+            dict: Trace event document.
+        """
+        pid = os.getpid()
+        events = []
+        for _, s in self.walk():
+            event = {
+                "name": s.name,
+                "cat": s.category,
+                "ts": (s.start - self.start) * 1e6,
+                "pid": pid,
+                "tid": s.thread,
+                "args": {k: _jsonable(v) for k, v in s.attrs.items()},
+            }
+            if s.end == s.start and s is not self:
+                event.update(ph="i", s="t")
+            else:
+                event.update(ph="X", dur=s.duration * 1e6)
+            events.append(event)
+        document = {"traceEvents": events, "displayTimeUnit": "ms"}
+        if path is not None:
+            with open(path, "w") as f:
+                json.dump(document, f)
+        return document
+
+
+def trace(name="trace"):
+    """Start tracing everything done within a with block.
+
+    Args:
+        name(str): Name of the root span. Defaults to 'trace'.
+
+    Returns:
+        Trace: Context manager that records the trace, inspect it after the block.
+    """
+    return Trace(name)
+
+
+def active():
+    """Check if a trace is being recorded in the current context.
+
+    Returns:
+        bool: True within a trace block.
+    """
+    return _current.get() is not None
+
+
+def span(name, category, **attrs):
+    """Record a timed step if a trace is active. Use as a context manager, it gives a span with set() to add details to.
+
+    Args:
+        name(str): What is being done.
+        category(str): Kind of step, see categories.
+        **attrs: Details of the step.
+
+    Returns:
+        Context manager of the span, or one that does nothing outside of a trace.
+    """
+    parent = _current.get()
+    if parent is None:
+        return _null
+    return _Open(parent, name, category, attrs)
+
+
+def event(name, category, **attrs):
+    """Record an instant event if a trace is active, e.g. a cache hit.
+
+    Args:
+        name(str): What happened.
+        category(str): Kind of event, see categories.
+        **attrs: Details of the event.
+    """
+    parent = _current.get()
+    if parent is None:
+        return
+    s = Span(name, category, attrs)
+    s.end = s.start
+    parent.children.append(s)
+
+
+def record(name, category, start, **attrs):
+    """Record a step that has just ended if a trace is active. Useful where wrapping the step in span() is awkward.
+
+    Args:
+        name(str): What was done.
+        category(str): Kind of step, see categories.
+        start(float): time.perf_counter() when the step started.
+        **attrs: Details of the step.
+    """
+    parent = _current.get()
+    if parent is None:
+        return
+    s = Span(name, category, attrs)
+    s.start, s.end = start, time.perf_counter()
+    parent.children.append(s)
+
+
+def traced(category):
+    """Decorator recording every call of a function as a span named after its module and name, e.g. 'hub.devices'.
+
+    Args:
+        category(str): Kind of step the function is, see categories.
+    """
+
+    def decorator(func):
+        name = "{0}.{1}".format(func.__module__.rsplit(".", 1)[-1], func.__name__)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            parent = _current.get()
+            if parent is None:
+                return func(*args, **kwargs)
+            with _Open(parent, name, category, {}):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def _jsonable(value):
+    if isinstance(value, (str, int, float, bool)) or value is None:
+        return value
+    return str(value)
@@ -0,0 +1,98 @@
+"""Module for waiting on the state of many devices with one shared polling loop.
+
+Waiting on N devices polls the devices once per round instead of once per device. Rounds start fast and back off
+towards max_interval, so quick state changes resolve quickly while slow ones don't hammer the hub.
+See cozify.hub.await_states() and cozify.aio.await_states() for the entry points.
+
+Attributes:
+    initial_interval(float): Seconds to wait after the first poll. Defaults to 0.05.
+    max_interval(float): Longest wait in seconds between polls. Defaults to 1.
+    backoff(float): Factor the wait grows by after each poll. Defaults to 1.5.
+"""
+
+import time
+
+from absl import logging
+
+initial_interval = 0.05
+max_interval = 1.0
+backoff = 1.5
+
+_missing = object()
+
+
+class Waiter:
+    """Expected states of devices that are resolved as snapshots satisfying them are checked.
+
+    Args:
+        expected(dict): device_id -> state dict to expect, or an iterable of (device_id, state) pairs. Only the keys given are compared.
+        timeout(float): Seconds until devices still not in their expected state are given up on.
+
+    Attributes:
+        pending(dict): device_id -> expected state for devices not yet in their expected state.
+        deadline(float): time.monotonic() after which waiting is given up.
+    """
+
+    def __init__(self, expected, timeout):
+        self.pending = dict(expected)
+        self.deadline = time.monotonic() + timeout
+        self._met = {}
+        self._interval = initial_interval
+
+    def check(self, devs):
+        """Resolve every pending device that is in its expected state in a snapshot.
+
+        Args:
+            devs(dict): Devices dict as returned by the API.
+
+        Returns:
+            bool: True if nothing is pending anymore.
+        """
+        for device_id, state in list(self.pending.items()):
+            if matches(devs.get(device_id), state):
+                logging.debug("Device {0} reached expected state.".format(device_id))
+                self._met[device_id] = True
+                del self.pending[device_id]
+        return not self.pending
+
+    def next_interval(self):
+        """Time to wait before the next poll. Never extends past the deadline.
+
+        Returns:
+            float: Seconds to wait or None if the deadline has passed.
+        """
+        remaining = self.deadline - time.monotonic()
+        if remaining <= 0:
+            return None
+        interval = min(self._interval, remaining)
+        self._interval = min(self._interval * backoff, max_interval)
+        return interval
+
+    def outcomes(self):
+        """Per device outcome of the wait.
+
+        Returns:
+            dict: device_id -> True if the expected state was reached, False if not (yet).
+        """
+        outcomes = dict.fromkeys(self.pending, False)
+        outcomes.update(self._met)
+        return outcomes
+
+
+def matches(dev, state):
+    """Check if a device matches the provided state keys. Keys not provided are ignored.
+
+    Args:
+        dev(dict): Device data as returned by the API, or None if the device is missing.
+        state(dict): State dictionary to expect.
+
+    Returns:
+        bool: True if dev exists and all given state values match.
+    """
+    if dev is None:
+        return False
+    current_state = dev["state"]
+    for key, value in state.items():
+        if current_state.get(key, _missing) != value:
+            return False
+    return True
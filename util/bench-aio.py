@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""Compare cozify.aio against wrapping cozify.hub in run_in_executor threads.
+
+Runs against a local stand-in hub with artificial latency, no real hub needed.
+Usage: bench-aio.py [concurrency] [latency seconds] [device count]
+"""
+
+import asyncio
+import functools
+import sys
+import threading
+import time
+
+from cozify import aio, hub
+from cozify.benchmark.mock_hub import MockHub
+
+
+async def threaded(n, kwargs):
+    loop = asyncio.get_running_loop()
+    call = functools.partial(hub.devices, **kwargs)
+    await asyncio.gather(*[loop.run_in_executor(None, call) for _ in range(n)])
+
+
+async def native(n, kwargs):
+    await asyncio.gather(*[aio.devices(**kwargs) for _ in range(n)])
+    await aio.close()
+
+
+def measure(name, coro, n):
+    threads_before = threading.active_count()
+    start = time.perf_counter()
+    asyncio.run(coro)
+    elapsed = time.perf_counter() - start
+    print(
+        "{0:>8}: {1} calls in {2:.3f}s, {3:.0f} calls/s, {4} extra threads".format(
+            name, n, elapsed, n / elapsed, threading.active_count() - threads_before
+        )
+    )
+
+
+def main(n=200, latency=0.05, device_count=20):
+    with MockHub(device_count=device_count, latency=latency) as mock:
+        kwargs = mock.kwargs()
+        measure("threaded", threaded(n, kwargs), n)
+        measure("aio", native(n, kwargs), n)
+
+
+if __name__ == "__main__":
+    main(*[float(a) if "." in a else int(a) for a in sys.argv[1:]])
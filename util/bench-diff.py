@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""Compare cozify.diff against recursively comparing every device of two snapshots.
+
+Snapshots are synthetic, a given share of their devices changes between rounds like sensors reporting in.
+Usage: bench-diff.py [changed share, e.g. 0.01]
+"""
+
+import copy
+import sys
+import time
+
+from cozify import diff
+from cozify.benchmark.mock_hub import synthetic_devices
+
+SIZES = [1000, 2000, 5000, 10000]
+ROUNDS = 5
+
+
+def naive(old, new):
+    """Compare everything key by key, the approach without fingerprints."""
+    patches = []
+    for device_id, dev in new.items():
+        patch = diff.item_patch(device_id, old[device_id], dev)
+        if patch is not None:
+            patches.append(patch)
+    return patches
+
+
+def snapshots(size, share):
+    first = synthetic_devices(size)
+    out = [first]
+    step = max(1, int(1 / share)) if share else size + 1
+    for r in range(ROUNDS):
+        devs = copy.deepcopy(out[-1])
+        for i, dev in enumerate(devs.values()):
+            if i % step == r % step:
+                dev["state"]["lastSeen"] += 1000
+                dev["timestamp"] += 1000
+        out.append(devs)
+    return out
+
+
+def measure(name, size, func):
+    start = time.perf_counter()
+    patches = func()
+    elapsed = (time.perf_counter() - start) / ROUNDS
+    print(
+        "{0:>6} devices {1:>8}: {2:7.2f}ms per snapshot, {3} patches".format(
+            size, name, elapsed * 1000, len(patches)
+        )
+    )
+
+
+def main(share=0.01):
+    for size in SIZES:
+        snaps = snapshots(size, share)
+
+        def plain():
+            return [p for old, new in zip(snaps, snaps[1:]) for p in naive(old, new)]
+
+        def tracked():
+            tracker = diff.Tracker(snaps[0])
+            return [p for new in snaps[1:] for p in tracker.update(new)]
+
+        measure("naive", size, plain)
+        measure("tracker", size, tracked)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        main(float(sys.argv[1]))
+    else:
+        main()
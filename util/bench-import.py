@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""Measure what importing cozify costs before and after state is needed.
+
+Each sample is a fresh interpreter with an empty, throwaway XDG_CONFIG_HOME so nothing real is touched.
+"import" only imports cozify.hub & cozify.cloud, "first use" additionally reads the state as the old eager import did.
+Usage: bench-import.py [samples]
+"""
+
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+IMPORT = "import cozify.hub, cozify.cloud"
+SAMPLES = {
+    "baseline": "import absl.logging, requests",
+    "import": IMPORT,
+    "first use": IMPORT + "; cozify.config.state",
+}
+
+TIMED = """
+import time
+start = time.perf_counter()
+{0}
+print(time.perf_counter() - start)
+"""
+
+
+def sample(code):
+    with tempfile.TemporaryDirectory() as td:
+        env = dict(os.environ, XDG_CONFIG_HOME=os.path.join(td, "config"))
+        out = subprocess.run(
+            [sys.executable, "-c", TIMED.format(code)],
+            env=env,
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout
+        created = os.path.exists(env["XDG_CONFIG_HOME"])
+    return float(out), created
+
+
+def main(samples=20):
+    for name, code in SAMPLES.items():
+        times = []
+        created = False
+        for _ in range(samples):
+            elapsed, c = sample(code)
+            times.append(elapsed)
+            created |= c
+        print(
+            "{0:>10}: median {1:.2f}ms, min {2:.2f}ms, wrote to disk: {3}".format(
+                name, statistics.median(times) * 1000, min(times) * 1000, created
+            )
+        )
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        main(int(sys.argv[1]))
+    else:
+        main()
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""Compare memory use of raw device dicts against cozify.model Devices.
+
+Devices are synthetic and decoded from JSON like a real /devices response, so no strings are shared up front.
+Usage: bench-model.py [device count]
+"""
+
+import gc
+import json
+import sys
+import time
+import tracemalloc
+
+from cozify import model
+from cozify.benchmark.mock_hub import synthetic_devices
+
+
+def measure(build):
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = build()
+    elapsed = time.perf_counter() - start
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, size, elapsed
+
+
+def convert(payload):
+    devs = model.Devices(json.loads(payload))
+    for device_id in devs:  # convert everything, dropping the raw dicts
+        devs[device_id]
+    return devs
+
+
+def main(count=10000):
+    payload = json.dumps(synthetic_devices(count))
+    raw, raw_size, raw_time = measure(lambda: json.loads(payload))
+    del raw
+    devs, model_size, model_time = measure(lambda: convert(payload))
+    print("{0} devices".format(count))
+    print(
+        "  dicts: {0:6.2f}MB, {1:5.0f}B per device, decoded in {2:.3f}s".format(
+            raw_size / 1e6, raw_size / count, raw_time
+        )
+    )
+    print(
+        "  model: {0:6.2f}MB, {1:5.0f}B per device, decoded and converted in {2:.3f}s".format(
+            model_size / 1e6, model_size / count, model_time
+        )
+    )
+    print("  ratio: {0:.2f}x smaller".format(raw_size / model_size))
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        main(int(sys.argv[1]))
+    else:
+        main()
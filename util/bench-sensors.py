@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""Measure sensor extraction throughput on large synthetic hubs.
+
+Compares cozify.sensors.extract() against a per device, per sensor lookup loop building a list of dicts,
+the approach of the old multisensor.getMultisensorData generalized to all sensor capabilities.
+Usage: bench-sensors.py [device count]
+"""
+
+import sys
+import time
+
+from cozify import sensors
+from cozify.benchmark.mock_hub import synthetic_devices
+
+ROUNDS = 5
+
+
+def per_device(devs):
+    out = []
+    for dev in devs.values():
+        state = dev["state"]
+        row = None
+        for capability, key in sensors.fields.items():
+            if capability in dev["capabilities"]["values"]:
+                if row is None:
+                    row = {
+                        "id": dev["id"],
+                        "name": dev["name"],
+                        "time": state.get("lastSeen"),
+                    }
+                row[key] = state.get(key)
+        if row is not None:
+            out.append(row)
+    return out
+
+
+def measure(name, func, devs):
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        func(devs)
+    elapsed = (time.perf_counter() - start) / ROUNDS
+    print(
+        "{0:>10}: {1:7.2f}ms per snapshot, {2:,.0f} devices/s".format(
+            name, elapsed * 1000, len(devs) / elapsed
+        )
+    )
+
+
+def main(count=None):
+    for size in [count] if count else [1000, 10000, 100000]:
+        devs = synthetic_devices(size)
+        print("{0} devices".format(size))
+        measure("per device", per_device, devs)
+        measure("extract", sensors.extract, devs)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        main(int(sys.argv[1]))
+    else:
+        main()